@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+# benchmark of the instance generation pipeline's own overhead, using fake conjure/savilerow/minion/solver executables (see stubs/stub.py)
+# the harness sets up a tuning experiment with scripts/setup.py on one of the example models, then runs many synthetic irace evaluations (random generator configurations, several seeds each) through target-runner or wrapper.py
+# it reports per-evaluation wall time and overhead (wall time minus time spent inside the fake tools), file I/O volume and peak RSS as a JSON file, together with the git commit, so that results can be compared across commits
+# no irace, conjure, Savile Row or solvers are needed
+# syntax: python benchmarks/run-benchmark.py [--nEvaluations 1000] [--experimentType graded] [--via target-runner] ... (see --help)
+
+import os
+import sys
+import json
+import time
+import math
+import random
+import shutil
+import socket
+import argparse
+import platform
+import datetime
+import resource
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+benchmarkDir = os.path.dirname(os.path.realpath(__file__))
+repoDir = os.path.dirname(benchmarkDir)
+
+# tools faked by stubs/stub.py
+lsStubTools = ['conjure', 'savilerow', 'minion', 'minizinc', 'fzn-chuffed', 'fzn-gecode', 'glucose', 'glucose-syrup', 'lingeling', 'cadical', 'open-wbo', 'boolector']
+
+
+def log(logMessage):
+    print("{0}: {1}".format(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), logMessage))
+
+
+def run_cmd(cmd, cwd=None, env=None):
+    p = subprocess.run(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = p.stdout.decode('utf-8')
+    if p.returncode != 0:
+        raise Exception("ERROR: " + ' '.join(cmd) + ' failed:\n' + output)
+    return output
+
+
+def get_git_info():
+    try:
+        commit = run_cmd(['git', 'rev-parse', 'HEAD'], cwd=repoDir).strip()
+        dirty = run_cmd(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repoDir).strip() != ''
+    except Exception:
+        commit, dirty = None, None
+    return {'commit': commit, 'dirty': dirty}
+
+
+def read_proc_io():
+    # I/O counters of this process, they include all children (and their descendants) that have been waited for
+    counters = {}
+    if os.path.isfile('/proc/self/io'):
+        with open('/proc/self/io') as f:
+            for line in f:
+                name, value = line.split(':')
+                counters[name.strip()] = int(value)
+    return counters
+
+
+def get_dir_size(dirName):
+    size = 0
+    for root, dirs, files in os.walk(dirName):
+        for fn in files:
+            try:
+                size += os.lstat(os.path.join(root, fn)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def make_stub_bin_dir(binDir):
+    os.makedirs(binDir, exist_ok=True)
+    stub = os.path.join(benchmarkDir, 'stubs', 'stub.py')
+    for tool in lsStubTools:
+        os.symlink(stub, os.path.join(binDir, tool))
+
+
+def read_irace_params(paramFile):
+    # (name, switch, lower bound, upper bound) of each integer parameter in an irace parameter file
+    lsParams = []
+    with open(paramFile) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line == '':
+                continue
+            name = line.split()[0]
+            switch = line.split('"')[1].strip()
+            bounds = line[line.rfind('(')+1:line.rfind(')')].split(',')
+            lsParams.append((name, switch, int(bounds[0]), int(bounds[1])))
+    return lsParams
+
+
+def make_evaluations(lsParams, nEvaluations, seedsPerConfig, duplicateRate, raceSize, rng):
+    ### synthetic irace evaluations: (configurationId, instanceId, seed, parameter values) ###
+    # as in an irace race, a batch of configurations is evaluated on the first instance, then on the second one, etc.
+    # a fraction of configurations (duplicateRate) have the same parameter values as an earlier configuration, as irace sometimes creates duplicates
+    lsInstanceSeeds = [rng.randint(1, 2**31 - 1) for i in range(seedsPerConfig)]
+    nConfigs = int(math.ceil(nEvaluations / seedsPerConfig))
+    lsConfigs = []
+    for c in range(nConfigs):
+        if (len(lsConfigs) > 0) and (rng.random() < duplicateRate):
+            lsConfigs.append(list(rng.choice(lsConfigs)))
+        else:
+            lsConfigs.append([str(rng.randint(lb, ub)) for name, switch, lb, ub in lsParams])
+
+    lsEvaluations = []
+    for raceStart in range(0, nConfigs, raceSize):
+        for i in range(seedsPerConfig):
+            for c in range(raceStart, min(raceStart + raceSize, nConfigs)):
+                lsEvaluations.append((c + 1, i + 1, lsInstanceSeeds[i], lsConfigs[c]))
+    return lsEvaluations[:nEvaluations]
+
+
+def run_evaluation(evaluation, lsParams, runDir, via, env):
+    # run an evaluation as irace would do, return its wall time, peak RSS (KB) and last output line
+    configurationId, instanceId, seed, lsValues = evaluation
+    lsArgs = [str(configurationId), str(instanceId), str(seed), 'dummy-instance']
+    for (name, switch, lb, ub), value in zip(lsParams, lsValues):
+        lsArgs.extend([switch, value])
+
+    outFile = os.path.join(runDir, 'detailed-output', 'out-' + str(configurationId) + '-' + str(seed))
+    if via == 'wrapper':
+        cmd = [sys.executable, '-u', os.path.join(repoDir, 'scripts', 'tuning-files', 'wrapper.py')] + lsArgs
+        fOut = open(outFile, 'wb')
+    else:
+        cmd = [os.path.join(repoDir, 'scripts', 'tuning-files', 'target-runner')] + lsArgs
+        fOut = subprocess.PIPE
+
+    start = time.time()
+    p = subprocess.Popen(cmd, cwd=runDir, env=env, stdout=fOut, stderr=subprocess.STDOUT)
+    output = None
+    if fOut == subprocess.PIPE:
+        output = p.stdout.read()
+        p.stdout.close()
+    # the process is reaped with wait4 to get its resource usage (including all its waited-for descendants)
+    pid, waitStatus, rusage = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(waitStatus)
+    wallTime = time.time() - start
+    if fOut != subprocess.PIPE:
+        fOut.close()
+        with open(outFile, 'rb') as f:
+            output = f.read()
+    lsLines = output.decode('utf-8', errors='replace').strip().split('\n')
+    return {'wallTime': wallTime, 'maxRSS': rusage.ru_maxrss, 'returnCode': p.returncode, 'result': lsLines[-1] if len(lsLines) > 0 else ''}
+
+
+def get_percentile(lsValues, p):
+    lsValues = sorted(lsValues)
+    return lsValues[min(len(lsValues) - 1, int(p / 100 * len(lsValues)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the overhead of the instance generation pipeline with fake tools')
+    parser.add_argument('--modelFile', default=os.path.join(repoDir, 'examples', 'essence-models', 'cvrp.essence'), help='Essence model of the synthetic experiment')
+    parser.add_argument('--experimentType', default='graded', choices=['graded', 'discriminating'])
+    parser.add_argument('--evaluationSettingFile', default=None, help='evaluation settings. Default: examples/evaluation-setting/<experimentType>.json')
+    parser.add_argument('--setupArgs', default='', help='extra arguments given to scripts/setup.py, e.g., "--nEvaluationWorkers 2 --genSolutionsPerCall 5"')
+    parser.add_argument('--nEvaluations', default=1000, type=int, help='number of synthetic irace evaluations')
+    parser.add_argument('--seedsPerConfig', default=5, type=int, help='number of instances (random seeds) each configuration is evaluated on')
+    parser.add_argument('--duplicateRate', default=0.1, type=float, help='fraction of configurations with the same parameter values as an earlier one')
+    parser.add_argument('--raceSize', default=10, type=int, help='number of configurations evaluated on each instance before moving to the next instance')
+    parser.add_argument('--nParallel', default=1, type=int, help='number of evaluations run at the same time (irace nCores)')
+    parser.add_argument('--via', default='target-runner', choices=['target-runner', 'wrapper', 'server', 'broker'], help='how evaluations are run: through target-runner, by calling wrapper.py directly, or through target-runner with the evaluation server (or the evaluation broker and its workers) running')
+    parser.add_argument('--nBrokerWorkers', default=2, type=int, help='number of evaluation workers started with --via broker, each of them runs nParallel/nBrokerWorkers jobs at a time')
+    parser.add_argument('--delay', action='append', default=[], help='time (in seconds) each call of a fake tool takes, e.g., --delay savilerow=1.5 (can be repeated)')
+    parser.add_argument('--solverTime', default=20, type=float, help='solving times reported by the fake target solvers are between 0 and this value (in seconds)')
+    parser.add_argument('--solverSleep', default=0, type=float, help='fake target solvers sleep for this fraction of their reported solving time')
+    parser.add_argument('--minionPadding', default=0, type=float, help='size (in KB) of dummy constraints added to generator minion files')
+    parser.add_argument('--seed', default=123, type=int, help='random seed of the synthetic evaluations')
+    parser.add_argument('--workDir', default=None, help='directory where the experiment is set up. Default: a new temporary directory')
+    parser.add_argument('--keep', action='store_true', help='keep the work directory after the benchmark')
+    parser.add_argument('--output', default=None, help='JSON file with benchmark results. Default: ./benchmark-<commit>.json')
+    args = parser.parse_args()
+
+    gitInfo = get_git_info()
+    if args.output is None:
+        args.output = 'benchmark-' + (gitInfo['commit'][:10] if gitInfo['commit'] else 'unknown') + '.json'
+    if args.evaluationSettingFile is None:
+        args.evaluationSettingFile = os.path.join(repoDir, 'examples', 'evaluation-setting', args.experimentType + '.json')
+
+    # work directory with fake tools
+    workDir = os.path.realpath(args.workDir if args.workDir else tempfile.mkdtemp(prefix='instance-gen-benchmark-'))
+    os.makedirs(workDir, exist_ok=True)
+    binDir = os.path.join(workDir, 'bin')
+    make_stub_bin_dir(binDir)
+    stubLogFile = os.path.join(workDir, 'stub.log')
+    env = dict(os.environ)
+    env['PATH'] = binDir + os.pathsep + env['PATH']
+    env['BENCH_STUB_LOG'] = stubLogFile
+    env['BENCH_SOLVER_TIME'] = str(args.solverTime)
+    env['BENCH_SOLVER_SLEEP'] = str(args.solverSleep)
+    env['BENCH_MINION_PADDING'] = str(args.minionPadding)
+    for d in args.delay:
+        tool, value = d.split('=')
+        env['BENCH_DELAY_' + tool.upper().replace('-', '_')] = value
+
+    # set up the experiment
+    runDir = os.path.join(workDir, 'run')
+    log("Setting up experiment in " + runDir)
+    run_cmd([sys.executable, os.path.join(repoDir, 'scripts', 'setup.py'), '--runDir', runDir, '--modelFile', args.modelFile, '--experimentType', args.experimentType, \
+                '--evaluationSettingFile', args.evaluationSettingFile, '--nCores', str(args.nParallel)] + args.setupArgs.split(), env=env)
+    if os.path.isfile(stubLogFile):
+        os.remove(stubLogFile)
+    lsParams = read_irace_params(os.path.join(runDir, 'params.irace'))
+    lsEvaluations = make_evaluations(lsParams, args.nEvaluations, args.seedsPerConfig, args.duplicateRate, args.raceSize, random.Random(args.seed))
+
+    # the evaluation server (or broker) is started as in run.sh, workers of the broker are started on this machine, each in its own work directory
+    serverProcess = None
+    lsWorkerProcesses = []
+    if args.via in ['server', 'broker']:
+        serverScript = 'evaluation-server.py' if args.via == 'server' else 'evaluation-broker.py'
+        serverProcess = subprocess.Popen([sys.executable, '-u', os.path.join(repoDir, 'scripts', 'tuning-files', serverScript), '--runDir', runDir], \
+                                            cwd=runDir, env=env, stdout=open(os.path.join(runDir, 'evaluation-server.log'), 'wb'), stderr=subprocess.STDOUT)
+        while (not os.path.exists(os.path.join(runDir, 'evaluation-server.sock'))) and (serverProcess.poll() is None):
+            time.sleep(0.05)
+    if args.via == 'broker':
+        for k in range(args.nBrokerWorkers):
+            lsWorkerProcesses.append(subprocess.Popen([sys.executable, '-u', os.path.join(repoDir, 'scripts', 'tuning-files', 'evaluation-broker.py'), '--broker', os.path.join(runDir, 'evaluation-broker.json'), \
+                                            '--workDir', os.path.join(workDir, 'worker-' + str(k)), '--nJobs', str(int(math.ceil(args.nParallel / args.nBrokerWorkers)))], \
+                                            cwd=workDir, env=env, stdout=open(os.path.join(workDir, 'worker-' + str(k) + '.log'), 'wb'), stderr=subprocess.STDOUT))
+
+    # run all evaluations
+    log("Running " + str(len(lsEvaluations)) + " evaluations with " + str(args.nParallel) + " in parallel, via " + args.via)
+    ioStart = read_proc_io()
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.nParallel) as executor:
+        lsResults = list(executor.map(lambda e: run_evaluation(e, lsParams, runDir, 'wrapper' if args.via == 'wrapper' else 'target-runner', env), lsEvaluations))
+    totalWallTime = time.time() - start
+    for p in lsWorkerProcesses + ([serverProcess] if serverProcess is not None else []):
+        p.terminate()
+        p.wait()
+    ioEnd = read_proc_io()
+    childrenUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    # time spent inside the fake tools
+    stubTime = 0
+    if os.path.isfile(stubLogFile):
+        with open(stubLogFile) as f:
+            stubTime = sum([float(line.split()[1]) for line in f if len(line.split()) == 2])
+
+    lsWallTimes = [r['wallTime'] for r in lsResults]
+    lsScores = [r['result'].split(' ')[0] for r in lsResults]
+    nFailed = len([s for s in lsScores if s in ['', 'Error!']])
+    scoreCounts = {}
+    for s in lsScores:
+        key = s if s in ['Inf', '0', '1', '2'] else ('failed' if s in ['', 'Error!'] else 'other')
+        scoreCounts[key] = scoreCounts.get(key, 0) + 1
+    nEvals = max(len(lsResults), 1)
+
+    report = {
+        'git': gitInfo,
+        'date': datetime.datetime.now().isoformat(),
+        'host': {'hostname': socket.gethostname(), 'platform': platform.platform(), 'python': platform.python_version(), 'cpuCount': os.cpu_count()},
+        'benchmark': {k: v for k, v in vars(args).items() if k not in ['workDir', 'keep', 'output']},
+        'results': {
+            'nEvaluations': len(lsResults),
+            'nFailed': nFailed,
+            'scores': scoreCounts,
+            'totalWallTime': totalWallTime,
+            'evaluationsPerHour': len(lsResults) * 3600 / max(totalWallTime, 1e-9),
+            'wallTimePerEvaluation': {'mean': sum(lsWallTimes) / nEvals, 'median': get_percentile(lsWallTimes, 50), 'p95': get_percentile(lsWallTimes, 95), 'max': max(lsWallTimes)},
+            'stubTimePerEvaluation': stubTime / nEvals,
+            'overheadPerEvaluation': (sum(lsWallTimes) - stubTime) / nEvals,
+            'peakRSSKB': childrenUsage.ru_maxrss,
+            'maxRSSPerEvaluationKB': {'mean': sum([r['maxRSS'] for r in lsResults]) / nEvals, 'max': max([r['maxRSS'] for r in lsResults])},
+            'ioPerEvaluation': {name: (ioEnd.get(name, 0) - ioStart.get(name, 0)) / nEvals for name in ['rchar', 'wchar', 'read_bytes', 'write_bytes', 'syscr', 'syscw']},
+            'detailedOutputBytes': get_dir_size(os.path.join(runDir, 'detailed-output')),
+        }
+    }
+    with open(args.output, 'wt') as f:
+        json.dump(report, f, indent=1)
+
+    rs = report['results']
+    print('')
+    print('Commit: ' + str(gitInfo['commit']) + (' (with uncommitted changes)' if gitInfo['dirty'] else ''))
+    print('Evaluations: ' + str(rs['nEvaluations']) + ' (' + str(nFailed) + ' failed) in ' + str(round(totalWallTime, 1)) + 's, ' + str(round(rs['evaluationsPerHour'])) + '/h')
+    print('Wall time per evaluation: mean ' + str(round(rs['wallTimePerEvaluation']['mean'], 3)) + 's, p95 ' + str(round(rs['wallTimePerEvaluation']['p95'], 3)) + 's')
+    print('Overhead per evaluation (excluding fake tool time): ' + str(round(rs['overheadPerEvaluation'], 3)) + 's')
+    print('Peak RSS: ' + str(rs['peakRSSKB']) + ' KB')
+    print('I/O per evaluation: ' + str(round(rs['ioPerEvaluation']['wchar'] / 1024, 1)) + ' KB written, ' + str(round(rs['ioPerEvaluation']['rchar'] / 1024, 1)) + ' KB read')
+    print('Results written to ' + args.output)
+
+    if args.keep:
+        print('Work directory: ' + workDir)
+    else:
+        shutil.rmtree(workDir)
+
+main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+# fake conjure/savilerow/minion/solver executables for benchmarking the instance generation pipeline without the real tools
+# run-benchmark.py links this script under the name of each tool, the tool to fake is given by the name the script is called with
+# outputs are canned and deterministic: they only depend on the command line and on the input files
+# environment variables:
+# - BENCH_DELAY_<TOOL>: time (in seconds) each call of a tool takes, e.g., BENCH_DELAY_SAVILEROW=1.5 (tool names are upper-cased and '-' is replaced by '_'). Default: 0
+# - BENCH_SOLVER_TIME: solving times reported by the target solvers are between 0 and this value (in seconds). Default: 20
+# - BENCH_SOLVER_SLEEP: target solvers sleep for this fraction of their reported solving time. Default: 0
+# - BENCH_MINION_PADDING: size (in KB) of dummy constraints added to generator minion files, to simulate large files. Default: 0
+# - BENCH_STUB_LOG: if set, each call appends "<tool> <time slept>" to this file
+
+import sys
+import os
+import re
+import time
+import random
+import hashlib
+
+tool = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+
+
+def get_opt(name, default=None):
+    for i, a in enumerate(args):
+        if a.startswith(name + '='):
+            return a.split('=', 1)[1]
+        if (a == name) and (i + 1 < len(args)):
+            return args[i + 1]
+    return default
+
+
+def get_hash(s):
+    return int(hashlib.md5(s.encode('utf-8')).hexdigest(), 16)
+
+
+def write_file(fn, content):
+    with open(fn, 'wt') as f:
+        f.write(content)
+
+
+def sleep(t):
+    if t > 0:
+        time.sleep(t)
+    if os.environ.get('BENCH_STUB_LOG'):
+        fd = os.open(os.environ['BENCH_STUB_LOG'], os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.write(fd, (tool + ' ' + str(t) + '\n').encode('utf-8'))
+        os.close(fd)
+
+
+def get_timelimit(optionStr):
+    # solver time limit (in seconds) given in the solver options (see solverInfo in wrapper.py)
+    m = re.search(r'(?:^|\s)(?:-t|--time-limit|-time)\s+(\d+)', optionStr)
+    if m:
+        return int(m.group(1)) / 1000
+    m = re.search(r'(?:^|\s)(?:-timelimit\s+|-cpu-lim=|-T\s+|--time=)(\d+)', optionStr)
+    if m:
+        return int(m.group(1))
+    return None
+
+
+def solving_time(key, timelimit):
+    # reported solving time of a target solver, and whether it's a timeout
+    t = (get_hash(key) % 10000) / 10000 * float(os.environ.get('BENCH_SOLVER_TIME', '20'))
+    timeout = (timelimit is not None) and (t >= timelimit)
+    if timeout:
+        t = timelimit
+    sleep(t * float(os.environ.get('BENCH_SOLVER_SLEEP', '0')))
+    return t, timeout
+
+
+def fake_conjure():
+    if '--help' in args:
+        print('Conjure: The Automated Constraint Modelling Tool')
+        print('Repository version 0000000 (benchmark stub)')
+        return
+    mode = args[0]
+    if mode == 'parameter-generator':
+        # one integer generator parameter per given of the problem model
+        modelFile = args[1]
+        maxint = int(get_opt('--MAXINT', '100'))
+        genFile = get_opt('--essence-out')
+        lsGivens = re.findall(r'^\s*given\s+(\w+)', open(modelFile).read(), re.M)
+        write_file(genFile, 'language Essence 1.3\n' + ''.join(['given ' + g + '_gen : int(1..' + str(maxint) + ')\n' for g in lsGivens]))
+        write_file(genFile + '.irace', ''.join([g + '_gen "-' + g + '_gen " i (1, ' + str(maxint) + ')\n' for g in lsGivens]))
+    elif mode == 'modelling':
+        write_file(get_opt('-o') + '/model000001.eprime', "language ESSENCE' 1.0\n$ model of " + args[-3] + '\n')
+    elif mode == 'translate-parameter':
+        write_file(get_opt('--eprime-param'), "language ESSENCE' 1.0\n" + open(get_opt('--essence-param')).read())
+    elif mode == 'translate-solution':
+        # the instance depends on the generator instance and its solution
+        solution = open(get_opt('--eprime-solution')).read()
+        write_file(get_opt('--essence-solution'), 'language Essence 1.3\n$ ' + str(get_hash(open(get_opt('--essence-param')).read() + solution)) + '\n' + solution)
+    elif mode == 'solve':
+        # an SR info file is written into the output directory, as conjure does
+        outDir = get_opt('-o')
+        instFile = args[2]
+        model = os.path.basename(get_opt('--use-existing-models')).replace('.eprime', '')
+        solverOptions = get_opt('--solver-options', '')
+        seedFile = re.search(r'--readParam (\S+)', solverOptions)
+        seed = open(seedFile.group(1)).read().split()[-1] if seedFile else solverOptions
+        t, timeout = solving_time(get_opt('--solver') + seed + open(instFile).read(), get_timelimit(solverOptions))
+        sleep(float(os.environ.get('BENCH_DELAY_SAVILEROW', '0')))
+        info = 'SavileRowTotalTime:0.5\nSolverTotalTime:' + str(t) + '\n' + ('SolverTimeOut:1\n' if timeout else 'SolverSatisfiable:1\nSolverTimeOut:0\n')
+        write_file(os.path.join(outDir, model + '-' + os.path.basename(instFile).replace('.param', '') + '.eprime-info'), info)
+        print('Savile Row: ok')
+
+
+def fake_savilerow():
+    if '-help' in args:
+        print('Savile Row stub (Repository Version: 0000000)')
+        return
+    if get_opt('-mode') == 'ReadSolution':
+        values = open(get_opt('-minion-sol-file')).read().split()
+        write_file(get_opt('-out-solution'), "language ESSENCE' 1.0\n" + ''.join(['letting v' + str(i) + ' be ' + v + '\n' for i, v in enumerate(values)]))
+        return
+    if get_opt('-out-minion'):
+        # generator instance: two variables with 100 values each, plus optional padding
+        write_file(get_opt('-out-aux'), 'aux\n')
+        padding = ''.join(['eq(x,x)\n' for i in range(int(float(os.environ.get('BENCH_MINION_PADDING', '0')) * 1024 / 8))])
+        write_file(get_opt('-out-minion'), 'MINION 3\n**VARIABLES**\nDISCRETE x {0..99}\nDISCRETE y {0..99}\n**SEARCH**\nPRINT [[x],[y]]\nVARORDER [x,y]\n**CONSTRAINTS**\n' + padding + '**EOF**\n')
+        return
+    for flag in ['-out-flatzinc', '-out-minizinc', '-out-sat', '-out-maxsat', '-out-smt']:
+        if get_opt(flag):
+            write_file(get_opt(flag), '% translation of ' + open(args[1]).read()[-100:] + '\n')
+    print('Savile Row: ok')
+
+
+def fake_minion():
+    # solutions are all pairs of values not in the negative table, picked in a random order given by the seed
+    minionFile = args[0]
+    content = open(minionFile).read()
+    negativeTable = set()
+    m = re.search(r'negativeSol \d+ \d+\n(.*?)\*\*', content, re.S)
+    if m:
+        negativeTable = set([line.strip() for line in m.group(1).split('\n') if line.strip() != ''])
+    lsCandidates = ['%d %d' % (i, j) for i in range(100) for j in range(100)]
+    random.Random(int(get_opt('-randomseed', '0'))).shuffle(lsCandidates)
+    nSolutions = int(get_opt('-sollimit', '1'))
+    lsSolutions = []
+    for c in lsCandidates:
+        if len(lsSolutions) == nSolutions:
+            break
+        if c not in negativeTable:
+            lsSolutions.append(c)
+    if get_opt('-solsout'):
+        write_file(get_opt('-solsout'), ''.join([s + '\n' for s in lsSolutions]))
+    print('Solutions Found: ' + str(len(lsSolutions)))
+
+
+def fake_target_solver():
+    if tool == 'minizinc' and '--version' in args:
+        print('MiniZinc to FlatZinc converter, version 0.0.0 (benchmark stub)')
+        return
+    instFile = args[-1]
+    t, timeout = solving_time(tool + ' '.join(args[:-1]) + open(instFile).read(), get_timelimit(' '.join(args[:-1])))
+    if not timeout:
+        print('x = 1;')
+        print('----------')
+
+
+def main():
+    sleep(float(os.environ.get('BENCH_DELAY_' + tool.upper().replace('-', '_'), '0')))
+    if tool == 'conjure':
+        fake_conjure()
+    elif tool == 'savilerow':
+        fake_savilerow()
+    elif tool == 'minion':
+        fake_minion()
+    else:
+        fake_target_solver()
+
+main()
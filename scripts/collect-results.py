@@ -1,15 +1,68 @@
 import pandas as pd
 import argparse
-import subprocess
 from shutil import copy
+from shutil import copyfileobj
 import os
 import json
+import gzip
 
 
-def run_cmd(cmd):
-    p = subprocess.run(cmd,shell=True,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
-    output = p.stdout.decode('utf-8')
-    return output, p.returncode
+def copy_instance(resultsDir, instance, toDir):
+    # instance files can be compressed during the tuning if a disk budget is set (see manage_disk_budget in tuning-files/wrapper.py)
+    instFile = resultsDir + '/' + instance + '.param'
+    if os.path.isfile(instFile):
+        copy(instFile, toDir)
+    else:
+        with gzip.open(instFile + '.gz', 'rb') as fIn, open(toDir + '/' + instance + '.param', 'wb') as fOut:
+            copyfileobj(fIn, fOut)
+
+
+def read_results_file(resultsFile, stateFile, summaryFile):
+    ### read evaluation records from the results file written by wrapper.py (see write_result_record) ###
+    # the byte offset of the last complete record read is saved in stateFile, so that when results are collected again (e.g., while the tuning is still running), only new records are read and added to the previous summary table
+    offset = 0
+    t = None
+    if os.path.isfile(stateFile) and os.path.isfile(summaryFile):
+        with open(stateFile) as f:
+            state = json.load(f)
+        if (state['resultsFile'] == os.path.realpath(resultsFile)) and (state['offset'] <= os.path.getsize(resultsFile)):
+            offset = state['offset']
+            t = pd.read_csv(summaryFile)
+            print("Read " + str(len(t)) + " previously collected results from " + summaryFile)
+
+    with open(resultsFile, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    # the last record may still be being written by a running evaluation
+    end = data.rfind(b'\n') + 1
+    lsRecords = [json.loads(line) for line in data[:end].decode('utf-8').split('\n') if line!='']
+    print("Read " + str(len(lsRecords)) + " new results from " + resultsFile)
+
+    # only records of evaluated instances are in the summary table, i.e., not those where the generator doesn't give an instance
+    tNew = pd.DataFrame([record for record in lsRecords if 'instance' in record])
+    if t is None:
+        t = tNew
+    elif len(tNew) > 0:
+        t = pd.concat([t, tNew], ignore_index=True, sort=False)
+
+    with open(stateFile, 'wt') as f:
+        json.dump({'resultsFile': os.path.realpath(resultsFile), 'offset': offset + end}, f)
+    return t
+
+
+def read_out_files(resultsDir):
+    # results of runs done by older versions of wrapper.py, which only print an instance summary line in the out-* files
+    rsRows = []
+    print("Read instance summary in all out-* files")
+    for entry in os.scandir(resultsDir):
+        if not entry.name.startswith('out-'):
+            continue
+        with open(entry.path, 'rt', errors='replace') as f:
+            for line in f:
+                if line.startswith('Instance summary: '):
+                    line = line.split(':',1)[1].strip()
+                    rsRows.append({item.split('=')[0].strip(): item.split('=')[1].strip() for item in line.split(', ')})
+    return pd.DataFrame(rsRows)
 
 
 def main():
@@ -17,6 +70,7 @@ def main():
     parser.add_argument("--runDir", default='./', help='directory where the experiment was run. \nDefault: current folder')
     parser.add_argument("--summaryFile", default='default', help='output of the result collection, saved as a .csv file. Default: <runDir>/summary.csv')
     parser.add_argument("--copyInstancesTo", default=None, help="if set, copy all discriminating instances (instances with baseSolverTime/favouredSolverTime > 1) into a directory. Default: no copy")
+    parser.add_argument("--full", action='store_true', help='re-read all results instead of only those added since the last collection')
 
     args = parser.parse_args()
 
@@ -24,18 +78,20 @@ def main():
     if args.summaryFile=='default':
         args.summaryFile = args.runDir + '/summary.csv'
 
-    # read instance summary in all out-* files
+    # read instance summary of all evaluations
     resultsDir = args.runDir + '/detailed-output'
-    grepCmd = 'grep -h ' + resultsDir + "/out-* -e 'Instance summary: '| cut -d':' -f 2"
-    print("Grep instance summary in all out-* files")
-    print(grepCmd)
-    rs, returnCode = run_cmd(grepCmd)
-    if returnCode!=0:
-        raise Exception("ERROR: cannot run grep command " + grepCmd)
+    resultsFile = resultsDir + '/results.jsonl'
+    stateFile = args.summaryFile + '.state'
+    if args.full and os.path.isfile(stateFile):
+        os.remove(stateFile)
+    if os.path.isfile(resultsFile):
+        t = read_results_file(resultsFile, stateFile, args.summaryFile)
+    else:
+        t = read_out_files(resultsDir)
     
-    # convert results into table and write to args.summaryFile as a .csv file
-    rsRows = [{item.split('=')[0].strip(): item.split('=')[1].strip() for item in line.split(', ')} for line in rs.split('\n') if line!='']   
-    t = pd.DataFrame(rsRows)
+    t = t[[c for c in ['instance','status'] if c in t.columns] + [c for c in t.columns if c not in ['instance','status']]]
+
+    # write to args.summaryFile as a .csv file
     print("Write instance summary to " + args.summaryFile)
     t.to_csv(args.summaryFile, index=False)
 
@@ -58,7 +114,7 @@ def main():
                 os.mkdir(args.copyInstancesTo)
             print("Copy discriminating instances into " + args.copyInstancesTo)
             # copy discriminating instances to it
-            [copy(resultsDir + '/' + instance + '.param', args.copyInstancesTo) for instance in tDis.instance]        
+            [copy_instance(resultsDir, instance, args.copyInstancesTo) for instance in tDis.instance]        
             # write out summary of those instances 
             tDis.to_csv(args.copyInstancesTo + '/summary.csv', index=False)
 
@@ -76,7 +132,7 @@ def main():
                 os.mkdir(args.copyInstancesTo)
             print("Copy graded instances into " + args.copyInstancesTo)
             # copy graded instances to it
-            [copy(resultsDir + '/' + instance + '.param', args.copyInstancesTo) for instance in tGraded.instance]        
+            [copy_instance(resultsDir, instance, args.copyInstancesTo) for instance in tGraded.instance]        
             # write out summary of those instances 
             tGraded.to_csv(args.copyInstancesTo + '/summary.csv', index=False)
 
@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import sys
+import time
+import datetime
+from collections import Counter
+
+
+class ResultsTail:
+    # read evaluation records (see write_result_record in tuning-files/wrapper.py) as they are appended to the results file
+    def __init__(self, resultsFile):
+        self.resultsFile = resultsFile
+        self.offset = 0
+        self.lsRecords = []
+
+    def update(self):
+        if not os.path.isfile(self.resultsFile):
+            return
+        if os.path.getsize(self.resultsFile) < self.offset: # the file was replaced, start again
+            self.offset = 0
+            self.lsRecords = []
+        with open(self.resultsFile, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        # the last record may still be being written
+        end = data.rfind(b'\n') + 1
+        self.lsRecords.extend([json.loads(line) for line in data[:end].decode('utf-8').split('\n') if line!=''])
+        self.offset += end
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return str(round(seconds, 1)) + 's'
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+def get_slot_busy_times(lsRecords, windowStart):
+    ### busy time of each execution slot of each host since windowStart ###
+    # records don't say which core an evaluation ran on, so evaluations of a host are assigned to slots: an evaluation takes the first slot that is free when it starts (i.e., a slot is one of the evaluations running at the same time, as irace's parallel runs)
+    # return: host -> list of busy times (in seconds), one per slot
+    slots = {} # host -> [[end time of the last evaluation, busy time]]
+    for r in sorted(lsRecords, key=lambda r: r['startTime']):
+        end = r['startTime'] + r['wrapperTime']
+        lsSlots = slots.setdefault(r.get('host', 'unknown host'), [])
+        lsFree = [slot for slot in lsSlots if slot[0] <= r['startTime']]
+        if len(lsFree) > 0:
+            slot = lsFree[0]
+        else:
+            slot = [0, 0]
+            lsSlots.append(slot)
+        slot[0] = end
+        slot[1] += max(end - max(r['startTime'], windowStart), 0)
+    return {host: [slot[1] for slot in lsSlots] for host, lsSlots in slots.items()}
+
+
+def make_report(lsRecords, setting, window):
+    ### make the dashboard text of a tuning experiment ###
+    lsLines = []
+    now = time.time()
+    experimentType = setting['generalSettings']['experimentType']
+    nCores = setting['tuningSettings']['nCores']
+    maxExperiments = setting['tuningSettings']['maxExperiments']
+
+    lsLines.append('Tuning experiment: ' + setting['generalSettings']['runDir'] + ' (' + experimentType + ', ' + str(nCores) + ' cores)  ' + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    if len(lsRecords) == 0:
+        lsLines.append('No evaluation finished yet')
+        return lsLines
+
+    # throughput
+    startTime = min([r['startTime'] for r in lsRecords])
+    elapsed = max(now - startTime, 1)
+    lsRecent = [r for r in lsRecords if r['startTime'] + r['wrapperTime'] >= now - window]
+    recentElapsed = max(min(window, elapsed), 1)
+    lsLines.append('')
+    lsLines.append('Evaluations: ' + str(len(lsRecords)) + '/' + str(maxExperiments) + ' in ' + format_duration(elapsed) \
+                    + '  |  throughput: ' + str(round(len(lsRecords) * 3600 / elapsed, 1)) + '/h overall, ' \
+                    + str(round(len(lsRecent) * 3600 / recentElapsed, 1)) + '/h in the last ' + format_duration(recentElapsed))
+
+    # core utilisation: time spent in evaluations over the time available on all cores
+    busyTime = sum([min(r['wrapperTime'], r['startTime'] + r['wrapperTime'] - (now - recentElapsed)) for r in lsRecent])
+    lsLines.append('Core utilisation (last ' + format_duration(recentElapsed) + '): ' + str(round(100 * busyTime / (recentElapsed * nCores), 1)) + '%')
+    for host, lsBusyTimes in sorted(get_slot_busy_times(lsRecent, now - recentElapsed).items()):
+        lsPercents = ['{0:.0f}%'.format(100 * t / recentElapsed) for t in lsBusyTimes]
+        for k in range(0, len(lsPercents), 16):
+            lsLines.append('  {0:<20} {1}'.format(host + ' (' + str(len(lsBusyTimes)) + ' slots)' if k == 0 else '', ' '.join(lsPercents[k:k+16])))
+
+    # status breakdown
+    lsLines.append('')
+    lsLines.append('Status:')
+    statusCounts = Counter([r['status'] for r in lsRecords])
+    for status, count in statusCounts.most_common():
+        percent = 100 * count / len(lsRecords)
+        lsLines.append('  {0:<16} {1:>7} {2:>6.1f}%'.format(status, count, percent))
+    status, count = statusCounts.most_common(1)[0]
+    if (len(lsRecords) >= 20) and (count >= 0.5 * len(lsRecords)) and (status not in ['graded', 'ok']):
+        lsLines.append('  WARNING: ' + str(round(100 * count / len(lsRecords))) + '% of evaluations are ' + status)
+
+    # time split
+    genSRTime = sum([r.get('genSRTime', 0) for r in lsRecords])
+    genSolverTime = sum([r.get('genSolverTime', 0) for r in lsRecords])
+    SRTime = sum([r.get('totalSRTime', 0) for r in lsRecords])
+    solverTime = sum([r.get('totalSolverTime', 0) for r in lsRecords])
+    wrapperTime = sum([r['wrapperTime'] for r in lsRecords])
+    otherTime = max(wrapperTime - genSRTime - genSolverTime - SRTime - solverTime, 0) # runs of an evaluation can be done in parallel (nEvaluationWorkers), so the time of all stages can be more than the wrapper time
+    totalTime = genSRTime + genSolverTime + SRTime + solverTime + otherTime
+    lsLines.append('')
+    lsLines.append('Time split (total wrapper time ' + format_duration(wrapperTime) + '):')
+    for name, t in [('generator SR', genSRTime), ('generator minion', genSolverTime), ('instance SR', SRTime), ('instance solver', solverTime), ('other', otherTime)]:
+        lsLines.append('  {0:<16} {1:>12} {2:>6.1f}%'.format(name, format_duration(t), 100 * t / max(totalTime, 1e-9)))
+
+    # best instances so far
+    lsLines.append('')
+    if experimentType == 'discriminating':
+        lsBest = sorted([r for r in lsRecords if r.get('ratio', 0) > 0], key=lambda r: -r['ratio'])[:10]
+        lsLines.append('Best discriminating ratios (baseSolver/favouredSolver):')
+        for r in lsBest:
+            lsLines.append('  {0:>8.2f}  {1} (favoured {2:.2f}s, base {3:.2f}s)'.format(r['ratio'], r['instance'], r['favouredSolverTotalTime'], r['baseSolverTotalTime']))
+    else:
+        lsBest = sorted([r for r in lsRecords if r['status'] == 'graded'], key=lambda r: -r['meanSolverTime'])[:10]
+        lsLines.append('Hardest graded instances (mean solver time):')
+        for r in lsBest:
+            lsLines.append('  {0:>8.2f}s  {1}'.format(r['meanSolverTime'], r['instance']))
+    if len(lsBest) == 0:
+        lsLines.append('  none yet')
+
+    return lsLines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="live terminal dashboard of a running tuning experiment")
+    parser.add_argument("--runDir", default='./', help='directory where the experiment is run. Default: current folder')
+    parser.add_argument("--interval", default=10, type=float, help='refresh interval (in seconds). Default: 10')
+    parser.add_argument("--window", default=3600, type=float, help='time window (in seconds) for recent throughput and core utilisation. Default: 3600')
+    parser.add_argument("--once", action='store_true', help='print the dashboard once and exit')
+    args = parser.parse_args()
+
+    with open(args.runDir + '/setting.json') as f:
+        setting = json.load(f)
+    tail = ResultsTail(args.runDir + '/detailed-output/results.jsonl')
+
+    while True:
+        tail.update()
+        lsLines = make_report(tail.lsRecords, setting, args.window)
+        if args.once:
+            print('\n'.join(lsLines))
+            break
+        # clear the terminal and redraw
+        sys.stdout.write('\033[2J\033[H' + '\n'.join(lsLines) + '\n')
+        sys.stdout.flush()
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            break
+
+main()
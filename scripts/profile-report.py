@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+
+
+def read_spans(spansFile):
+    ### aggregate timing spans of all evaluations (see span in tuning-files/wrapper.py) by their stack, i.e., the names of the span and all its ancestors ###
+    # return the number of evaluations and a dictionary: stack -> {'count', 'total', 'self'}
+    stats = defaultdict(lambda: {'count': 0, 'total': 0, 'self': 0})
+    nEvaluations = 0
+    with open(spansFile, 'rt') as f:
+        for line in f:
+            if not line.endswith('\n'): # the last record may still be being written
+                break
+            lsSpans = json.loads(line)['spans']
+            nEvaluations += 1
+            spans = {s['id']: s for s in lsSpans}
+
+            # time of each span that is not spent in its children
+            childTime = defaultdict(float)
+            for s in lsSpans:
+                if s['parent'] is not None:
+                    childTime[s['parent']] += s['duration']
+
+            for s in lsSpans:
+                stack = [s['name']]
+                parent = s['parent']
+                while parent in spans:
+                    stack.append(spans[parent]['name'])
+                    parent = spans[parent]['parent']
+                stack = tuple(reversed(stack))
+                stats[stack]['count'] += 1
+                stats[stack]['total'] += s['duration']
+                # runs of an evaluation can be done in parallel (nEvaluationWorkers), so children can take longer than their parent
+                stats[stack]['self'] += max(s['duration'] - childTime[s['id']], 0)
+    return nEvaluations, stats
+
+
+def make_tree_report(stats, nEvaluations, minPercent):
+    # flame-style breakdown: stages are shown as a tree, children are sorted by their total time
+    lsRoots = [stack for stack in stats if len(stack) == 1]
+    rootTime = sum([stats[stack]['total'] for stack in lsRoots])
+    lsLines = ['{0:<60} {1:>12} {2:>7} {3:>8} {4:>12}  {5}'.format('stage', 'total (s)', '%', 'count', 'mean (s)', '')]
+
+    def add_stack(stack):
+        s = stats[stack]
+        percent = 100 * s['total'] / max(rootTime, 1e-9)
+        if percent < minPercent:
+            return
+        name = '  ' * (len(stack) - 1) + stack[-1]
+        bar = '#' * int(round(min(percent, 100) / 2))
+        lsLines.append('{0:<60} {1:>12.2f} {2:>6.1f}% {3:>8} {4:>12.3f}  {5}'.format(name[:60], s['total'], percent, s['count'], s['total'] / s['count'], bar))
+        lsChildren = [child for child in stats if (len(child) == len(stack) + 1) and (child[:len(stack)] == stack)]
+        for child in sorted(lsChildren, key=lambda c: -stats[c]['total']):
+            add_stack(child)
+
+    for stack in sorted(lsRoots, key=lambda c: -stats[c]['total']):
+        add_stack(stack)
+
+    lsLines.append('')
+    lsLines.append('Note: solver runs of an evaluation can be done in parallel (nEvaluationWorkers>1), their total time can then be more than 100% of their parent stage')
+    lsLines.append('Evaluations: ' + str(nEvaluations) + ', total time: ' + str(round(rootTime, 2)) + 's, mean time per evaluation: ' + str(round(rootTime / max(nEvaluations, 1), 2)) + 's')
+    return lsLines
+
+
+def write_folded_stacks(stats, foldedFile):
+    # folded stack format (one "stage;substage;... <self time in ms>" line per stack), can be given to flamegraph.pl or speedscope
+    with open(foldedFile, 'wt') as f:
+        for stack in sorted(stats):
+            selfTime = int(round(stats[stack]['self'] * 1000))
+            if selfTime > 0:
+                f.write(';'.join(stack) + ' ' + str(selfTime) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="report where the time of a tuning experiment is spent, based on the timing spans written by wrapper.py")
+    parser.add_argument("--runDir", default='./', help='directory where the experiment is run. Default: current folder')
+    parser.add_argument("--minPercent", default=0.1, type=float, help='only show stages taking at least this percentage of the total time. Default: 0.1')
+    parser.add_argument("--foldedFile", default=None, help='if set, also write the spans in folded stack format (for flame graph tools) to this file. Default: no file')
+    args = parser.parse_args()
+
+    spansFile = args.runDir + '/detailed-output/spans.jsonl'
+    if not os.path.isfile(spansFile):
+        raise Exception("ERROR: " + spansFile + " not found")
+
+    nEvaluations, stats = read_spans(spansFile)
+    print('\n'.join(make_tree_report(stats, nEvaluations, args.minPercent)))
+
+    if args.foldedFile is not None:
+        write_folded_stacks(stats, args.foldedFile)
+        print("Folded stacks written to " + args.foldedFile)
+
+main()
@@ -10,7 +10,13 @@ from shutil import move
 import json
 import subprocess
 import shlex
+import asyncio
+import signal
 from collections import OrderedDict
+from collections import deque
+
+maxOutputHead = 64 * 1024 # size (in bytes) of the beginning of a command's output returned by run_cmd (where the version lines parsed by setup are)
+maxOutputTail = 64 * 1024 # size (in bytes) of the end of a command's output returned by run_cmd
 
 def replace_string(srcStr, destStr, fileName):
     with open(fileName, 'rt') as f:
@@ -24,14 +30,54 @@ def log(logMessage):
     print("{0}: {1}".format(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), logMessage))
 
 
+async def stream_cmd(lsCmds, printOutput=True):
+    # run a command and print its output as it arrives, return its output and return code
+    # only the first maxOutputHead and last maxOutputTail bytes of the output are kept, the rest is dropped (but still printed)
+    # the command is started in its own process group, which is killed if setup is interrupted
+    p = await asyncio.create_subprocess_exec(*lsCmds, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True)
+    head = b''
+    tail = deque()
+    tailSize = 0
+    nDropped = 0
+    try:
+        while True:
+            data = await p.stdout.read(65536)
+            if not data:
+                break
+            if len(head) < maxOutputHead:
+                n = maxOutputHead - len(head)
+                head += data[:n]
+                rest = data[n:]
+            else:
+                rest = data
+            if rest:
+                tail.append(rest)
+                tailSize += len(rest)
+                while tailSize - len(tail[0]) >= maxOutputTail:
+                    tailSize -= len(tail[0])
+                    nDropped += len(tail.popleft())
+            if printOutput:
+                sys.stdout.buffer.write(data)
+                sys.stdout.flush()
+        returnCode = await p.wait()
+    except BaseException:
+        if p.returncode is None:
+            try:
+                os.killpg(p.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        raise
+    output = head.decode('utf-8', errors='replace')
+    if nDropped > 0:
+        output += '\n[' + str(nDropped) + ' bytes of output dropped]\n'
+    return output + b''.join(tail).decode('utf-8', errors='replace'), returnCode
+
+
 def run_cmd(cmd, printOutput=True):
     log(cmd)
     lsCmds = shlex.split(cmd)
-    p = subprocess.run(lsCmds,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
-    output = p.stdout.decode('utf-8')
-    if printOutput:
-        print(output)
-    if p.returncode!=0:
+    output, returnCode = asyncio.run(stream_cmd(lsCmds, printOutput))
+    if returnCode!=0:
         sys.exit(1)
     return output
 
@@ -121,11 +167,19 @@ def setup_tuning_folder(args, argGroups):
     for fn in ['scenario.txt','instances','run.sh']:
         copy(get_script_path() + '/tuning-files/' + fn, args.runDir)
 
+    # run all evaluations of an irace iteration with one call of batch-runner.py
+    if args.batchRunner:
+        with open(get_script_path() + '/tuning-files/target-runner-parallel.R', 'rt') as f:
+            rFunction = f.read().replace('<batchRunner>', get_script_path() + '/tuning-files/batch-runner.py')
+        with open(args.runDir + '/scenario.txt', 'at') as f:
+            f.write('\n' + rFunction)
+
     # update fields in run.sh
     pbsFile = args.runDir + '/run.sh'
     dictValues = {'seed': args.seed, 'nCores': args.nCores, \
                     'maxExperiments': args.maxExperiments,\
-                    'targetRunner': args.targetRunner}
+                    'targetRunner': args.targetRunner, \
+                    'evaluationServer': 'evaluation-broker.py' if args.distributed else 'evaluation-server.py'}
     with open(pbsFile,'rt') as f:
         lsLines = f.readlines()
     for field, value in dictValues.items():
@@ -168,13 +222,30 @@ def main():
     parser.add_argument('--maxExperiments',default=5000,type=int,help='maximum number of evaluations used by the tuning')
     parser.add_argument('--scale',default='linear',choices=['linear','log'],help='sampling scale for generator parameters')
     parser.add_argument('--nCores',default=1,type=int,help='how many processes running in parallel for the tuning')
-    argGroups['tuningSettings'] = ['maxint','seed','maxExperiments','scale','nCores']
+    parser.add_argument('--useSRPool',action='store_true',help='keep a pool of warm Savile Row workers (one per core) to translate generator instances and parse their solutions')
+    parser.add_argument('--nEvaluationWorkers',default=1,type=int,help='how many solver runs (random seeds and solvers) are done in parallel when evaluating a generated instance')
+    parser.add_argument('--surrogateFilter',action='store_true',help='pre-screen generator configurations with a nearest-neighbour model of earlier evaluations, and give a predicted score to those that are confidently hopeless instead of evaluating them')
+    parser.add_argument('--surrogateMinRecords',default=100,type=int,help='number of evaluations needed before the surrogate filter is used')
+    parser.add_argument('--surrogateConfidence',default=0.9,type=float,help='a configuration is filtered out if at least this fraction of its nearest evaluated neighbours are hopeless (score>=0)')
+    parser.add_argument('--surrogateExplorationRate',default=0.1,type=float,help='probability that a configuration predicted as hopeless is still evaluated')
+    parser.add_argument('--diskBudget',default=0,type=float,help='maximum disk space (in GB) used by <runDir>/detailed-output. When it is exceeded, instance files of finished evaluations are compressed and generator minion/aux files are evicted (they are re-generated when needed). Default: 0 (no limit)')
+    parser.add_argument('--scratchDir',default='',help='directory on a local disk (e.g., /dev/shm or $TMPDIR) where transient files of each evaluation are written, instead of <runDir>/detailed-output. Environment variables are expanded when the evaluation is run. Default: not used')
+    parser.add_argument('--sharedCores',action='store_true',help='CPU-heavy stages (generator translation/solving/parsing and solver runs) of all running evaluations share nCores core slots. Combined with --nEvaluationWorkers>1, an evaluation can use cores left idle by the others (e.g., while irace waits for the last evaluations of a race iteration)')
+    parser.add_argument('--memoryBudget',default=0,type=int,help='memory (in MB) available to the evaluations running on a machine. Savile Row, conjure solve, minion and solver calls are only started when their estimated memory footprint (based on earlier calls with a similar input size) fits in the budget. Default: 0 (no admission control)')
+    parser.add_argument('--memoryCgroup',default='',help='cgroup v2 folder delegated to the user running the tuning, with the memory controller enabled for its children. If given, memory limits (genSRMemLimit, genSolverMemLimit, SRMemLimit and solverMemLimit) are enforced via a child cgroup of each limited call, otherwise via rlimit. Environment variables are expanded when the evaluation is run. Default: not used')
+    parser.add_argument('--batchRunner',action='store_true',help='irace gives all evaluations of an iteration to a single call of batch-runner.py (via targetRunnerParallel in scenario.txt) instead of calling target-runner for each of them')
+    parser.add_argument('--distributed',action='store_true',help='run.sh starts an evaluation broker instead of the evaluation server: evaluations are run by evaluation workers started on other machines (see README), nCores is then the number of evaluations run at the same time by all workers')
+    argGroups['tuningSettings'] = ['maxint','seed','maxExperiments','scale','nCores','useSRPool','nEvaluationWorkers','sharedCores','surrogateFilter','surrogateMinRecords','surrogateConfidence','surrogateExplorationRate','diskBudget','scratchDir','memoryBudget','memoryCgroup','batchRunner','distributed']
 
     # generator settings
     parser.add_argument('--genSRTimelimit',default=300,help='SR time limit on each generator instance (in seconds)')
     parser.add_argument('--genSRFlags',default='-S0',help='SR extra flags for solving generator instance')
     parser.add_argument('--genSolverTimelimit',default=300,help='time limit for minion to solve a generator instance (in seconds)')
-    argGroups['generatorSettings'] = ['genSRTimelimit','genSRFlags','genSolverTimelimit']
+    parser.add_argument('--genSolutionsPerCall',default=1,type=int,help='maximum number of solutions (instances) minion generates each time it solves a generator instance; the unused ones are kept for the next runs of the same generator configuration')
+    parser.add_argument('--genCompressFiles',action='store_true',help='save generator minion files compressed and their negative tables in a compact binary format, to reduce disk usage and writes; minion files are decompressed into /dev/shm (if available) each time minion is called')
+    parser.add_argument('--genSRMemLimit',default=0,type=int,help='memory limit (in MB) of SR on each generator instance, a generator instance hitting it is SRMemOut. Default: 0 (no limit)')
+    parser.add_argument('--genSolverMemLimit',default=0,type=int,help='memory limit (in MB) of minion on each generator instance, a generator instance hitting it is solverMemOut. Default: 0 (no limit)')
+    argGroups['generatorSettings'] = ['genSRTimelimit','genSRFlags','genSolverTimelimit','genSolutionsPerCall','genCompressFiles','genSRMemLimit','genSolverMemLimit']
 
     # read from command line args
     args = parser.parse_args()
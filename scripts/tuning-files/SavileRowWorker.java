@@ -0,0 +1,179 @@
+// warm Savile Row worker, used by the Savile Row pool of evaluation-server.py
+// syntax: java [-Djava.security.manager=allow] -cp <folder of SavileRowWorker.class> SavileRowWorker <savilerow.jar> <trove.jar>
+// the worker is compiled once by the pool (see SavileRowPool.get_worker_cmd)
+// Savile Row keeps global state in static fields, so each job runs in its own class loader. All Savile Row classes of the next job are loaded and initialised before the job arrives.
+// Savile Row ends by calling System.exit(). If a security manager can be installed (up to Java 17, or up to Java 23 with -Djava.security.manager=allow), the call is intercepted and the worker runs one job after another.
+// The JVM and the JDK code used by Savile Row then stay warm (the pool runs a warm-up translation first). Otherwise, the worker only runs one job.
+// protocol: when the worker is warm, it prints "ready" (or "ready once" if it only runs one job) and reads one line of tab-separated Savile Row arguments from stdin.
+// - "ready": the worker prints "done <exit code> <size of the output in bytes>" followed by the output of the job, then "ready" again when it's warm for the next job.
+//   If some threads of the job are still running (e.g., Savile Row timed out), the worker exits after the output of the job.
+// - "ready once": the worker prints the output of the job and exits with Savile Row's exit code.
+
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.Enumeration;
+import java.util.jar.JarEntry;
+import java.util.jar.JarFile;
+
+public class SavileRowWorker {
+    static Thread mainThread;
+    static ThreadGroup jobGroup; // threads of the running job
+    static Integer jobExitCode; // set when the running job is finished
+
+    // thrown in a job's thread when Savile Row calls System.exit()
+    static class JobExit extends SecurityException {
+        JobExit(int status) {
+            super("System.exit(" + status + ")");
+        }
+    }
+
+    static class ExitInterceptor extends SecurityManager {
+        @Override
+        public void checkPermission(Permission perm) {
+        }
+
+        @Override
+        public void checkPermission(Permission perm, Object context) {
+        }
+
+        @Override
+        public void checkExit(int status) {
+            // the worker itself can exit, a job's call only finishes the job (calls from threads of previous jobs are ignored)
+            if (Thread.currentThread() == mainThread) {
+                return;
+            }
+            synchronized (SavileRowWorker.class) {
+                if ((jobGroup != null) && jobGroup.parentOf(Thread.currentThread().getThreadGroup())) {
+                    finishJob(status);
+                }
+            }
+            throw new JobExit(status);
+        }
+    }
+
+    static synchronized void finishJob(int exitCode) {
+        if (jobExitCode == null) {
+            jobExitCode = exitCode;
+            SavileRowWorker.class.notifyAll();
+        }
+    }
+
+    static ClassLoader prepareClassLoader(URL[] urls, String srJar) throws Exception {
+        // new class loader with all Savile Row classes loaded and initialised
+        ClassLoader loader = new URLClassLoader(urls, ClassLoader.getPlatformClassLoader());
+        try (JarFile jar = new JarFile(srJar)) {
+            Enumeration<JarEntry> entries = jar.entries();
+            while (entries.hasMoreElements()) {
+                String name = entries.nextElement().getName();
+                if (name.startsWith("savilerow/") && name.endsWith(".class")) {
+                    try {
+                        Class.forName(name.substring(0, name.length() - 6).replace('/', '.'), true, loader);
+                    } catch (Throwable e) {
+                        // not loadable on its own, Savile Row will load it when needed
+                    }
+                }
+            }
+        }
+        return loader;
+    }
+
+    static boolean runJob(ClassLoader loader, String[] srArgs, OutputStream output) throws InterruptedException {
+        // run Savile Row in its own thread group, with its output written to output
+        // return false if some threads of the job are still running
+        ThreadGroup group = new ThreadGroup("savilerow-job");
+        Thread thread = new Thread(group, () -> {
+            try {
+                Class.forName("savilerow.EPrimeTailor", true, loader).getMethod("main", String[].class).invoke(null, (Object) srArgs);
+                finishJob(0);
+            } catch (Throwable e) {
+                Throwable cause = (e instanceof InvocationTargetException) ? e.getCause() : e;
+                if (!(cause instanceof JobExit)) {
+                    cause.printStackTrace();
+                    finishJob(1);
+                }
+            }
+        }, "savilerow");
+        thread.setContextClassLoader(loader);
+
+        PrintStream stdout = System.out;
+        PrintStream stderr = System.err;
+        PrintStream jobOutput = new PrintStream(output, true);
+        System.setOut(jobOutput);
+        System.setErr(jobOutput);
+        synchronized (SavileRowWorker.class) {
+            jobGroup = group;
+            jobExitCode = null;
+        }
+        try {
+            thread.start();
+            synchronized (SavileRowWorker.class) {
+                while (jobExitCode == null) {
+                    SavileRowWorker.class.wait();
+                }
+                jobGroup = null;
+            }
+            group.interrupt();
+            thread.join(1000);
+        } finally {
+            jobOutput.flush();
+            System.setOut(stdout);
+            System.setErr(stderr);
+        }
+        return group.activeCount() == 0;
+    }
+
+    public static void main(String[] args) throws Exception {
+        mainThread = Thread.currentThread();
+        URL[] urls = new URL[args.length];
+        for (int i = 0; i < args.length; i++) {
+            urls[i] = new File(args[i]).toURI().toURL();
+        }
+        boolean reusable = true;
+        try {
+            System.setSecurityManager(new ExitInterceptor());
+        } catch (UnsupportedOperationException | SecurityException e) {
+            reusable = false;
+        }
+
+        PrintStream stdout = System.out;
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        while (true) {
+            ClassLoader loader = prepareClassLoader(urls, args[0]);
+            stdout.println(reusable ? "ready" : "ready once");
+            stdout.flush();
+
+            // wait for a job
+            String job = in.readLine();
+            if (job == null) {
+                break;
+            }
+            String[] srArgs = job.isEmpty() ? new String[0] : job.split("\t", -1);
+
+            if (!reusable) {
+                System.setErr(stdout);
+                Thread.currentThread().setContextClassLoader(loader);
+                Class.forName("savilerow.EPrimeTailor", true, loader).getMethod("main", String[].class).invoke(null, (Object) srArgs);
+                break;
+            }
+
+            ByteArrayOutputStream output = new ByteArrayOutputStream();
+            boolean finished = runJob(loader, srArgs, output);
+            stdout.println("done " + jobExitCode + " " + output.size());
+            output.writeTo(stdout);
+            stdout.flush();
+            if (!finished) {
+                break;
+            }
+        }
+        System.exit(0);
+    }
+}
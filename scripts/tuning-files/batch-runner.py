@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# batch version of target-runner, called by irace's targetRunnerParallel function (see target-runner-parallel.R) with all evaluations of an irace iteration
+# syntax: python batch-runner.py [--nCores <n>] <batchFile>
+# batchFile: one evaluation per line, with the same arguments as a target-runner call (<candId> <instId> <seed> <instance> <configurationValues>)
+# output: one line per evaluation, in the same order, with the same content as the output of target-runner (the last line of the out-* file, or "Error! <last line>" if it isn't a valid score)
+# evaluations are run at most nCores at a time (default: nCores of setting.json), each in a process forked from this one, so that python and the wrapper's dependencies are only loaded once per batch
+# as in target-runner, an evaluation whose out-* file already ends with a valid score isn't run again (e.g., when irace is resumed), and an evaluation is sent to the evaluation server (or broker) if it's running
+
+import os
+import sys
+import re
+import json
+import socket
+import argparse
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+import wrapper
+
+socketFile = 'evaluation-server.sock'
+scoreRegex = re.compile(r'^-?[0-9]+([.][0-9]+)?e?[+-]?([0-9]+)?$') # same as checkScore in target-runner
+
+
+def get_out_file(args):
+    return wrapper.detailedOutputDir + '/out-' + args[0] + '-' + args[2]
+
+
+def read_last_line(fn):
+    if not os.path.isfile(fn):
+        return ''
+    lsLines = wrapper.read_file(fn)
+    return lsLines[-1].rstrip('\n') if len(lsLines) > 0 else ''
+
+
+def is_valid_score(line):
+    score = line.split(' ')[0]
+    return (score == 'Inf') or (scoreRegex.match(score) is not None)
+
+
+def send_to_server(outFile, args):
+    # same request as evaluation-client.py, return the evaluation's return code, or None if the server can't take it
+    request = {'cwd': os.getcwd(), 'outFile': os.path.abspath(outFile), 'args': args}
+    try:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(socketFile)
+        s.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        response = s.makefile('rb').readline()
+        s.close()
+    except OSError:
+        return None
+    if not response:
+        return None
+    returnCode = json.loads(response.decode('utf-8'))['returnCode']
+    return None if returnCode == 99 else returnCode
+
+
+def run_evaluation(args, outFile, setting, lsMeta):
+    # run in a forked child process, which exits with the evaluation's return code
+    returnCode = None
+    try:
+        if os.path.exists(socketFile):
+            returnCode = send_to_server(outFile, args)
+        if returnCode is None:
+            # redirect stdout/stderr of this process to the out-* file, as when wrapper.py is called by target-runner
+            sys.stdout.flush()
+            sys.stderr.flush()
+            fd = os.open(outFile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.dup2(fd, 1)
+            os.dup2(fd, 2)
+            os.close(fd)
+            returnCode = 0
+            try:
+                wrapper.evaluate(['wrapper.py'] + args, setting, lsMeta)
+            except SystemExit as e:
+                returnCode = e.code if isinstance(e.code, int) else 1
+            except Exception:
+                traceback.print_exc()
+                returnCode = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(1 if returnCode is None else returnCode)
+
+
+def run_batch(lsEvaluations, nCores, setting, lsMeta):
+    # evaluations are forked from the main thread only, at most nCores at a time
+    lsPending = [args for args in lsEvaluations if not is_valid_score(read_last_line(get_out_file(args)))]
+    running = set()
+    while (len(lsPending) > 0) or (len(running) > 0):
+        while (len(lsPending) > 0) and (len(running) < nCores):
+            args = lsPending.pop(0)
+            pid = os.fork()
+            if pid == 0:
+                run_evaluation(args, get_out_file(args), setting, lsMeta)
+            running.add(pid)
+        pid, status = os.wait()
+        running.discard(pid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a batch of irace target-runner calls')
+    parser.add_argument('--nCores', default=None, type=int, help='maximum number of evaluations run at the same time. Default: nCores of setting.json')
+    parser.add_argument('batchFile', help='one evaluation per line, with the arguments of a target-runner call')
+    args = parser.parse_args()
+
+    setting = wrapper.read_setting('setting.json')
+    lsMeta = wrapper.read_meta_file()
+    nCores = args.nCores if args.nCores is not None else setting['tuningSettings']['nCores']
+    with open(args.batchFile, 'rt') as f:
+        lsEvaluations = [line.split() for line in f if line.strip() != '']
+
+    run_batch(lsEvaluations, max(nCores, 1), setting, lsMeta)
+
+    for evaluationArgs in lsEvaluations:
+        rs = read_last_line(get_out_file(evaluationArgs))
+        print(rs if is_valid_score(rs) else 'Error! ' + rs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,582 @@
+#!/usr/bin/env python
+
+# evaluation broker, to run a tuning on several machines (e.g., all nodes of a cluster allocation)
+# the broker replaces evaluation-server.py (see run.sh): irace's target-runner sends evaluations to it on the same Unix socket (via evaluation-client.py), and each evaluation is queued as a job in a SQLite database (<runDir>/evaluation-broker.db)
+# evaluation workers (this script with --broker, e.g., one per node) pull the jobs over TCP, run them with wrapper.py in a folder of their own, and send the results back
+# the broker applies the results to <runDir>/detailed-output as if the evaluation had been run locally: generator files, generated instance, results.jsonl, spans.jsonl and out-* file. The target-runner call waiting for the job then returns
+# files are exchanged as content-addressed blobs (named by the sha1 of their content, saved in <runDir>/broker-blobs and <workDir>/blobs), so that a file that hasn't changed (e.g., a generator minion file) is only sent once to each worker
+# jobs of the same generator instance (same parameter hash, see wrapper.get_param_hash) are never run at the same time, as each of them updates the generator's negative table (see wrapper.solve_generator)
+# a running job is given back to the queue if its worker doesn't send a heartbeat for leaseTimeout seconds
+# syntax:
+#   broker: python evaluation-broker.py [--runDir <runDir>] [--port <port>] [--host <host>] [--bindAddress <address>]
+#   worker: python evaluation-broker.py --broker <runDir>/evaluation-broker.json --workDir <dir> [--nJobs <n>]
+# the broker writes its address and an access token to <runDir>/evaluation-broker.json (only readable by the user), a worker needs a copy of that file
+
+import os
+import sys
+import signal
+import json
+import argparse
+import traceback
+import socket
+import socketserver
+import subprocess
+import threading
+import sqlite3
+import hashlib
+import secrets
+import tempfile
+import shutil
+import fcntl
+import glob
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+import wrapper
+
+socketFileName = 'evaluation-server.sock'
+addressFileName = 'evaluation-broker.json'
+dbFileName = 'evaluation-broker.db'
+blobsDirName = 'broker-blobs'
+scriptDir = os.path.dirname(os.path.realpath(__file__))
+
+heartbeatInterval = 30 # time (in seconds) between two heartbeats of a running job
+leaseTimeout = 120 # a running job without heartbeat for this long (in seconds) is given back to the queue
+takeWaitTime = 10 # maximum time (in seconds) a worker's request for a job waits for a job to be queued
+blobMaxAge = 3600 # blobs that haven't been used for this long (in seconds) are removed, blobs are only needed while a job is being started or finished
+blobChunkSize = 1024 * 1024 # blobs are sent and received in chunks of this size (in bytes), so that they're never fully loaded in memory
+lsRunFiles = ['setting.json', 'params.irace.meta', wrapper.detailedOutputDir + '/problem.eprime', wrapper.detailedOutputDir + '/generator.eprime'] # files of runDir every job needs (params.irace.meta only exists if some parameters are log-transformed)
+lsNodeFiles = ['core-slots', 'memory-reservations', 'memory-history.jsonl'] # files in detailed-output shared by all jobs running on the same machine (see wrapper.CoreSlots and wrapper.MemoryAdmission)
+
+
+### messages: a json header line (with the size of the payload), followed by the payload bytes ###
+
+def send_message(sock, header, payload=b''):
+    header = dict(header, size=len(payload))
+    sock.sendall((json.dumps(header) + '\n').encode('utf-8') + payload)
+
+
+def send_file_message(sock, header, fn):
+    # the payload is the content of a file, sent without reading it into memory
+    with open(fn, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        sock.sendall((json.dumps(dict(header, size=size)) + '\n').encode('utf-8'))
+        sock.sendfile(f, 0, size)
+
+
+def receive_header(f):
+    # the payload (header['size'] bytes) is then read from f, see receive_message and receive_blob
+    line = f.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    return json.loads(line.decode('utf-8'))
+
+
+def receive_message(f):
+    header = receive_header(f)
+    payload = f.read(header['size'])
+    if len(payload) < header['size']:
+        raise ConnectionError("connection closed")
+    return header, payload
+
+
+def receive_blob(f, size, blobHash, blobFile):
+    # write a payload into a blob file chunk by chunk, return False if its content doesn't match its hash
+    h = hashlib.sha1()
+    tmpFile = blobFile + '.' + str(threading.get_ident())
+    try:
+        with open(tmpFile, 'wb') as fOut:
+            while size > 0:
+                chunk = f.read(min(blobChunkSize, size))
+                if not chunk:
+                    raise ConnectionError("connection closed")
+                h.update(chunk)
+                fOut.write(chunk)
+                size -= len(chunk)
+        if h.hexdigest() != blobHash:
+            os.remove(tmpFile)
+            return False
+        os.replace(tmpFile, blobFile)
+    except BaseException:
+        if os.path.isfile(tmpFile):
+            os.remove(tmpFile)
+        raise
+    return True
+
+
+def get_file_hash(fn):
+    h = hashlib.sha1()
+    with open(fn, 'rb') as f:
+        for chunk in iter(lambda: f.read(blobChunkSize), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def copy_file(srcFile, destFile):
+    # the destination file is replaced atomically, so that it's never seen partially written (the temporary file is named by thread, as the same blob can be written by several threads)
+    tmpFile = destFile + '.' + str(threading.get_ident()) + '.tmp'
+    shutil.copyfile(srcFile, tmpFile)
+    os.replace(tmpFile, destFile)
+
+
+def get_host_address():
+    # address of this machine: the address of its host name, or the address of the network interface of the default route if the host name is mapped to a loopback address (e.g., 127.0.1.1 in /etc/hosts)
+    address = socket.gethostbyname(socket.gethostname())
+    if address.startswith('127.'):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            try:
+                s.connect(('192.0.2.1', 9)) # a documentation-only address (TEST-NET-1), connecting a UDP socket doesn't send anything
+                address = s.getsockname()[0]
+            except OSError:
+                pass
+    return address
+
+
+def remove_old_blobs(blobsDir):
+    # a blob can be shared by several files with the same content, so blobs are only removed when they haven't been used for a while
+    for fn in glob.glob(blobsDir + '/*'):
+        try:
+            if time.time() - os.stat(fn).st_mtime > blobMaxAge:
+                os.remove(fn)
+        except OSError:
+            pass
+
+
+def is_generator_file(fn, genHash):
+    # files of a generator instance that are part of a job, lock files are only used locally and minion run files are temporary
+    return os.path.basename(fn).startswith('gen-' + genHash + '.') and not fn.endswith(('.lock', '.use', '.tmp')) and not wrapper.is_minion_run_file(fn)
+
+
+### broker ###
+
+class Broker:
+
+    def __init__(self, runDir):
+        self.runDir = runDir
+        self.setting = wrapper.read_setting(runDir + '/setting.json')
+        self.lsMeta = wrapper.read_meta_file(runDir + '/params.irace.meta')
+        self.blobsDir = runDir + '/' + blobsDirName
+        os.makedirs(self.blobsDir, exist_ok=True)
+        self.fileHashes = {} # file -> (mtime, size, hash), so that unchanged files aren't hashed again
+        self.token = secrets.token_hex(16)
+
+        # all database accesses are done under this lock, it's also used to notify target-runner calls waiting for their jobs
+        # files are hashed and copied without holding it: the files of a generator instance are only used by one job at a time (see take_job and finish_job)
+        self.lock = threading.Lock()
+        self.jobChanged = threading.Condition(self.lock)
+        self.db = sqlite3.connect(runDir + '/' + dbFileName, check_same_thread=False, isolation_level=None)
+        self.db.execute('CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, args TEXT, genHash TEXT, state TEXT, worker TEXT, attempt INTEGER, leaseTime REAL, result TEXT)')
+        # jobs left by a previous broker don't have any target-runner call waiting for them anymore, irace runs them again when it's resumed
+        self.db.execute("UPDATE jobs SET state='dropped' WHERE state IN ('queued','running','finishing')")
+
+    def get_blob_file(self, blobHash):
+        return self.blobsDir + '/' + blobHash
+
+    def put_file(self, fn):
+        # add a file of runDir to the blob store, return its hash
+        st = os.stat(fn)
+        cached = self.fileHashes.get(fn)
+        if (cached is not None) and (cached[0] == st.st_mtime) and (cached[1] == st.st_size) and os.path.isfile(self.get_blob_file(cached[2])):
+            os.utime(self.get_blob_file(cached[2]))
+            return cached[2]
+        blobHash = get_file_hash(fn)
+        if os.path.isfile(self.get_blob_file(blobHash)):
+            os.utime(self.get_blob_file(blobHash))
+        else:
+            copy_file(fn, self.get_blob_file(blobHash))
+        self.fileHashes[fn] = (st.st_mtime, st.st_size, blobHash)
+        return blobHash
+
+    def get_file(self, blobHash, fn):
+        # write a blob into a file of runDir
+        copy_file(self.get_blob_file(blobHash), fn)
+        st = os.stat(fn)
+        self.fileHashes[fn] = (st.st_mtime, st.st_size, blobHash)
+
+    def submit(self, args):
+        # queue an evaluation (args: irace target-runner arguments), return the job id
+        configurationId, seed, paramDict = wrapper.read_args(['wrapper.py'] + args, self.lsMeta)
+        with self.lock:
+            cursor = self.db.execute("INSERT INTO jobs (args, genHash, state, attempt) VALUES (?, ?, 'queued', 0)", (json.dumps(args), wrapper.get_param_hash(paramDict)))
+            self.jobChanged.notify_all()
+            return cursor.lastrowid
+
+    def requeue_expired_jobs(self):
+        # called with self.lock held
+        cursor = self.db.execute("UPDATE jobs SET state='queued' WHERE state='running' AND leaseTime<?", (time.time() - leaseTimeout,))
+        if cursor.rowcount > 0:
+            wrapper.log(str(cursor.rowcount) + " job(s) given back to the queue after their worker stopped sending heartbeats")
+
+    def wait_for_job(self, jobId):
+        # wait until a job is done, return its result
+        with self.lock:
+            while True:
+                state, result = self.db.execute('SELECT state, result FROM jobs WHERE id=?', (jobId,)).fetchone()
+                if state == 'done':
+                    return json.loads(result)
+                self.requeue_expired_jobs()
+                self.jobChanged.wait(leaseTimeout)
+
+    def take_job(self, worker):
+        # give the oldest queued job whose generator instance isn't used by a running job to a worker, return None if there isn't any after takeWaitTime seconds
+        deadline = time.time() + takeWaitTime
+        with self.lock:
+            while True:
+                self.requeue_expired_jobs()
+                row = self.db.execute("SELECT id, args, genHash, attempt FROM jobs WHERE state='queued' AND genHash NOT IN (SELECT genHash FROM jobs WHERE state IN ('running','finishing')) ORDER BY id LIMIT 1").fetchone()
+                if row is not None:
+                    break
+                if time.time() >= deadline:
+                    return None
+                self.jobChanged.wait(deadline - time.time())
+            jobId, args, genHash, attempt = row
+            self.db.execute("UPDATE jobs SET state='running', worker=?, attempt=?, leaseTime=? WHERE id=?", (worker, attempt + 1, time.time(), jobId))
+
+        # current generator files, no other job of the generator instance can change them now (and results.jsonl, which is used by the surrogate filter)
+        files = {}
+        for fn in glob.glob(wrapper.detailedOutputDir + '/gen-' + genHash + '.*'):
+            if is_generator_file(fn, genHash):
+                files[os.path.relpath(fn)] = self.put_file(os.path.relpath(fn))
+        if self.setting['tuningSettings'].get('surrogateFilter', False) and os.path.isfile(wrapper.resultsFile):
+            with open(wrapper.resultsFile, 'rb') as f:
+                fcntl.flock(f, fcntl.LOCK_SH) # records are appended by apply_result
+                files[os.path.relpath(wrapper.resultsFile)] = self.put_file(os.path.relpath(wrapper.resultsFile))
+        return {'id': jobId, 'attempt': attempt + 1, 'args': json.loads(args), 'genHash': genHash, 'files': files}
+
+    def renew_lease(self, jobId, attempt):
+        # return False if the job has been given to another worker in the meantime
+        with self.lock:
+            cursor = self.db.execute("UPDATE jobs SET leaseTime=? WHERE id=? AND attempt=? AND state='running'", (time.time(), jobId, attempt))
+            return cursor.rowcount > 0
+
+    def finish_job(self, jobId, attempt, result):
+        # while its result is applied, the job is 'finishing': its lease can't expire, and no other job of its generator instance can be taken
+        with self.lock:
+            row = self.db.execute('SELECT genHash FROM jobs WHERE id=? AND attempt=? AND state=?', (jobId, attempt, 'running')).fetchone()
+            if row is None: # the job has been given to another worker in the meantime
+                return
+            self.db.execute("UPDATE jobs SET state='finishing' WHERE id=?", (jobId,))
+        try:
+            self.apply_result(row[0], result)
+        except BaseException:
+            with self.lock:
+                self.db.execute("UPDATE jobs SET state='queued' WHERE id=?", (jobId,))
+                self.jobChanged.notify_all()
+            raise
+        with self.lock:
+            self.db.execute("UPDATE jobs SET state='done', result=? WHERE id=?", (json.dumps({'returnCode': result['returnCode'], 'out': result['out']}), jobId))
+            self.jobChanged.notify_all()
+
+        remove_old_blobs(self.blobsDir)
+        if self.setting['tuningSettings'].get('diskBudget', 0) > 0:
+            wrapper.manage_disk_budget(self.setting['tuningSettings']['diskBudget'])
+            with wrapper.spansLock: # no evaluation is run by the broker, its spans aren't written anywhere
+                wrapper.lsSpans.clear()
+
+    def apply_result(self, genHash, result):
+        ### write the files of a finished job into detailed-output, called while the job is 'finishing' (see finish_job) ###
+        # result: {'returnCode', 'out': out-* file, 'generatorFiles': all generator files after the job, 'instances': generated instance files, 'results'/'spans': records appended to results.jsonl/spans.jsonl}, files are given as blob hashes
+
+        # generator files: the worker's version replaces the current one, files removed by the job are removed
+        for fn in glob.glob(wrapper.detailedOutputDir + '/gen-' + genHash + '.*'):
+            if is_generator_file(fn, genHash) and (os.path.relpath(fn) not in result['generatorFiles']):
+                os.remove(fn)
+        for fn, blobHash in result['generatorFiles'].items():
+            if not (os.path.isfile(fn) and (self.put_file(fn) == blobHash)):
+                self.get_file(blobHash, fn)
+
+        for fn, blobHash in result['instances'].items():
+            self.get_file(blobHash, fn)
+
+        for key, fn in [('results', wrapper.resultsFile), ('spans', wrapper.spansFile)]:
+            if result[key] is None:
+                continue
+            with open(self.get_blob_file(result[key]), 'rb') as fIn:
+                with open(fn, 'ab') as fOut:
+                    fcntl.flock(fOut, fcntl.LOCK_EX)
+                    shutil.copyfileobj(fIn, fOut)
+
+
+class EvaluationRequestHandler(socketserver.StreamRequestHandler):
+    # same requests as evaluation-server.py, sent by evaluation-client.py
+    # request: a json line {"cwd": <cwd>, "outFile": <out-* file>, "args": <irace target-runner arguments>}
+    # response: a json line {"returnCode": <return code of the evaluation>}
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+        if os.path.realpath(request['cwd']) != self.server.broker.runDir:
+            returnCode = 99
+        else:
+            broker = self.server.broker
+            result = broker.wait_for_job(broker.submit(request['args']))
+            shutil.copyfile(broker.get_blob_file(result['out']), request['outFile'])
+            returnCode = result['returnCode']
+        self.wfile.write((json.dumps({'returnCode': returnCode}) + '\n').encode('utf-8'))
+
+
+class EvaluationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socketFile, broker):
+        self.broker = broker
+        socketserver.UnixStreamServer.__init__(self, socketFile, EvaluationRequestHandler)
+
+
+class WorkerRequestHandler(socketserver.StreamRequestHandler):
+    # one message per connection, each request has an "op" field:
+    # - setup: files of runDir needed by all jobs, response: {"files": {<file>: <hash>}}
+    # - take {"worker"}: response {"job": <job or null>}, see Broker.take_job
+    # - has {"hashes"}: response {"missing": <hashes not in the blob store>}
+    # - get {"hash"}: response: the blob as payload
+    # - put {"hash"}: the blob as payload
+    # blobs are streamed in chunks (see send_file_message and receive_blob)
+    # - heartbeat {"id", "attempt"}: response {"ok": <whether the job still belongs to the worker>}
+    # - done {"id", "attempt", "result"}, see Broker.apply_result
+
+    def handle(self):
+        broker = self.server.broker
+        header = receive_header(self.rfile)
+        if header.get('token') != broker.token:
+            send_message(self.connection, {'error': 'invalid token'})
+            return
+        op = header['op']
+        if op == 'setup':
+            send_message(self.connection, {'files': {fn: broker.put_file(fn) for fn in lsRunFiles if os.path.isfile(fn)}})
+        elif op == 'take':
+            send_message(self.connection, {'job': broker.take_job(header['worker'])})
+        elif op == 'has':
+            send_message(self.connection, {'missing': [h for h in header['hashes'] if not os.path.isfile(broker.get_blob_file(h))]})
+        elif op == 'get':
+            send_file_message(self.connection, {}, broker.get_blob_file(header['hash']))
+        elif op == 'put':
+            if not receive_blob(self.rfile, header['size'], header['hash'], broker.get_blob_file(header['hash'])):
+                send_message(self.connection, {'error': 'corrupted blob'})
+                return
+            send_message(self.connection, {})
+        elif op == 'heartbeat':
+            send_message(self.connection, {'ok': broker.renew_lease(header['id'], header['attempt'])})
+        elif op == 'done':
+            broker.finish_job(header['id'], header['attempt'], header['result'])
+            send_message(self.connection, {})
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, bindAddress, port, broker):
+        self.broker = broker
+        socketserver.TCPServer.__init__(self, (bindAddress, port), WorkerRequestHandler)
+
+
+def serve(args):
+    # all paths used by wrapper.py are relative to runDir
+    runDir = os.path.realpath(args.runDir)
+    os.chdir(runDir)
+    if os.path.exists(socketFileName):
+        os.remove(socketFileName)
+
+    def stop(signum, frame):
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, stop)
+
+    # the worker server only listens on one address, by default the address of this machine
+    bindAddress = args.bindAddress
+    if bindAddress is None:
+        bindAddress = get_host_address() if args.host is None else socket.gethostbyname(args.host)
+    host = bindAddress if args.host is None else args.host
+
+    broker = Broker(runDir)
+    workerServer = WorkerServer(bindAddress, args.port, broker)
+    fd = os.open(addressFileName, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wt') as f:
+        json.dump({'host': host, 'port': workerServer.server_address[1], 'token': broker.token}, f)
+    threading.Thread(target=workerServer.serve_forever, daemon=True).start()
+
+    server = EvaluationServer(socketFileName, broker)
+    wrapper.log('Evaluation broker listening on ' + runDir + '/' + socketFileName + ', workers connect to ' + host + ':' + str(workerServer.server_address[1]) + ' (see ' + runDir + '/' + addressFileName + ')')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        workerServer.server_close()
+        os.remove(socketFileName)
+        os.remove(addressFileName)
+
+
+### worker ###
+
+class Worker:
+
+    def __init__(self, addressFile, workDir):
+        with open(addressFile, 'rt') as f:
+            self.address = json.load(f)
+        self.workDir = os.path.realpath(workDir)
+        self.blobsDir = self.workDir + '/blobs'
+        self.nodeDir = self.workDir + '/node' # see lsNodeFiles
+        os.makedirs(self.blobsDir, exist_ok=True)
+        os.makedirs(self.nodeDir + '/core-slots', exist_ok=True)
+        os.makedirs(self.nodeDir + '/memory-reservations', exist_ok=True)
+        self.name = socket.gethostname() + ':' + str(os.getpid())
+        self.runFiles = self.request({'op': 'setup'})[0]['files']
+
+    def request(self, header, payloadFile=None):
+        # payloadFile: file sent as the payload of the request
+        with socket.create_connection((self.address['host'], self.address['port'])) as s:
+            if payloadFile is None:
+                send_message(s, dict(header, token=self.address['token']))
+            else:
+                send_file_message(s, dict(header, token=self.address['token']), payloadFile)
+            with s.makefile('rb') as f:
+                response, data = receive_message(f)
+        if 'error' in response:
+            raise Exception("Broker error: " + response['error'])
+        return response, data
+
+    def get_blob_file(self, blobHash):
+        # download a blob if it's not in the worker's blob store yet
+        fn = self.blobsDir + '/' + blobHash
+        if os.path.isfile(fn):
+            os.utime(fn)
+            return fn
+        with socket.create_connection((self.address['host'], self.address['port'])) as s:
+            send_message(s, {'op': 'get', 'hash': blobHash, 'token': self.address['token']})
+            with s.makefile('rb') as f:
+                response = receive_header(f)
+                if 'error' in response:
+                    raise Exception("Broker error: " + response['error'])
+                if not receive_blob(f, response['size'], blobHash, fn):
+                    raise Exception("Corrupted blob " + blobHash)
+        return fn
+
+    def put_files(self, lsFiles):
+        # upload files to the broker's blob store (only those it doesn't have yet), return their hashes
+        hashes = {fn: get_file_hash(fn) for fn in lsFiles}
+        missing = self.request({'op': 'has', 'hashes': list(set(hashes.values()))})[0]['missing']
+        for fn, blobHash in hashes.items():
+            if blobHash in missing:
+                self.request({'op': 'put', 'hash': blobHash}, fn)
+                missing.remove(blobHash)
+            # generator files are kept, as they're likely to be used by the next job of the same generator instance
+            if os.path.basename(fn).startswith('gen-') and not os.path.isfile(self.blobsDir + '/' + blobHash):
+                shutil.copyfile(fn, self.blobsDir + '/' + blobHash)
+        return hashes
+
+    def make_job_dir(self, job):
+        # a copy of runDir with the files of the job, so that jobs running on this worker don't share any state
+        jobDir = tempfile.mkdtemp(prefix='job-' + str(job['id']) + '-', dir=self.workDir)
+        os.makedirs(jobDir + '/' + wrapper.detailedOutputDir)
+        for fn, blobHash in list(self.runFiles.items()) + list(job['files'].items()):
+            shutil.copyfile(self.get_blob_file(blobHash), jobDir + '/' + fn)
+        for fn in lsNodeFiles:
+            os.symlink(self.nodeDir + '/' + fn, jobDir + '/' + wrapper.detailedOutputDir + '/' + fn)
+
+        # the disk budget is managed by the broker, on all files of the experiment
+        with open(jobDir + '/setting.json', 'rt') as f:
+            setting = json.load(f)
+        setting['tuningSettings']['diskBudget'] = 0
+        with open(jobDir + '/setting.json', 'wt') as f:
+            json.dump(setting, f, indent=True)
+        return jobDir
+
+    def run_job(self, job):
+        jobDir = self.make_job_dir(job)
+        try:
+            resultsFile = jobDir + '/' + wrapper.resultsFile
+            resultsOffset = os.path.getsize(resultsFile) if os.path.isfile(resultsFile) else 0
+
+            # keep the job's lease while it's running, stop it if it's been given to another worker
+            p = None
+            stopped = threading.Event()
+            def send_heartbeats():
+                while not stopped.wait(heartbeatInterval):
+                    try:
+                        if not self.request({'op': 'heartbeat', 'id': job['id'], 'attempt': job['attempt']})[0]['ok']:
+                            wrapper.kill_process_group(p)
+                            return
+                    except OSError:
+                        pass
+            with open(jobDir + '/out', 'wb') as fOut:
+                p = subprocess.Popen([sys.executable, '-u', scriptDir + '/wrapper.py'] + job['args'], cwd=jobDir, stdout=fOut, stderr=subprocess.STDOUT, start_new_session=True)
+                heartbeats = threading.Thread(target=send_heartbeats, daemon=True)
+                heartbeats.start()
+                p.wait()
+                stopped.set()
+
+            # the part of results.jsonl written by the job
+            if os.path.isfile(resultsFile) and (os.path.getsize(resultsFile) > resultsOffset):
+                with open(resultsFile, 'rb') as f:
+                    f.seek(resultsOffset)
+                    data = f.read()
+                with open(resultsFile, 'wb') as f:
+                    f.write(data)
+            elif os.path.isfile(resultsFile):
+                os.remove(resultsFile)
+
+            detailedOutputDir = jobDir + '/' + wrapper.detailedOutputDir
+            lsGeneratorFiles = [fn for fn in glob.glob(detailedOutputDir + '/gen-' + job['genHash'] + '.*') if is_generator_file(fn, job['genHash'])]
+            lsInstanceFiles = glob.glob(detailedOutputDir + '/inst-*')
+            lsRecordFiles = [fn for fn in [resultsFile, jobDir + '/' + wrapper.spansFile] if os.path.isfile(fn)]
+            hashes = self.put_files(lsGeneratorFiles + lsInstanceFiles + lsRecordFiles + [jobDir + '/out'])
+            relpath = lambda fn: os.path.relpath(fn, jobDir)
+            result = {'returnCode': p.returncode, 'out': hashes[jobDir + '/out'], \
+                        'generatorFiles': {relpath(fn): hashes[fn] for fn in lsGeneratorFiles}, \
+                        'instances': {relpath(fn): hashes[fn] for fn in lsInstanceFiles}, \
+                        'results': hashes.get(resultsFile), 'spans': hashes.get(jobDir + '/' + wrapper.spansFile)}
+            self.request({'op': 'done', 'id': job['id'], 'attempt': job['attempt'], 'result': result})
+        finally:
+            shutil.rmtree(jobDir, ignore_errors=True)
+
+    def work(self):
+        # take and run jobs until the broker is stopped
+        while True:
+            try:
+                job = self.request({'op': 'take', 'worker': self.name})[0]['job']
+            except OSError:
+                wrapper.log("Broker is not reachable, stopping worker")
+                return
+            if job is None:
+                continue
+            wrapper.log("Running job " + str(job['id']) + ": " + ' '.join(job['args'][:3]))
+            try:
+                self.run_job(job)
+            except Exception:
+                # the job is given to another worker once its lease expires
+                traceback.print_exc()
+            remove_old_blobs(self.blobsDir)
+
+
+def work(args):
+    worker = Worker(args.broker, args.workDir)
+    wrapper.log('Evaluation worker ' + worker.name + ' running ' + str(args.nJobs) + ' job(s) at a time, connected to ' + worker.address['host'] + ':' + str(worker.address['port']))
+    lsThreads = [threading.Thread(target=worker.work) for i in range(args.nJobs)]
+    for t in lsThreads:
+        t.start()
+    for t in lsThreads:
+        t.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluation broker and workers, to run irace target-runner calls on several machines')
+    parser.add_argument('--runDir', default='./', help='(broker) directory where the experiment is run')
+    parser.add_argument('--port', default=0, type=int, help='(broker) TCP port workers connect to. Default: any free port')
+    parser.add_argument('--host', default=None, help='(broker) host name or address workers connect to. Default: the address the broker listens on')
+    parser.add_argument('--bindAddress', default=None, help='(broker) address the broker listens on for workers. Default: the address of --host, or of this machine')
+    parser.add_argument('--broker', default=None, help='(worker) copy of the evaluation-broker.json file written by the broker in runDir')
+    parser.add_argument('--workDir', default=None, help='(worker) local directory where jobs are run')
+    parser.add_argument('--nJobs', default=1, type=int, help='(worker) number of jobs run at the same time')
+    args = parser.parse_args()
+
+    # line-buffered output, so that logs can be followed
+    sys.stdout.reconfigure(line_buffering=True)
+
+    if args.broker is None:
+        serve(args)
+    else:
+        if args.workDir is None:
+            parser.error('--workDir is required with --broker')
+        work(args)
+
+
+if __name__ == '__main__':
+    main()
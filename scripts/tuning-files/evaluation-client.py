@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+# thin client of evaluation-server.py, called by target-runner
+# syntax: python evaluation-client.py <outFile> <irace target-runner arguments>
+# the evaluation output is written into <outFile> by the server, the exit code is the return code of the evaluation
+# exit code 99 means the server could not be reached or refused the request, target-runner then calls wrapper.py directly
+
+import os
+import sys
+import json
+import socket
+
+socketFile = 'evaluation-server.sock'
+
+
+def main():
+    outFile = sys.argv[1]
+    request = {'cwd': os.getcwd(), 'outFile': os.path.abspath(outFile), 'args': sys.argv[2:]}
+
+    try:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(socketFile)
+        s.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        response = s.makefile('rb').readline()
+        s.close()
+    except OSError:
+        sys.exit(99)
+
+    # an empty response means the server (or the evaluation process) was killed before finishing the evaluation
+    if not response:
+        sys.exit(99)
+    sys.exit(json.loads(response.decode('utf-8'))['returnCode'])
+
+
+main()
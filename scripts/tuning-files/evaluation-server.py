@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+
+# long-lived evaluation server for irace's target-runner
+# the server keeps wrapper.py (and its dependencies), setting.json and params.irace.meta loaded, and listens on a local Unix socket
+# every evaluation request is run in a forked child process, so concurrent evaluations don't share any state and their output goes to their own out-* file as if wrapper.py was called directly
+# syntax: python evaluation-server.py [--runDir <runDir>] [--socketFile <socketFile>]
+# requests are sent by evaluation-client.py (see target-runner)
+# if useSRPool is set in setting.json, the server also keeps a pool of warm Savile Row workers (one per irace core) in a separate process, see SavileRowWorker.java and wrapper.run_savilerow_cmd
+
+import os
+import sys
+import signal
+import json
+import argparse
+import traceback
+import socketserver
+import subprocess
+import threading
+import queue
+import shutil
+import shlex
+import select
+import tempfile
+import time
+import re
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+import wrapper
+
+socketFileName = 'evaluation-server.sock'
+scriptDir = os.path.dirname(os.path.realpath(__file__))
+
+# maximum time (in seconds) a Savile Row job waits for a warm worker before it's run as a normal savilerow process
+workerWaitTime = 5
+workerStartTimeout = 300 # maximum time (in seconds) for a Savile Row worker to be ready for a job, including its warm-up translation
+workerRetryDelay = 5 # time (in seconds) before a Savile Row worker that failed to start is started again, doubled after each failure up to workerMaxRetryDelay
+workerMaxRetryDelay = 600
+securityManagerVersions = range(12, 24) # Java versions where the workers need -Djava.security.manager=allow to run several jobs (see SavileRowWorker.java)
+# Essence Prime model and parameter translated by each worker before its first job, so that the JVM is warm
+warmUpModel = "language ESSENCE' 1.0\ngiven n : int(1..20)\nfind x : matrix indexed by [int(1..n)] of int(1..n)\nsuch that\n    allDiff(x),\n    forAll i : int(1..n-1) . |x[i] - x[i+1]| > 1,\n    sum(x[1..n/2]) <= sum(x[n/2+1..n])\n"
+warmUpParam = "language ESSENCE' 1.0\nletting n be 10\n"
+defaultJvmOptions = ['-ea', '-XX:ParallelGCThreads=1', '-Xmx8G'] # JVM options of the Savile Row workers if they can't be read from the savilerow script
+
+
+class EvaluationServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    # irace never runs more than nCores evaluations at a time, this is just to make sure the server doesn't block on accepting new requests
+    max_children = 1024
+
+    def __init__(self, socketFile, runDir, setting):
+        self.runDir = runDir
+        self.pid = os.getpid()
+        self.setting = setting
+        self.lsMeta = wrapper.read_meta_file(runDir + '/params.irace.meta')
+        socketserver.UnixStreamServer.__init__(self, socketFile, EvaluationRequestHandler)
+
+
+class EvaluationRequestHandler(socketserver.StreamRequestHandler):
+    # request: a json line {"cwd": <cwd>, "outFile": <out-* file>, "args": <irace target-runner arguments>}
+    # response: a json line {"returnCode": <return code of the evaluation>}
+    # this handler is run in a child process forked by the server
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+
+        # the cached settings are only valid for the server's runDir
+        if os.path.realpath(request['cwd']) != self.server.runDir:
+            self.reply(99)
+            return
+
+        # redirect stdout/stderr of this child process to the out-* file
+        sys.stdout.flush()
+        sys.stderr.flush()
+        fd = os.open(request['outFile'], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+
+        returnCode = 0
+        try:
+            wrapper.evaluate(['wrapper.py'] + request['args'], self.server.setting, self.server.lsMeta)
+        except SystemExit as e:
+            returnCode = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            returnCode = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        self.reply(returnCode)
+
+    def reply(self, returnCode):
+        self.wfile.write((json.dumps({'returnCode': returnCode}) + '\n').encode('utf-8'))
+
+
+def get_savilerow_jvm_options(srScript):
+    # JVM options of the savilerow script (e.g., -Xmx), so that Savile Row has the same memory limit with or without the pool
+    # they are read from the last "java ... -jar" line of the script (the one without cgroups), options using shell variables are skipped
+    lsOptions = None
+    with open(srScript, 'rt') as f:
+        for line in f:
+            lsTokens = line.split()
+            if (len(lsTokens) > 0) and (lsTokens[0] == 'exec'):
+                lsTokens = lsTokens[1:]
+            if (len(lsTokens) > 0) and (lsTokens[0] == 'java') and ('-jar' in lsTokens):
+                lsTokens = shlex.split(' '.join(lsTokens))
+                lsOptions = [token for token in lsTokens[1:lsTokens.index('-jar')] if '$' not in token]
+    if lsOptions is None:
+        wrapper.log("Cannot find the JVM options in " + srScript + ", using the default ones")
+        lsOptions = defaultJvmOptions
+    return lsOptions
+
+
+def get_java_major_version():
+    # e.g., 11 for "11.0.2" and 8 for "1.8.0", or None if it's unknown
+    try:
+        output = subprocess.run(['java', '-version'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT).stdout.decode('utf-8', errors='replace')
+    except OSError:
+        return None
+    m = re.search(r'version "(\d+)(?:\.(\d+))?', output)
+    if m is None:
+        return None
+    if m.group(1) == '1':
+        return int(m.group(2) or 0)
+    return int(m.group(1))
+
+
+class SavileRowWorkerProcess:
+    # a running Savile Row worker (see SavileRowWorker.java), its output is read with a deadline so that a job can be stopped at its time limit
+
+    def __init__(self, workerCmd):
+        # the worker's stderr (e.g., JVM warnings) goes to the pool's log, so that it's never mixed with the output of a job
+        self.p = subprocess.Popen(workerCmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self.buffer = bytearray()
+        self.eof = False
+        self.reusable = False
+
+    def read_more(self, deadline):
+        # return False if the deadline is reached (deadline=None: no deadline) or the worker's output is closed
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                return False
+        if len(select.select([self.p.stdout], [], [], timeout)[0]) == 0:
+            return False
+        data = os.read(self.p.stdout.fileno(), 65536)
+        self.buffer += data
+        self.eof = (len(data) == 0)
+        return not self.eof
+
+    def read_line(self, deadline):
+        while b'\n' not in self.buffer:
+            if not self.read_more(deadline):
+                return None
+        i = self.buffer.index(b'\n')
+        line = self.buffer[:i].decode('utf-8', errors='replace')
+        del self.buffer[:i + 1]
+        return line
+
+    def read_bytes(self, size, deadline):
+        while len(self.buffer) < size:
+            if not self.read_more(deadline):
+                return None
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def wait_ready(self, deadline):
+        line = self.read_line(deadline)
+        self.reusable = (line == 'ready')
+        return line in ['ready', 'ready once']
+
+    def run(self, args, timeout):
+        # run a job, return (output, return code, timed out), or None if the worker crashed
+        # if the job takes longer than timeout seconds (timeout=0: no limit), the worker is killed
+        deadline = time.time() + timeout if timeout > 0 else None
+        try:
+            self.p.stdin.write(('\t'.join(args) + '\n').encode('utf-8'))
+            self.p.stdin.flush()
+        except OSError:
+            return None
+        data = None
+        if self.reusable:
+            header = self.read_line(deadline)
+            if (header is not None) and header.startswith('done '):
+                returnCode, size = [int(v) for v in header.split()[1:3]]
+                data = self.read_bytes(size, deadline)
+        else:
+            # the worker exits at the end of the job
+            while self.read_more(deadline):
+                pass
+            if self.eof:
+                data = bytes(self.buffer)
+                returnCode = self.p.wait()
+        if data is not None:
+            return data.decode('utf-8', errors='replace'), returnCode, False
+        self.kill()
+        if not self.eof:
+            return bytes(self.buffer).decode('utf-8', errors='replace'), self.p.returncode, True
+        return None
+
+    def kill(self):
+        if self.p.poll() is None:
+            self.p.kill()
+        self.p.wait()
+
+
+class SavileRowPool:
+    # a pool of warm Savile Row workers (see SavileRowWorker.java)
+    # a worker runs one job after another if it can (otherwise, it's replaced by a new worker after each job). A crashed or stopped worker is replaced by a new one
+    # a worker that fails to start is started again after a delay that grows with each failure, jobs are run as normal savilerow processes in the meantime
+
+    def __init__(self, nWorkers):
+        srScript = os.path.realpath(shutil.which('savilerow'))
+        srDir = os.path.dirname(srScript)
+        self.jvmOptions = get_savilerow_jvm_options(srScript)
+        self.jars = [srDir + '/savilerow.jar', srDir + '/lib/trove.jar']
+        self.workerCmd = None # set when the worker is compiled, see get_worker_cmd
+        self.workDir = tempfile.mkdtemp(prefix='savilerow-pool-') # compiled worker and warm-up translations
+        self.lock = threading.Lock()
+        self.closed = False
+
+        # use the same solver binaries as the savilerow script
+        self.defaultArgs = []
+        for binName, flag in [('minion','-minion-bin'), ('fzn-chuffed','-chuffed-bin'), ('fzn-gecode','-gecode-bin'), ('symmetry_detect','-symdetect-bin'), ('glucose','-glucose-bin')]:
+            if os.path.isfile(srDir + '/bin/' + binName):
+                self.defaultArgs.extend([flag, srDir + '/bin/' + binName])
+
+        for fn, content in [('warm-up.eprime', warmUpModel), ('warm-up.param', warmUpParam)]:
+            with open(self.workDir + '/' + fn, 'wt') as f:
+                f.write(content)
+
+        self.idleWorkers = queue.Queue()
+        for i in range(nWorkers):
+            self.start_worker()
+
+    def get_worker_cmd(self):
+        # the worker is compiled once, return None if it fails (it's tried again at the next worker start)
+        with self.lock:
+            if self.workerCmd is None:
+                try:
+                    rs = subprocess.run(['javac', '-d', self.workDir, scriptDir + '/SavileRowWorker.java'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                except OSError as e:
+                    wrapper.log("Cannot compile Savile Row worker: " + str(e))
+                    return None
+                if rs.returncode != 0:
+                    wrapper.log("Cannot compile Savile Row worker: " + rs.stdout.decode('utf-8', errors='replace'))
+                    return None
+                lsOptions = self.jvmOptions
+                if get_java_major_version() in securityManagerVersions:
+                    lsOptions = lsOptions + ['-Djava.security.manager=allow']
+                self.workerCmd = ['java'] + lsOptions + ['-cp', self.workDir, 'SavileRowWorker'] + self.jars
+            return self.workerCmd
+
+    def start_worker(self):
+        threading.Thread(target=self.warm_up_worker, daemon=True).start()
+
+    def warm_up_worker(self):
+        delay = workerRetryDelay
+        while not self.closed:
+            worker = self.launch_worker()
+            if worker is not None:
+                self.idleWorkers.put(worker)
+                return
+            wrapper.log("Starting a new Savile Row worker in " + str(delay) + "s")
+            time.sleep(delay)
+            delay = min(2 * delay, workerMaxRetryDelay)
+
+    def launch_worker(self):
+        # return a warm worker, or None if it can't be started
+        workerCmd = self.get_worker_cmd()
+        if workerCmd is None:
+            return None
+        try:
+            worker = SavileRowWorkerProcess(workerCmd)
+        except OSError as e:
+            wrapper.log("Cannot start Savile Row worker: " + str(e))
+            return None
+        deadline = time.time() + workerStartTimeout
+        if worker.wait_ready(deadline) and self.warm_up(worker, deadline):
+            return worker
+        wrapper.log("Savile Row worker failed to start")
+        worker.kill()
+        return None
+
+    def warm_up(self, worker, deadline):
+        # translate a small model, so that the JIT-compiled code used by Savile Row is ready for the first job (workers running only one job can't do it)
+        if not worker.reusable:
+            return True
+        outDir = tempfile.mkdtemp(dir=self.workDir)
+        try:
+            args = [self.workDir + '/warm-up.eprime', self.workDir + '/warm-up.param', '-out-minion', outDir + '/warm-up.minion', '-out-aux', outDir + '/warm-up.aux', '-save-symbols']
+            rs = worker.run(self.defaultArgs + args, max(deadline - time.time(), 1))
+        finally:
+            shutil.rmtree(outDir, ignore_errors=True)
+        if (rs is None) or rs[2]:
+            return False
+        if rs[1] != 0:
+            wrapper.log("Savile Row worker warm-up failed: " + rs[0])
+        return worker.wait_ready(deadline)
+
+    def release_worker(self, worker):
+        # the worker is idle again once it's ready for the next job
+        def wait_ready():
+            if worker.wait_ready(time.time() + workerStartTimeout):
+                self.idleWorkers.put(worker)
+            else:
+                worker.kill()
+                self.start_worker()
+        threading.Thread(target=wait_ready, daemon=True).start()
+
+    def run(self, args, timeout=0):
+        # run a Savile Row job on a warm worker, return output and return code, or None if no worker is available or the worker crashed
+        # timeout (in seconds): as in wrapper.run_cmd, the job is stopped if it's reached and timeLimitMessage is added to the output
+        try:
+            worker = self.idleWorkers.get(timeout=workerWaitTime)
+        except queue.Empty:
+            return None
+
+        rs = worker.run(self.defaultArgs + args, timeout)
+        if (rs is not None) and worker.reusable and (worker.p.poll() is None):
+            self.release_worker(worker)
+        else:
+            worker.kill()
+            self.start_worker()
+        if rs is None:
+            wrapper.log("Savile Row worker crashed")
+            return None
+        output, returnCode, timedOut = rs
+        if timedOut:
+            return output + '\n' + wrapper.timeLimitMessage + ' (' + str(timeout) + 's)\n', returnCode
+
+        # the JVM is killed or crashed, rather than Savile Row exiting with an error
+        if (returnCode < 0) or ('A fatal error has been detected by the Java Runtime Environment' in output):
+            wrapper.log("Savile Row worker crashed: " + output)
+            return None
+        return output, returnCode
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self.idleWorkers.get_nowait().kill()
+            except queue.Empty:
+                break
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+
+class SavileRowPoolServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socketFile, runDir, nWorkers):
+        self.runDir = runDir
+        self.pool = SavileRowPool(nWorkers)
+        socketserver.UnixStreamServer.__init__(self, socketFile, SavileRowPoolRequestHandler)
+
+
+class SavileRowPoolRequestHandler(socketserver.StreamRequestHandler):
+    # request: a json line {"cwd": <cwd>, "args": <savilerow arguments>, "timeout": <time limit in seconds, 0 if none>}
+    # response: a json line {"output": <savilerow output>, "returnCode": <savilerow return code>}, or {"crashed": true} if the job must be run as a normal savilerow process
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+
+        # workers are started in runDir, so relative paths are only valid there
+        rs = None
+        if os.path.realpath(request['cwd']) == self.server.runDir:
+            rs = self.server.pool.run(request['args'], request.get('timeout', 0))
+
+        if rs is None:
+            response = {'crashed': True}
+        else:
+            response = {'output': rs[0], 'returnCode': rs[1]}
+        self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+
+def serve_savilerow_pool(runDir, nWorkers):
+    if os.path.exists(wrapper.savilerowPoolSocketFile):
+        os.remove(wrapper.savilerowPoolSocketFile)
+    server = SavileRowPoolServer(wrapper.savilerowPoolSocketFile, runDir, nWorkers)
+    wrapper.log('Savile Row pool with ' + str(nWorkers) + ' workers listening on ' + os.path.abspath(wrapper.savilerowPoolSocketFile))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.pool.close()
+        os.remove(wrapper.savilerowPoolSocketFile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-lived evaluation server for irace target-runner calls')
+    parser.add_argument('--runDir', default='./', help='directory where the experiment is run')
+    parser.add_argument('--socketFile', default=socketFileName, help='Unix socket file, relative to runDir')
+    args = parser.parse_args()
+
+    # all paths used by wrapper.py are relative to runDir
+    runDir = os.path.realpath(args.runDir)
+    os.chdir(runDir)
+    if os.path.exists(args.socketFile):
+        os.remove(args.socketFile)
+
+    # make sure the socket file is removed when the server is killed (e.g., by run.sh when irace is finished)
+    def stop(signum, frame):
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, stop)
+
+    # line-buffered output, as evaluation output is written straight into out-* files
+    sys.stdout.reconfigure(line_buffering=True)
+
+    setting = wrapper.read_setting(runDir + '/setting.json')
+
+    # start the Savile Row pool in its own process, so that the evaluation server itself is never forked with running threads
+    poolPid = None
+    if setting['tuningSettings'].get('useSRPool', False):
+        poolPid = os.fork()
+        if poolPid == 0:
+            try:
+                serve_savilerow_pool(runDir, setting['tuningSettings']['nCores'])
+            finally:
+                os._exit(0)
+
+    server = EvaluationServer(args.socketFile, runDir, setting)
+    wrapper.log('Evaluation server listening on ' + runDir + '/' + args.socketFile)
+    try:
+        server.serve_forever()
+    finally:
+        if os.getpid() == server.pid:
+            server.server_close()
+            os.remove(args.socketFile)
+            if poolPid is not None:
+                os.kill(poolPid, signal.SIGTERM)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,10 @@
 cp problem.eprime generator.eprime detailed-output/
 
+# start the evaluation server, target-runner will send evaluations to it instead of starting a new python process for each of them
+# (evaluation-broker.py if the experiment is set up with --distributed: evaluations are then run by evaluation workers, see README)
+python3 -u $(dirname <targetRunner>)/<evaluationServer> --runDir ./ > evaluation-server.log 2>&1 &
+serverPid=$!
+
 irace --seed <seed> --scenario scenario.txt --parameter-file params.irace --train-instances-file instances --exec-dir ./ --max-experiments <maxExperiments> --target-runner <targetRunner>
 
+kill ${serverPid}
@@ -13,44 +13,125 @@ import glob
 import shlex
 import re
 import json
+import socket
+import signal
+import threading
+import tempfile
+import hashlib
+import fcntl
+import resource
+import math
+import select
+import struct
+import ctypes
+import mmap
+import gzip
+import zlib
+import traceback
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from shutil import move
 import datetime
 from shutil import copyfile
+from shutil import rmtree
+from shutil import copyfileobj
 import numpy as np
 
 detailedOutputDir = './detailed-output'
-
+translationCacheName = 'translation-cache' # Savile Row translations of problem instances are cached in this folder of the evaluation's work directory, see translate_instance
+resultsFile = detailedOutputDir + '/results.jsonl' # one json record per evaluation, see write_result_record
+spansFile = detailedOutputDir + '/spans.jsonl' # timing spans of each evaluation, see span
+solverLimitGrace = 5 # extra time (in seconds) given to a solver on top of its time limit before it's killed by run_solver
+filePollInterval = 0.05 # polling interval (in seconds) of wait_for_file when inotify is not available
+coreSlotsDir = detailedOutputDir + '/core-slots' # lock files of the core slots shared by all evaluations, see CoreSlots
+coreSlotPollInterval = 0.1 # polling interval (in seconds) when waiting for a free core slot
+memoryReservationsDir = detailedOutputDir + '/memory-reservations' # reservations of the memory budget, one folder per machine, see MemoryAdmission
+memoryHistoryFile = detailedOutputDir + '/memory-history.jsonl' # peak memory usage of the commands run with a memory budget, used to estimate their footprints
+memoryPollInterval = 0.5 # polling interval (in seconds) when waiting for the memory budget
+defaultMemoryEstimate = 2048 # estimated footprint (in MB) of a type of command that hasn't been run yet and has no memory limit
+memoryEstimateMargin = 1.2 # estimated footprints are the peak usage of similar commands plus this margin
+memoryLimitHitFraction = 0.8 # without cgroup, a failed command is considered to have hit its memory limit if its peak resident memory reaches this fraction of the limit, or if its output has one of lsAllocationErrors, see MemoryLimit
+lsAllocationErrors = ['MemoryError', 'std::bad_alloc', 'OutOfMemoryError', 'Cannot allocate memory', 'insufficient memory', 'Out of memory', 'out of memory']
+ulimitFlags = {resource.RLIMIT_CPU: ('-t', 1), resource.RLIMIT_AS: ('-v', 1024), resource.RLIMIT_DATA: ('-d', 1024)} # flag of the shell's ulimit command for each limit, and its unit (in seconds or bytes)
+memLimitMessage = 'Wrapper: memory limit exceeded' # added to the output of a command that hits its memory limit, see run_cmd
+timeLimitMessage = 'Wrapper: time limit exceeded' # added to the output of a command killed by the wrapper at its time limit, see run_cmd
+cmdTimeoutGrace = 60 # extra time (in seconds) given to Savile Row, minion and conjure on top of their own time limits before they're killed by the wrapper
+cmdKillWait = 5 # time (in seconds) to wait for the rest of the output of a command after its process group is killed
+maxOutputHead = 64 * 1024 # the output of a command is captured as it arrives and only its first maxOutputHead bytes and last maxOutputTail bytes are kept, plus the lines with one of lsOutputMarkers in between (at most maxMarkerLines), see OutputCapture
+maxOutputTail = 1024 * 1024
+maxMarkerLines = 1000
+lsOutputMarkers = ['Time out.', 'Solutions Found: ', 'Savile Row timed out', 'GC overhead limit exceeded', 'Error: maximum memory exceeded', 'Memory exhausted!', 'increase MAX_VARS', '=====UNSATISFIABLE=====', '=====UNKNOWN====='] + lsAllocationErrors # status messages of Savile Row, minion, conjure and the solvers
+solverStatusLines = {'flatzinc': ['=====UNSATISFIABLE=====', '----------', '=====UNKNOWN====='],
+                        'dimacs': ['s UNSATISFIABLE', 's SATISFIABLE', 's OPTIMUM FOUND', 's UNKNOWN', 's INDETERMINATE'],
+                        'smt': ['unsat', 'sat', 'unknown']} # whole lines of a solver's output that give its status (see parse_solver_output), kept by OutputCapture as markers
+framedTableMarker = '#framed' # first line of a binary negative table whose records are framed, see get_binary_negative_table_file
+frameTrailer = struct.Struct('<II') # trailer of each record of a framed binary negative table: size and crc32 of the record
+tmpfsDir = '/dev/shm' # minion files of compressed generator instances are decompressed there if possible, see make_minion_run_file
+savilerowPoolSocketFile = './savilerow-pool.sock' # socket of the Savile Row pool, only exists when evaluation-server.py is run with useSRPool
+surrogateNeighbours = 10 # number of nearest evaluated configurations used by the surrogate filter, see SurrogateFilter
+artefactsLockFile = detailedOutputDir + '/artefacts.lock' # lock of the disk budget check, also saves the time of the last check, see manage_disk_budget
+artefactsLogFile = detailedOutputDir + '/artefacts.log' # log of compressed/evicted files
+diskCheckInterval = 60 # minimum time (in seconds) between two disk budget checks
+eliteFraction = 0.1 # generator instances among the best eliteFraction (by their best score so far) are less likely to be evicted, see manage_disk_budget
+eliteWeight = 4
+
+# solver options
+# - SRBackend, SROutputFlag, extension: Savile Row backend flag, Savile Row output flag and extension of the translated file, used when the solver is called directly (see translate_instance)
+# - solverCmd, outputFormat: solver command and format of its output, used when the solver is called directly (see solve_translated_instance)
+# - cpuLimit: whether the solver's CPU time can be limited via RLIMIT_CPU when it's called directly (not the case for multi-threaded solvers)
 solverInfo = {}
 solverInfo['cplex'] = {'timelimitUnit': 'ms', 
                             'timelimitPrefix': '--time-limit ',
-                            'randomSeedPrefix': 'via text file'}
+                            'randomSeedPrefix': 'via text file',
+                            'SRBackend': '-minizinc', 'SROutputFlag': '-out-minizinc', 'extension': '.mzn',
+                            'solverCmd': 'minizinc --solver cplex', 'outputFormat': 'flatzinc', 'cpuLimit': False}
 solverInfo['chuffed'] = {'timelimitUnit': 'ms',
                             'timelimitPrefix': '-t ',
-                            'randomSeedPrefix': '--rnd-seed '}
+                            'randomSeedPrefix': '--rnd-seed ',
+                            'SRBackend': '-chuffed', 'SROutputFlag': '-out-flatzinc', 'extension': '.fzn',
+                            'solverCmd': 'fzn-chuffed', 'outputFormat': 'flatzinc', 'cpuLimit': True}
 solverInfo['minion'] = {'timelimitUnit': 's',
                             'timelimitPrefix': '-timelimit ',
-                            'randomSeedPrefix': '-randomseed '}
+                            'randomSeedPrefix': '-randomseed ',
+                            'SRBackend': '-minion', 'SROutputFlag': '-out-minion', 'extension': '.minion',
+                            'solverCmd': 'minion', 'outputFormat': 'minion', 'cpuLimit': True}
 solverInfo['gecode'] = {'timelimitUnit': 'ms',
                             'timelimitPrefix': '-time ',
-                            'randomSeedPrefix': '-r '}
+                            'randomSeedPrefix': '-r ',
+                            'SRBackend': '-gecode', 'SROutputFlag': '-out-flatzinc', 'extension': '.fzn',
+                            'solverCmd': 'fzn-gecode', 'outputFormat': 'flatzinc', 'cpuLimit': True}
 solverInfo['glucose'] = {'timelimitUnit': 's',
                             'timelimitPrefix': '-cpu-lim=',
-                            'randomSeedPrefix': '-rnd-seed='}
+                            'randomSeedPrefix': '-rnd-seed=',
+                            'SRBackend': '-sat', 'SROutputFlag': '-out-sat', 'extension': '.dimacs',
+                            'solverCmd': 'glucose', 'outputFormat': 'dimacs', 'cpuLimit': True}
 solverInfo['glucose-syrup'] = {'timelimitUnit': 's',
                             'timelimitPrefix': '-cpu-lim=',
-                            'randomSeedPrefix': '-rnd-seed='}
+                            'randomSeedPrefix': '-rnd-seed=',
+                            'SRBackend': '-sat', 'SROutputFlag': '-out-sat', 'extension': '.dimacs',
+                            'solverCmd': 'glucose-syrup', 'outputFormat': 'dimacs', 'cpuLimit': False}
 solverInfo['lingeling'] = {'timelimitUnit': 's',
                             'timelimitPrefix': '-T ',
-                            'randomSeedPrefix': '--seed '}
+                            'randomSeedPrefix': '--seed ',
+                            'SRBackend': '-sat', 'SROutputFlag': '-out-sat', 'extension': '.dimacs',
+                            'solverCmd': 'lingeling', 'outputFormat': 'dimacs', 'cpuLimit': True}
 solverInfo['cadical'] = {'timelimitUnit': 's',
                             'timelimitPrefix': '-t ',
-                            'randomSeedPrefix': '--seed='}
+                            'randomSeedPrefix': '--seed=',
+                            'SRBackend': '-sat', 'SROutputFlag': '-out-sat', 'extension': '.dimacs',
+                            'solverCmd': 'cadical', 'outputFormat': 'dimacs', 'cpuLimit': True}
 solverInfo['open-wbo'] = {'timelimitUnit': 's',
                             'timelimitPrefix': '-cpu-lim=',
-                            'randomSeedPrefix': '-rnd-seed='}
+                            'randomSeedPrefix': '-rnd-seed=',
+                            'SRBackend': '-maxsat', 'SROutputFlag': '-out-maxsat', 'extension': '.wcnf',
+                            'solverCmd': 'open-wbo', 'outputFormat': 'dimacs', 'cpuLimit': True}
 solverInfo['boolector'] = {'timelimitUnit': 's',
                             'timelimitPrefix': '--time=',
-                            'randomSeedPrefix': '--seed='}
+                            'randomSeedPrefix': '--seed=',
+                            'SRBackend': '-smt', 'SROutputFlag': '-out-smt', 'extension': '.smt2',
+                            'solverCmd': 'boolector', 'outputFormat': 'smt', 'cpuLimit': True}
 
 
 def log(logMessage):
@@ -73,19 +154,512 @@ def search_string(s, lsStrs):
     return lsOut
 
 
+# timing spans of the current evaluation (see span and write_spans)
+lsSpans = []
+spansLock = threading.Lock()
+spanState = threading.local()
+
+
+def get_span_stack():
+    # ids of the open spans of the current thread
+    if not hasattr(spanState, 'stack'):
+        spanState.stack = []
+    return spanState.stack
+
+
+@contextmanager
+def span(name):
+    ### time a stage of the evaluation, can be used as a "with" statement or as a function decorator ###
+    # spans are nested: a span started while another one is open in the same thread is its child
+    stack = get_span_stack()
+    with spansLock:
+        spanId = len(lsSpans)
+        lsSpans.append({'id': spanId, 'parent': stack[-1] if len(stack) > 0 else None, 'name': name, 'start': time.time(), 'duration': None})
+    stack.append(spanId)
+    try:
+        yield
+    finally:
+        stack.pop()
+        lsSpans[spanId]['duration'] = time.time() - lsSpans[spanId]['start']
+
+
+def write_spans(args):
+    # append all spans of the evaluation as a json line to the spans file (see scripts/profile-report.py)
+    # spans are only recorded during an evaluation, so that processes running several evaluations don't keep them all
+    with spansLock:
+        lsFinished = [s for s in lsSpans if s['duration'] is not None]
+        lsSpans.clear()
+    if len(lsFinished) == 0:
+        return
+    with open(spansFile, 'at') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.write(json.dumps({'args': args[1:5], 'spans': lsFinished}) + '\n')
+        f.flush()
+
+
+def get_command_name(lsCmds):
+    # name of a subprocess in timing spans, e.g., "conjure translate-solution"
+    name = os.path.basename(lsCmds[0])
+    if (name == 'conjure') and (len(lsCmds) > 1):
+        name += ' ' + lsCmds[1]
+    return 'cmd:' + name
+
+
+class RunCancelled(Exception):
+    pass
+
+
+class CoreSlots:
+    # nCores core slots shared by all evaluations running at the same time on this machine (see sharedCores), each CPU-heavy stage of an evaluation holds one slot while it runs:
+    # generator translation, generator solving with minion, generator solution parsing, and each solver run of the generated instance
+    # a slot is a lock file in coreSlotsDir, so slots held by a killed evaluation are freed automatically
+    # an evaluation doesn't hold any slot while it waits for its solver runs, so when irace only has a few evaluations running (e.g., at the end of a race iteration), their solver runs can use the idle cores (up to nEvaluationWorkers runs per evaluation)
+
+    def __init__(self, nSlots):
+        self.nSlots = nSlots
+        os.makedirs(coreSlotsDir, exist_ok=True)
+
+    @contextmanager
+    def hold(self, runGroup=None):
+        f = None
+        with span('wait_core_slot'):
+            start = random.randrange(self.nSlots) # spread the slots tried first, so that waiting evaluations don't all poll the same lock file
+            while f is None:
+                for k in range(self.nSlots):
+                    f = open(coreSlotsDir + '/slot-' + str((start + k) % self.nSlots), 'a')
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        f.close()
+                        f = None
+                if f is None:
+                    if (runGroup is not None) and runGroup.cancelled:
+                        raise RunCancelled()
+                    time.sleep(coreSlotPollInterval)
+        try:
+            yield
+        finally:
+            f.close()
+
+
+coreSlots = None # CoreSlots, only used with sharedCores, see evaluate
+
+
+@contextmanager
+def core_slot(runGroup=None):
+    # hold a core slot during a CPU-heavy stage if sharedCores is used
+    if coreSlots is None:
+        yield
+    else:
+        with coreSlots.hold(runGroup):
+            yield
+
+
+class MemoryAdmission:
+    # node-level admission control of memory-heavy commands (Savile Row and conjure JVMs, minion, solvers), only used with memoryBudget
+    # before it's started, a command reserves its estimated memory footprint, and waits until the reservations of all commands running on this machine fit in memoryBudget (in MB). A command is always started if nothing else is reserved, so that a command larger than the budget can still run
+    # reservations are files in memoryReservationsDir/<hostname>, named after the pid of the evaluation making them, so that reservations of a killed evaluation are ignored
+    # footprints are estimated from the peak memory usage of earlier commands of the same type with a similar input size, saved in memoryHistoryFile (see estimate)
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.reservationsDir = memoryReservationsDir + '/' + socket.gethostname()
+        os.makedirs(self.reservationsDir, exist_ok=True)
+        self.offset = 0
+        self.history = {} # command type -> list of (input size, peak memory usage)
+
+    def update(self):
+        # read records appended to memoryHistoryFile since the last update
+        if not os.path.isfile(memoryHistoryFile):
+            return
+        with open(memoryHistoryFile, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1 # the last record may still be being written
+        for line in data[:end].decode('utf-8').split('\n'):
+            if line == '':
+                continue
+            record = json.loads(line)
+            self.history.setdefault(record['key'], []).append((record['size'], record['peak']))
+        self.offset += end
+
+    def estimate(self, memKey, memSize, memLimit=0):
+        # estimated footprint (in MB) of a command: the largest peak usage of the same type of commands whose input size is within a factor of 2, or the peak usage of the command with the closest input size scaled to the input size
+        # commands that haven't been run yet are estimated at their memory limit, or defaultMemoryEstimate if there isn't any
+        self.update()
+        lsRecords = self.history.get(memKey, [])
+        lsPeaks = [peak for size, peak in lsRecords if (size <= 2 * memSize) and (memSize <= 2 * size)]
+        if len(lsPeaks) > 0:
+            est = max(lsPeaks) * memoryEstimateMargin
+        elif len(lsRecords) > 0:
+            size, peak = min(lsRecords, key=lambda r: abs(math.log(max(r[0], 1) / max(memSize, 1))))
+            est = peak * max(1, memSize / max(size, 1)) * memoryEstimateMargin
+        elif memLimit > 0:
+            est = memLimit
+        else:
+            est = defaultMemoryEstimate
+        if memLimit > 0:
+            est = min(est, memLimit)
+        return int(math.ceil(est))
+
+    def get_reserved(self):
+        # total memory (in MB) reserved by the running evaluations, reservations of evaluations that don't exist anymore are removed
+        total = 0
+        for fn in glob.glob(self.reservationsDir + '/*.mem'):
+            try:
+                os.kill(int(os.path.basename(fn).split('-')[0]), 0)
+            except ProcessLookupError:
+                deleteFile(fn)
+                continue
+            except PermissionError:
+                pass
+            try:
+                total += int(read_file(fn)[0])
+            except (OSError, IndexError, ValueError): # removed in the meantime, or still being written
+                pass
+        return total
+
+    @contextmanager
+    def reserve(self, memKey, memSize, memLimit=0, runGroup=None):
+        # the yielded reservation gets the command's peak memory usage ('peak', in MB) once it's finished, which is then added to memoryHistoryFile
+        est = self.estimate(memKey, memSize, memLimit)
+        reservationFile = None
+        with span('wait_memory'):
+            while reservationFile is None:
+                with open(self.reservationsDir + '/lock', 'a') as lockFile:
+                    fcntl.flock(lockFile, fcntl.LOCK_EX)
+                    reserved = self.get_reserved()
+                    if (reserved == 0) or (reserved + est <= self.budget):
+                        fd, reservationFile = tempfile.mkstemp(prefix=str(os.getpid()) + '-', suffix='.mem', dir=self.reservationsDir)
+                        with os.fdopen(fd, 'wt') as f:
+                            f.write(str(est))
+                if reservationFile is None:
+                    if (runGroup is not None) and runGroup.cancelled:
+                        raise RunCancelled()
+                    time.sleep(memoryPollInterval)
+        reservation = {'key': memKey, 'size': memSize, 'estimate': est}
+        try:
+            yield reservation
+        finally:
+            deleteFile(reservationFile)
+        if reservation.get('peak') is not None:
+            with open(memoryHistoryFile, 'at') as f:
+                f.write(json.dumps({'key': memKey, 'size': memSize, 'peak': reservation['peak']}) + '\n')
+
+
+memoryAdmission = None # MemoryAdmission, only used with memoryBudget, see evaluate
+memoryCgroupDir = '' # delegated cgroup v2 folder in which memory limits are enforced, see MemoryLimit
+
+
+@contextmanager
+def memory_reservation(memKey, memSize=0, memLimit=0, runGroup=None):
+    # reserve the estimated memory footprint of a command while it runs if memoryBudget is used (memKey: type of command, memSize: size of its input in bytes)
+    # yield the reservation, or None if the memory budget isn't used
+    if (memoryAdmission is None) or (memKey is None):
+        yield None
+    else:
+        with memoryAdmission.reserve(memKey, memSize, memLimit, runGroup) as reservation:
+            yield reservation
+
+
+class RunGroup:
+    # subprocesses started for a single solver run, so that the run can be cancelled when its result is no longer needed (see solve_runs)
+    # each subprocess is started in its own process group, cancelling the run kills all those process groups
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes = []
+        self.cancelled = False
+
+    def start(self, lsCmds):
+        with self.lock:
+            if self.cancelled:
+                raise RunCancelled()
+            p = subprocess.Popen(lsCmds,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,start_new_session=True)
+            self.processes.append(p)
+        return p
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            for p in self.processes:
+                kill_process_group(p)
+
+
+def kill_process_group(p):
+    if p.poll() is None:
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class MemoryLimit:
+    # memory limit (in MB) of a subprocess, set by a shell before it executes the command (see get_shell_commands and limit_command), so that no process started by the command escapes it
+    # if memoryCgroupDir is set (a cgroup v2 folder delegated to the user, with the memory controller enabled for its children), the shell moves itself into its own child cgroup with memory.max=limit. The limit then applies to the process and all its children together, and the peak usage and OOM kills are read from the cgroup
+    # otherwise, the limit is set via rlimit on the process and inherited by each of its children separately. RLIMIT_DATA is used by default rather than RLIMIT_AS, as the JVM reserves a lot more address space than it uses
+
+    def __init__(self, limit, rlimit=resource.RLIMIT_DATA):
+        self.limit = limit
+        self.rlimit = rlimit
+        self.cgroup = None
+        if (limit <= 0) or (memoryCgroupDir == ''):
+            return
+        try:
+            self.cgroup = tempfile.mkdtemp(prefix='wrapper-', dir=memoryCgroupDir)
+            with open(self.cgroup + '/memory.max', 'wt') as f:
+                f.write(str(limit * 1024 * 1024))
+            if os.path.isfile(self.cgroup + '/memory.swap.max'):
+                with open(self.cgroup + '/memory.swap.max', 'wt') as f:
+                    f.write('0')
+        except OSError as e:
+            self.close()
+            raise Exception("ERROR: cannot set memory limit in cgroup " + memoryCgroupDir + ": " + str(e))
+
+    def get_shell_commands(self):
+        if self.limit <= 0:
+            return []
+        if self.cgroup is not None:
+            return ['echo $$ > ' + shlex.quote(self.cgroup + '/cgroup.procs')]
+        return get_ulimit_commands(self.rlimit, self.limit * 1024 * 1024, self.limit * 1024 * 1024)
+
+    def get_peak(self, rusage):
+        # peak memory usage (in MB) of the process and its children, or None if unknown
+        if (self.cgroup is not None) and os.path.isfile(self.cgroup + '/memory.peak'):
+            return int(read_file(self.cgroup + '/memory.peak')[0]) / (1024 * 1024)
+        if rusage is None:
+            return None
+        return rusage.ru_maxrss / 1024
+
+    def is_hit(self, returnCode, rusage, output):
+        # whether the process was stopped by its memory limit
+        if (self.limit <= 0) or (returnCode == 0):
+            return False
+        if self.cgroup is not None:
+            events = dict(line.split() for line in read_file(self.cgroup + '/memory.events') if line.strip() != '')
+            return int(events.get('oom_kill', 0)) > 0
+        # with rlimit, an allocation above the limit fails, so the peak usage can be well below the limit
+        # a failed allocation makes the process exit with an error, or crash (SIGSEGV, SIGABRT on an uncaught std::bad_alloc, SIGKILL by the kernel). Other signals (e.g., SIGTERM, SIGFPE) are never counted as memory-outs
+        if (returnCode < 0) and (-returnCode not in [signal.SIGKILL, signal.SIGSEGV, signal.SIGABRT]):
+            return False
+        peak = self.get_peak(rusage)
+        return ((peak is not None) and (peak >= memoryLimitHitFraction * self.limit)) or (len([msg for msg in lsAllocationErrors if msg in output]) > 0)
+
+    def close(self):
+        if self.cgroup is not None:
+            try:
+                os.rmdir(self.cgroup)
+            except OSError:
+                pass
+
+
+def wait_process(p):
+    # wait for a process started by RunGroup.start, return its resource usage (including the child processes it has waited for), or None if it was already waited for by RunGroup.cancel
+    try:
+        pid, waitStatus, rusage = os.wait4(p.pid, 0)
+        p.returncode = os.waitstatus_to_exitcode(waitStatus)
+        return rusage
+    except ChildProcessError:
+        p.wait()
+        return None
+
+
+class OutputCapture:
+    # bounded capture of the output of a command, fed with chunks of output as they arrive (see run_process)
+    # the first maxOutputHead bytes and the last maxOutputTail bytes are kept. Lines dropped in between are only kept if they have one of lsOutputMarkers or are one of lsStatusLines (e.g., "s SATISFIABLE" before a large model of a SAT solver), so that the status of the command can still be read from its output
+    # markers: the markers and status lines found in the whole output
+
+    def __init__(self, lsStatusLines=None):
+        self.statusLines = set([line.encode('utf-8') for line in (lsStatusLines or [])])
+        self.head = []
+        self.headSize = 0
+        self.tail = deque()
+        self.tailSize = 0
+        self.markerLines = []
+        self.nDropped = 0
+        self.partial = b''
+        self.markers = set()
+
+    def feed(self, data):
+        lsLines = (self.partial + data).split(b'\n')
+        self.partial = lsLines.pop()
+        for line in lsLines:
+            self.add_line(line + b'\n')
+        # a line longer than the tail is split
+        if len(self.partial) > maxOutputTail:
+            self.add_line(self.partial)
+            self.partial = b''
+
+    def add_line(self, line):
+        lsFound = [marker for marker in lsOutputMarkers if marker.encode('utf-8') in line]
+        if line.strip() in self.statusLines:
+            lsFound.append(line.strip().decode('utf-8'))
+        self.markers.update(lsFound)
+        if (len(self.tail) == 0) and (self.headSize + len(line) <= maxOutputHead):
+            self.head.append(line)
+            self.headSize += len(line)
+            return
+        self.tail.append((line, len(lsFound) > 0))
+        self.tailSize += len(line)
+        while self.tailSize > maxOutputTail:
+            line, hasMarker = self.tail.popleft()
+            self.tailSize -= len(line)
+            if hasMarker and (len(self.markerLines) < maxMarkerLines):
+                self.markerLines.append(line)
+            else:
+                self.nDropped += 1
+
+    def get_output(self):
+        lsLines = self.head
+        if self.nDropped > 0:
+            lsLines = lsLines + [('Wrapper: ' + str(self.nDropped) + ' lines of output dropped\n').encode('utf-8')]
+        lsLines = lsLines + self.markerLines + [line for line, hasMarker in self.tail] + [self.partial]
+        return b''.join(lsLines).decode('utf-8', errors='replace')
+
+
+def open_pidfd(p):
+    # file descriptor that becomes readable when p exits, or None if pidfd isn't supported or p has already been waited for
+    if not hasattr(os, 'pidfd_open'):
+        return None
+    try:
+        return os.pidfd_open(p.pid)
+    except OSError:
+        return None
+
+
+async def read_output(reader, capture):
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            return
+        capture.feed(data)
+
+
+async def wait_exit(p, pidfd):
+    ### wait for p to exit without reaping it, so that wait_process can still get its resource usage ###
+    if pidfd is not None:
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+        try:
+            await exited
+        finally:
+            loop.remove_reader(pidfd)
+        return
+    # without pidfd (not Linux), poll the process state
+    while True:
+        try:
+            if os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None:
+                return
+        except ChildProcessError:
+            return
+        await asyncio.sleep(filePollInterval)
+
+
+async def run_process(lsCmds, runGroup=None, timeout=0, memLimit=0, memRlimit=resource.RLIMIT_DATA, cpuTimelimit=0, lsStatusLines=None):
+    ### run a command in an asyncio event loop, its output is captured as it arrives ###
+    # no thread is used, so several commands can be run concurrently in the same thread (e.g., with asyncio.gather)
+    # - runGroup: the command is started in its own process group, which is killed by runGroup.cancel (see RunGroup) or if the coroutine is cancelled
+    # - timeout (in seconds): wall time limit enforced by the wrapper, the command's process group is killed when it's reached
+    # - memLimit (in MB), memRlimit: see MemoryLimit. cpuTimelimit (in seconds): CPU time limit via RLIMIT_CPU, see get_cpu_limit_commands
+    #   limits are set by a shell before the command is executed (see limit_command), so that they also apply to all processes it starts (e.g., java started by the savilerow script)
+    # - lsStatusLines: whole output lines kept by the output capture on top of lsOutputMarkers (see OutputCapture)
+    # result: {'output', 'returnCode', 'wallTime', 'rusage', 'peakMemory', 'timedOut', 'memLimitHit', 'markers'}, the output is bounded (see OutputCapture)
+    if runGroup is None:
+        runGroup = RunGroup()
+    loop = asyncio.get_running_loop()
+
+    memory = MemoryLimit(memLimit, memRlimit)
+    lsLimitCommands = memory.get_shell_commands()
+    if cpuTimelimit > 0:
+        lsLimitCommands += get_cpu_limit_commands(cpuTimelimit)
 
-def run_cmd(cmd,outFile=None):
+    start = time.time()
+    try:
+        p = runGroup.start(limit_command(lsCmds, lsLimitCommands))
+    except BaseException:
+        memory.close()
+        raise
+    pidfd = open_pidfd(p)
+    capture = OutputCapture(lsStatusLines)
+    reader = asyncio.StreamReader()
+    transport = None
+    try:
+        transport, protocol = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), p.stdout)
+        timedOut = False
+        try:
+            await asyncio.wait_for(asyncio.gather(read_output(reader, capture), wait_exit(p, pidfd)), timeout if timeout > 0 else None)
+        except asyncio.TimeoutError:
+            timedOut = True
+            kill_process_group(p)
+            # the output can be kept open by a descendant that has left the process group
+            try:
+                await asyncio.wait_for(read_output(reader, capture), cmdKillWait)
+            except asyncio.TimeoutError:
+                pass
+        rusage = wait_process(p)
+        wallTime = time.time() - start
+        output = capture.get_output()
+        memLimitHit = (not timedOut) and memory.is_hit(p.returncode, rusage, output)
+        peakMemory = memory.get_peak(rusage)
+    except BaseException:
+        kill_process_group(p)
+        p.wait()
+        raise
+    finally:
+        if transport is not None:
+            transport.close()
+        if pidfd is not None:
+            os.close(pidfd)
+        memory.close()
+    return {'output': output, 'returnCode': p.returncode, 'wallTime': wallTime, 'rusage': rusage, 'peakMemory': peakMemory, 'timedOut': timedOut, 'memLimitHit': memLimitHit, 'markers': capture.markers}
+
+
+def run_cmd(cmd,outFile=None,runGroup=None,memLimit=0,memKey=None,memSize=0,timeout=0):
+    # memLimit (in MB): memory limit of the command (see MemoryLimit). If it's hit, memLimitMessage is added to the output
+    # memKey, memSize: type of the command and size of its input (in bytes), used to reserve its memory footprint if memoryBudget is used (see MemoryAdmission)
+    # timeout (in seconds): wall time limit of the command. If it's reached, the command is killed and timeLimitMessage is added to the output
     lsCmds = shlex.split(cmd)
-    p = subprocess.run(lsCmds,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
-    output = p.stdout.decode('utf-8')
+    with span(get_command_name(lsCmds)), memory_reservation(memKey, memSize, memLimit, runGroup) as reservation:
+        rs = asyncio.run(run_process(lsCmds, runGroup, timeout, memLimit))
+        if (reservation is not None) and not ((runGroup is not None) and runGroup.cancelled):
+            reservation['peak'] = rs['peakMemory']
+    if (runGroup is not None) and runGroup.cancelled:
+        raise RunCancelled()
+    output = rs['output']
+    if rs['timedOut']:
+        output += '\n' + timeLimitMessage + ' (' + str(timeout) + 's)\n'
+    elif rs['memLimitHit']:
+        output += '\n' + memLimitMessage + ' (' + str(memLimit) + 'MB)\n'
     if outFile is not None:
         with open(outFile,'wt') as f:
             f.write(output)
-    return output, p.returncode
-
-
-
-
+    return output, rs['returnCode']
+
+
+def run_savilerow_cmd(cmd, runGroup=None, memLimit=0, memKey=None, memSize=0, timeout=0):
+    # run a savilerow command on a warm Savile Row worker of evaluation-server.py if the pool is available
+    # otherwise, or if the worker crashes, run it as a normal savilerow process
+    # the time limit (see run_cmd) also applies to a worker. A command with a memory limit is always run as a normal savilerow process, as workers are shared by all commands
+    if os.path.exists(savilerowPoolSocketFile) and (memLimit <= 0):
+        request = {'cwd': os.getcwd(), 'args': shlex.split(cmd)[1:], 'timeout': timeout}
+        try:
+            with span('cmd:savilerow-pool'):
+                s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                s.connect(savilerowPoolSocketFile)
+                s.sendall((json.dumps(request) + '\n').encode('utf-8'))
+                response = json.loads(s.makefile('rb').readline().decode('utf-8'))
+                s.close()
+            if not response.get('crashed', False):
+                return response['output'], response['returnCode']
+        except (OSError, ValueError):
+            pass
+        log("Savile Row pool is not available, calling savilerow directly")
+    return run_cmd(cmd, runGroup=runGroup, memLimit=memLimit, memKey=memKey, memSize=memSize, timeout=timeout)
+
+
+@span('deleteFile')
 def deleteFile(fn):
     if isinstance(fn,list): # delete a list of files
         for name in fn:
@@ -99,46 +673,104 @@ def deleteFile(fn):
             os.remove(fn)
 
 
-def conjure_translate_parameter(eprimeModelFile, paramFile, eprimeParamFile):
+@span('wait_for_file')
+def wait_for_file(fn, timeout):
+    ### wait until a file is written, return True if it exists within timeout seconds ###
+    # on Linux, inotify is used so that we wake up as soon as the file is closed by its writer, on other platforms the file is polled every filePollInterval seconds
+    if os.path.isfile(fn):
+        return True
+    deadline = time.time() + timeout
+
+    # start watching the file's folder
+    fd = -1
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if (fd >= 0) and (libc.inotify_add_watch(fd, os.path.abspath(os.path.dirname(fn) or '.').encode('utf-8'), 0x8 | 0x80) < 0): # IN_CLOSE_WRITE | IN_MOVED_TO
+            os.close(fd)
+            fd = -1
+    except (OSError, AttributeError):
+        fd = -1
+
+    # polling fallback
+    if fd < 0:
+        while time.time() < deadline:
+            time.sleep(filePollInterval)
+            if os.path.isfile(fn):
+                return True
+        return os.path.isfile(fn)
+
+    try:
+        # the file might have been written before the watch was added
+        if os.path.isfile(fn):
+            return True
+        name = os.path.basename(fn).encode('utf-8')
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return os.path.isfile(fn)
+            if len(select.select([fd], [], [], remaining)[0]) == 0:
+                continue
+            # read inotify events: struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[len];}
+            buf = os.read(fd, 65536)
+            k = 0
+            while k < len(buf):
+                nameLen = struct.unpack_from('iIII', buf, k)[3]
+                if buf[k+16:k+16+nameLen].rstrip(b'\0') == name:
+                    return True
+                k += 16 + nameLen
+    finally:
+        os.close(fd)
+
+
+@span('conjure_translate_parameter')
+def conjure_translate_parameter(eprimeModelFile, paramFile, eprimeParamFile, runGroup=None):
     cmd = 'conjure translate-parameter ' + '--eprime=' + eprimeModelFile + ' --essence-param=' + paramFile + ' --eprime-param=' + eprimeParamFile
     log(cmd)
-    cmdOutput, returnCode = run_cmd(cmd)
+    cmdOutput, returnCode = run_cmd(cmd, runGroup=runGroup)
 
     if returnCode != 0:
         raise Exception(cmdOutput)
 
 
-def savilerow_translate(auxFile, eprimeModelFile, eprimeParamFile, minionFile, timelimit, flags):
+@span('savilerow_translate')
+def savilerow_translate(auxFile, eprimeModelFile, eprimeParamFile, minionFile, timelimit, flags, memLimit=0):
     cmd = 'savilerow ' + eprimeModelFile + ' ' + eprimeParamFile + ' -out-aux ' + auxFile + ' -out-minion ' + minionFile + ' -save-symbols '  + '-timelimit ' + str(timelimit) + ' ' + flags
     log(cmd)
 
     start = time.time() 
-    cmdOutput, returnCode = run_cmd(cmd)
+    cmdOutput, returnCode = run_savilerow_cmd(cmd, memLimit=memLimit, memKey='generator-translate', memSize=os.path.getsize(eprimeParamFile), timeout=timelimit/1000 + cmdTimeoutGrace if timelimit > 0 else 0)
     SRTime = time.time() - start
 
+    status = get_SR_status(cmdOutput, returnCode)
+    return status, SRTime
+
+
+def get_SR_status(cmdOutput, returnCode):
     status = 'SRok'
     # if returnCode !=0, check if it is because SR is out of memory or timeout
-    if ('GC overhead limit exceeded' in cmdOutput) or ('OutOfMemoryError' in cmdOutput) or ('insufficient memory' in cmdOutput):
+    if (memLimitMessage in cmdOutput) or ('GC overhead limit exceeded' in cmdOutput) or ('OutOfMemoryError' in cmdOutput) or ('insufficient memory' in cmdOutput):
         status = 'SRMemOut'
-    elif 'Savile Row timed out' in cmdOutput:
+    elif ('Savile Row timed out' in cmdOutput) or (timeLimitMessage in cmdOutput):
         status = 'SRTimeOut'
     # if returnCode != 0 and its not due to a timeout or memory issue raise exception to highlight issue
     elif returnCode != 0:
         raise Exception(cmdOutput)
-
-    return status, SRTime
+    return status
 
 
+@span('savilerow_parse_solution')
 def savilerow_parse_solution(eprimeModelFile, minionSolFile, auxFile, eprimeSolFile):
     #command syntax: savilerow generator.eprime -mode ReadSolution -out-aux output.aux -out-solution sol.test -minion-sol-file test.txt
     cmd = 'savilerow ' + eprimeModelFile + ' -mode ReadSolution -out-aux ' + auxFile + ' -out-solution ' + eprimeSolFile + ' -minion-sol-file ' + minionSolFile
-    cmdOutput, returnCode = run_cmd(cmd)
+    cmdOutput, returnCode = run_savilerow_cmd(cmd)
 
     log(cmd)
     if returnCode != 0:
         raise Exception(cmdOutput)
 
 
+@span('conjure_translate_solution')
 def conjure_translate_solution(eprimeModelFile, paramFile, eprimeSolFile, essenceSolFile):
     cmd = 'conjure translate-solution --eprime=' + eprimeModelFile + ' --essence-param=' + paramFile  + ' --eprime-solution=' + eprimeSolFile + ' --essence-solution ' + essenceSolFile
     log(cmd)
@@ -149,17 +781,20 @@ def conjure_translate_solution(eprimeModelFile, paramFile, eprimeSolFile, essenc
         raise Exception(cmdOutput)
 
 
-def run_minion(minionFile, minionSolFile, seed, timelimit, flags):
+@span('run_minion')
+def run_minion(minionFile, minionSolFile, seed, timelimit, flags, memLimit=0):
     cmd = 'minion ' + minionFile + ' -solsout ' + minionSolFile + ' -randomseed ' + str(seed) + ' -timelimit ' + str(timelimit) + ' ' + flags
     log(cmd)
 
     start = time.time()
-    cmdOutput, returnCode = run_cmd(cmd)
+    cmdOutput, returnCode = run_cmd(cmd, memLimit=memLimit, memKey='generator-minion', memSize=os.path.getsize(minionFile), timeout=timelimit + cmdTimeoutGrace if timelimit > 0 else 0)
     runTime = time.time() - start
 
     # check if minion is timeout or memout
     status = None
-    if 'Time out.' in cmdOutput:
+    if memLimitMessage in cmdOutput:
+        status = 'solverMemOut'
+    elif ('Time out.' in cmdOutput) or (timeLimitMessage in cmdOutput):
         status = 'solverTimeOut'
     elif ('Error: maximum memory exceeded' in cmdOutput) or ('Out of memory' in cmdOutput) or ('Memory exhausted!' in cmdOutput):
         status = 'solverMemOut'
@@ -169,14 +804,101 @@ def run_minion(minionFile, minionSolFile, seed, timelimit, flags):
         else:
             status = 'sat'
 
-    if returnCode != 0:
+    if (returnCode != 0) and (memLimitMessage not in cmdOutput) and (timeLimitMessage not in cmdOutput):
         raise Exception(cmdOutput)
 
     return status, runTime
 
 
-def read_minion_variables(minionFileSections):
-    search_section = minionFileSections['SEARCH']
+def index_minion_file(minionFile):
+    ### index the sections of a minion file in a single pass, without loading the file into memory ###
+    # return a list of (section name, header offset, content start offset, content end offset), in the order the sections appear in the file (a section can appear more than once)
+    index = []
+    if os.stat(minionFile).st_size == 0:
+        return index
+    with open(minionFile, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            pos = 0
+            while True:
+                pos = m.find(b'**', pos)
+                if pos < 0:
+                    break
+                end = m.find(b'**', pos + 2)
+                if end < 0:
+                    break
+                name = m[pos+2:end]
+                if not re.fullmatch(rb'[A-Z]+', name):
+                    pos += 2
+                    continue
+                # the previous section ends at this header, even if the header is on the same line with the last line of the previous section's content
+                if len(index) > 0:
+                    index[-1][3] = pos
+                # the rest of the header line is not part of the section content
+                start = m.find(b'\n', end + 2)
+                start = len(m) if start < 0 else start + 1
+                index.append([name.decode('utf-8'), pos, start, len(m)])
+                pos = start
+    return [tuple(s) for s in index]
+
+
+def read_minion_section(minionFile, sectionName, index=None):
+    # return the content lines of a section of a minion file, only that section is read from disk
+    return list(iter_minion_section(minionFile, sectionName, index))
+
+
+def iter_minion_section(minionFile, sectionName, index=None):
+    # yield the content lines of a section of a minion file one at a time, so that a large section is never held in memory
+    if index is None:
+        index = index_minion_file(minionFile)
+    with open(minionFile, 'rb') as f:
+        for name, headerPos, start, end in index:
+            if name != sectionName:
+                continue
+            f.seek(start)
+            nBytes = end - start
+            while nBytes > 0:
+                line = f.readline(nBytes)
+                nBytes -= len(line)
+                yield line.decode('utf-8')
+
+
+def copy_minion_sections(fOut, minionFile, index, newSections=None):
+    ### write a minion file to an open binary file, except its EOF section ###
+    # sections are copied byte-for-byte, unless they are in newSections (section name -> lines (any iterable, it's only read once), or None to remove the section)
+    # a replaced section is written where its first occurrence was
+    if newSections is None:
+        newSections = {}
+    written = set()
+    with open(minionFile, 'rb') as fIn:
+        # the "MINION 3" line
+        fIn.seek(0)
+        copy_bytes(fIn, fOut, index[0][1] if len(index) > 0 else os.fstat(fIn.fileno()).st_size)
+        for name, headerPos, start, end in index:
+            if name == 'EOF':
+                continue
+            if name in newSections:
+                if (name not in written) and (newSections[name] is not None):
+                    fOut.write("**{0}**\n".format(name).encode('utf-8'))
+                    for line in newSections[name]:
+                        fOut.write((line.strip() + '\n').encode('utf-8'))
+                written.add(name)
+                continue
+            fIn.seek(headerPos)
+            copy_bytes(fIn, fOut, end - headerPos)
+
+
+def copy_bytes(fIn, fOut, nBytes):
+    while nBytes > 0:
+        buf = fIn.read(min(nBytes, 1024*1024))
+        if not buf:
+            break
+        fOut.write(buf)
+        nBytes -= len(buf)
+
+
+def read_minion_variables(minionFile, index=None):
+    # only the SEARCH section is read
+    search_section = read_minion_section(minionFile, 'SEARCH', index)
     for line in search_section:
         if "PRINT" in line:
             variables = line.split("PRINT")[1]
@@ -186,82 +908,397 @@ def read_minion_variables(minionFileSections):
     raise Exception("Cant find minion ordered variables section")
 
 
-def parse_minion_file(minionFile):
-    minionFileSections= {}
-    lines = []
-    file = open(minionFile, 'r')
-    current_section = None
-    for line in file:
-        if "**" in line:
-            if current_section is not None:
-                if line.strip()[0]!='*': # in case the section header is on the same line with the last line of the previous section's content
-                    s = line[:line.find('*')]
-                    lines.append(s)
-                if current_section in minionFileSections:
-                    minionFileSections[current_section].extend(lines)
-                else:
-                    minionFileSections[current_section] = lines
-            current_section = line.replace("*", "").strip()
-            lines = []
+def parse_minion_solution(minionSolFile):
+    with open(minionSolFile) as solFile:
+        return solFile.read().strip()
+
+
+def get_negative_table_file(minionFile):
+    # the negative table of a generator minion file is saved in a separate append-only file, so that adding a solution to it doesn't require re-writing the (possibly huge) minion file
+    # file format: the first line is the list of minion variables, each of the following lines is a previously generated solution
+    return minionFile.replace('.minion','') + '.negative-table'
+
+
+@span('split_legacy_negative_table')
+def split_legacy_negative_table(minionFile):
+    # minion files written by older versions of this script contain the negative table in their TUPLELIST and CONSTRAINTS sections, move it to the negative table file
+    negativeTableFile = get_negative_table_file(minionFile)
+    if negative_table_exists(minionFile) or (not os.path.isfile(minionFile)) or (os.stat(minionFile).st_size == 0):
+        return
+    with open(minionFile, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            if m.find(b'negativeSol') < 0:
+                return
+
+    log("Moving negative table of " + minionFile + " to " + negativeTableFile)
+    index = index_minion_file(minionFile)
+    variables = read_minion_variables(minionFile, index)
+    tuple_list = [line.strip() for line in read_minion_section(minionFile, 'TUPLELIST', index)[1:] if line.strip() != '']
+    with open(negativeTableFile, 'wt') as f:
+        f.write('\n'.join([variables.strip()] + tuple_list) + '\n')
+    newSections = {'TUPLELIST': None, 'CONSTRAINTS': remove_legacy_negative_constraint(iter_minion_section(minionFile, 'CONSTRAINTS', index))}
+    tempFile = minionFile + '.tmp'
+    with open(tempFile, 'wb') as fOut:
+        copy_minion_sections(fOut, minionFile, index, newSections)
+        fOut.write(b'**EOF**\n')
+    os.replace(tempFile, minionFile)
+
+
+def remove_legacy_negative_constraint(lsLines):
+    # yield the non-empty constraint lines without the negativetable constraint on negativeSol
+    # the constraint can be split over several lines, only the lines from its start to its end are joined
+    pending = ''
+    for line in lsLines:
+        if (pending == '') and ('negativetable' not in line):
+            if line.strip() != '':
+                yield line
             continue
+        pending = re.sub(r'negativetable\(\[[^\]]*\],\s*negativeSol\)', '', pending + line)
+        lastStart = pending.rfind('negativetable(')
+        if (lastStart < 0) or (')' in pending[lastStart:]):
+            for pendingLine in pending.split('\n'):
+                if pendingLine.strip() != '':
+                    yield pendingLine
+            pending = ''
+    for pendingLine in pending.split('\n'):
+        if pendingLine.strip() != '':
+            yield pendingLine
+
+
+@span('make_minion_run_file')
+def make_minion_run_file(minionFile, lsExtraSolutions=[], runFileDir=None):
+    ### make the minion file that is given to minion: the generator minion file + the negative table of previously generated solutions ###
+    # lsExtraSolutions: solutions that are not in the negative table file yet but shouldn't be generated again (e.g., solutions in the solution queue)
+    # return the generator minion file itself if it's not compressed and there is no negative table yet
+    # otherwise, the run file is a temporary file in tmpfsDir (if available), so that the full minion file is never written again to the shared disk (the generator minion file is decompressed if it's compressed)
+    # if runFileDir is given (e.g., a scratch directory), the file is always written there
+    variables, tuple_list = read_negative_table(minionFile)
+    if (variables is None) and (len(lsExtraSolutions) > 0):
+        variables = read_minion_variables(minionFile).strip()
+    if variables is not None:
+        nVariables = len(variables.split(','))
+        tuple_list = tuple_list + [sol for sol in lsExtraSolutions if len(sol.split()) == nVariables]
+
+    compressed = is_compressed_generator(minionFile)
+    if (variables is None) and (not compressed):
+        return minionFile
+    if runFileDir is None:
+        runFileDir = tmpfsDir if os.access(tmpfsDir, os.W_OK) else os.path.dirname(minionFile)
+    fd, runMinionFile = tempfile.mkstemp(prefix=os.path.basename(minionFile).replace('.minion','') + '.run-', suffix='.minion', dir=runFileDir)
+    try:
+        with os.fdopen(fd, 'wb') as fOut:
+            if compressed:
+                with gzip.open(minionFile + '.gz', 'rb') as fIn:
+                    copyfileobj(fIn, fOut, 1024*1024) # the compressed file has no **EOF** marker
+            else:
+                # copy the generator minion file up to its **EOF** marker
+                copy_minion_sections(fOut, minionFile, index_minion_file(minionFile))
+            write_negative_table_sections(fOut, variables, tuple_list)
+    except BaseException:
+        deleteFile([runMinionFile])
+        raise
+    return runMinionFile
 
-        lines.append(line)
 
-    file.close() 
-    return minionFileSections
+def is_minion_run_file(fn):
+    # run files made by make_minion_run_file when tmpfsDir isn't available, or left by older versions of this script (<genFile>.run.minion)
+    return re.search(r'\.run(-[^./]+)?\.minion$', fn) is not None
 
 
-def parse_minion_solution(minionSolFile):
-    with open(minionSolFile) as solFile:
-        return solFile.read().strip()
+def write_negative_table_sections(fOut, variables, tuple_list):
+    # add the negative table and the **EOF** marker, minion accepts sections in any order
+    if variables is not None:
+        fOut.write(('\n**TUPLELIST**\nnegativeSol {0} {1}\n'.format(len(tuple_list), len(variables.split(','))) + ''.join([t + '\n' for t in tuple_list]) \
+                    + '**CONSTRAINTS**\nnegativetable([' + variables + '],negativeSol)\n').encode('utf-8'))
+    fOut.write(b'**EOF**\n')
 
 
-def write_out_modified_minion_file(minionFile, minionFileSections):
-    file = open(minionFile, 'w')
-    minionSectionKeys = ['VARIABLES','SEARCH', 'TUPLELIST', 'CONSTRAINTS']
-    file.write("MINION 3\n")
-    for key in minionSectionKeys:
-        file.write("**{0}**".format(key) + "\n")
-        for value in minionFileSections[key]:
-            file.write(value.strip() + "\n")
+def is_compressed_generator(minionFile):
+    return os.path.isfile(minionFile + '.gz')
 
-    file.write("**EOF**")
-    file.close()
 
+def generator_minion_exists(minionFile):
+    return is_compressed_generator(minionFile) or (os.path.isfile(minionFile) and (os.stat(minionFile).st_size > 0))
 
-def encode_negative_table(minionFile, minionSolString):
-    minionFileSections = parse_minion_file(minionFile)
 
-    variables = read_minion_variables(minionFileSections)
+@span('compress_generator_minion_file')
+def compress_generator_minion_file(minionFile, sourceFile=None):
+    ### replace a generator minion file by a gzip-compressed copy without its **EOF** marker (see make_minion_run_file) ###
+    # sourceFile: the uncompressed minion file if it's not at minionFile (e.g., in a scratch directory), it's removed afterwards
+    # its negative table is created in the compact format (see get_binary_negative_table_file) if it doesn't exist yet, so that the variables never have to be read from the compressed file
+    if sourceFile is None:
+        sourceFile = minionFile
+    index = index_minion_file(sourceFile)
+    if not negative_table_exists(minionFile):
+        create_negative_table(minionFile, read_minion_variables(sourceFile, index), binary=True)
+    with gzip.open(minionFile + '.gz.tmp', 'wb', compresslevel=6) as fOut:
+        copy_minion_sections(fOut, sourceFile, index)
+    os.replace(minionFile + '.gz.tmp', minionFile + '.gz')
+    os.remove(sourceFile)
+
+
+def get_binary_negative_table_file(minionFile):
+    # compact format of the negative table, used for compressed generator instances (see genCompressFiles)
+    # file format: the first line is framedTableMarker, the second line is the list of minion variables, followed by the previously generated solutions, each one a record with its values zigzag-encoded as varints and a frameTrailer
+    # the trailer of the last record allows append_negative_table to check the end of the table without reading all of it
+    # legacy format (without framedTableMarker): the first line is the list of minion variables, followed by the solutions without trailers
+    return minionFile.replace('.minion','') + '.negative-table.bin'
+
 
-    #Grab the tuple list from the parsed minion section if it exists
-    tuple_list = minionFileSections.get('TUPLELIST', [])
+def negative_table_exists(minionFile):
+    return os.path.isfile(get_binary_negative_table_file(minionFile)) or os.path.isfile(get_negative_table_file(minionFile))
 
-    #If the tuple_list is empty this must be the first time running this minion file. Add the negativetable constraint
-    if len(tuple_list) == 0:
-        minionFileSections['CONSTRAINTS'].append('negativetable([' + variables+ '],negativeSol)')
-    #otherwise, remove the first line (negativeSol ...)
+
+def create_negative_table(minionFile, variables, binary=None):
+    # the compact format is used by default if the generator minion file is compressed
+    if binary is None:
+        binary = is_compressed_generator(minionFile)
+    if binary:
+        with open(get_binary_negative_table_file(minionFile), 'wb') as f:
+            f.write((framedTableMarker + '\n' + variables.strip() + '\n').encode('utf-8'))
     else:
-        tuple_list = tuple_list[1:]
-    
-    # only update minionFile if minion finds a solution, i.e., a new instance is generated
-    if minionSolString != '':
-        tuple_list.append(minionSolString)
-        minionFileSections['TUPLELIST'] = ["negativeSol {0} {1}".format(len(tuple_list), len(variables.split(",")))]
-        minionFileSections['TUPLELIST'].extend(tuple_list)
-        write_out_modified_minion_file(minionFile, minionFileSections)
+        with open(get_negative_table_file(minionFile), 'wt') as f:
+            f.write(variables.strip() + '\n')
+
+
+def append_negative_table(minionFile, minionSolString):
+    # appending a solution only writes one record, called with the generator lock held
+    binaryFile = get_binary_negative_table_file(minionFile)
+    if os.path.isfile(binaryFile):
+        with open(binaryFile, 'r+b') as f:
+            # an incomplete record left by an interrupted append is removed first, otherwise all records appended after it would be misaligned
+            # with framed records, only the last one is checked, the whole table is only read if it's incomplete (or in the legacy format)
+            variables, framed = read_binary_negative_table_header(f)
+            nVariables = len(variables.split(','))
+            headerSize = f.tell()
+            if framed:
+                end = f.seek(0, os.SEEK_END)
+                if not is_last_record_complete(f, headerSize, end):
+                    f.seek(headerSize)
+                    end = headerSize + decode_framed_tuples(f.read(), nVariables)[1]
+            else:
+                end = headerSize + get_complete_tuples_size(f.read(), nVariables)
+            f.truncate(end)
+            f.seek(end)
+            record = encode_varint_tuple([int(v) for v in minionSolString.split()])
+            if framed:
+                record += frameTrailer.pack(len(record), zlib.crc32(record))
+            f.write(record)
+    else:
+        with open(get_negative_table_file(minionFile), 'r+b') as f:
+            # an incomplete last line left by an interrupted append is removed first, otherwise the new solution would be written on the same line and ignored by read_negative_table
+            end = get_complete_lines_size(f)
+            f.truncate(end)
+            f.seek(end)
+            f.write((minionSolString + '\n').encode('utf-8'))
+
+
+def read_negative_table(minionFile):
+    # return the minion variables of the negative table and the list of previously generated solutions, or (None, []) if there is no negative table yet
+    # an incomplete last solution is ignored, in case the wrapper was killed while writing it
+    binaryFile = get_binary_negative_table_file(minionFile)
+    if os.path.isfile(binaryFile):
+        with open(binaryFile, 'rb') as f:
+            variables, framed = read_binary_negative_table_header(f)
+            data = f.read()
+        if framed:
+            return variables, decode_framed_tuples(data, len(variables.split(',')))[0]
+        return variables, decode_varint_tuples(data, len(variables.split(',')))
+    if os.path.isfile(get_negative_table_file(minionFile)):
+        lsLines = read_file(get_negative_table_file(minionFile))
+        variables = lsLines[0].strip()
+        nVariables = len(variables.split(','))
+        return variables, [line.strip() for line in lsLines[1:] if len(line.split()) == nVariables]
+    return None, []
+
+
+def read_binary_negative_table_header(f):
+    # return the minion variables of an open binary negative table and whether its records are framed, f is then at the start of the records
+    line = f.readline().decode('utf-8').strip()
+    if line == framedTableMarker:
+        return f.readline().decode('utf-8').strip(), True
+    return line, False
+
+
+def is_last_record_complete(f, headerSize, size):
+    # check the trailer of the last record of a framed binary negative table, only its end is read
+    if size == headerSize:
+        return True
+    if size - headerSize < frameTrailer.size:
+        return False
+    f.seek(size - frameTrailer.size)
+    recordSize, crc = frameTrailer.unpack(f.read(frameTrailer.size))
+    recordStart = size - frameTrailer.size - recordSize
+    if recordStart < headerSize:
+        return False
+    f.seek(recordStart)
+    return zlib.crc32(f.read(recordSize)) == crc
+
+
+def decode_framed_tuples(data, nVariables):
+    # return the tuples of the framed records at the start of data (see decode_varint_tuples), and the size of these records
+    # the records are read until the first incomplete one
+    lsTuples = []
+    size = 0
+    while size < len(data):
+        end = size
+        nValues = 0
+        while (end < len(data)) and (nValues < nVariables):
+            if not data[end] & 0x80:
+                nValues += 1
+            end += 1
+        if (nValues < nVariables) or (end + frameTrailer.size > len(data)):
+            break
+        recordSize, crc = frameTrailer.unpack_from(data, end)
+        if (recordSize != end - size) or (zlib.crc32(data[size:end]) != crc):
+            break
+        lsTuples += decode_varint_tuples(data[size:end], nVariables)
+        size = end + frameTrailer.size
+    return lsTuples, size
+
+
+def encode_varint_tuple(values):
+    data = bytearray()
+    for v in values:
+        z = 2*v if v >= 0 else -2*v - 1 # zigzag encoding, so that small negative values are also short
+        while z >= 0x80:
+            data.append((z & 0x7f) | 0x80)
+            z >>= 7
+        data.append(z)
+    return bytes(data)
+
+
+def decode_varint_tuples(data, nVariables):
+    # return the tuples as space-separated strings (the format of minion solutions)
+    lsTuples = []
+    values = []
+    z = shift = 0
+    for b in data:
+        z |= (b & 0x7f) << shift
+        if b & 0x80:
+            shift += 7
+            continue
+        values.append(str(z >> 1) if z % 2 == 0 else str(-(z >> 1) - 1))
+        z = shift = 0
+        if len(values) == nVariables:
+            lsTuples.append(' '.join(values))
+            values = []
+    return lsTuples
+
+
+def get_complete_lines_size(f, blockSize=65536):
+    # size of the complete lines at the start of an open binary file, only its end is read
+    size = f.seek(0, os.SEEK_END)
+    pos = size
+    while pos > 0:
+        blockStart = max(pos - blockSize, 0)
+        f.seek(blockStart)
+        block = f.read(pos - blockStart)
+        if (pos == size) and block.endswith(b'\n'):
+            return size
+        i = block.rfind(b'\n')
+        if i >= 0:
+            return blockStart + i + 1
+        pos = blockStart
+    return 0
+
+
+def get_complete_tuples_size(data, nVariables):
+    # size of the complete tuples at the start of data (legacy binary format without trailers), a value ends with a byte < 0x80
+    size = nValues = 0
+    for i, b in enumerate(data):
+        if not b & 0x80:
+            nValues += 1
+            if nValues == nVariables:
+                size = i + 1
+                nValues = 0
+    return size
+
+
+@span('encode_negative_table')
+def encode_negative_table(minionFile, minionSolString):
+    # only update the negative table if minion finds a solution, i.e., a new instance is generated
+    if minionSolString == '':
+        return
 
+    with open(get_generator_lock_file(minionFile), 'wt') as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
 
-def make_conjure_solve_command(essenceModelFile, eprimeModelFile, instFile, solver, SRTimelimit=0, SRFlags='', solverTimelimit=0, solverFlags='', seed=None):
+        if not negative_table_exists(minionFile):
+            create_negative_table(minionFile, read_minion_variables(minionFile))
+        append_negative_table(minionFile, minionSolString)
+
+        # the solution is now in the negative table, it can be removed from the solution queue
+        queueFile = get_solution_queue_file(minionFile)
+        lsQueue = read_solution_queue(queueFile)
+        write_solution_queue(queueFile, [(owner, sol) for owner, sol in lsQueue if sol != minionSolString])
+
+
+def get_generator_lock_file(minionFile):
+    # lock used by all runs of the same generator instance when they read/update its negative table and solution queue
+    return minionFile.replace('.minion','') + '.lock'
+
+
+def get_generator_use_lock_file(minionFile):
+    # shared lock held by each run of a generator instance from the start of solve_generator until its solution is parsed, the file's modification time is the last time the generator instance was used
+    return minionFile.replace('.minion','') + '.use'
+
+
+def get_solution_queue_file(minionFile):
+    # minion can generate several solutions of a generator instance in one run (see genSolutionsPerCall), those not used yet are saved in a solution queue so that next runs of the same generator instance can use them instead of calling minion again
+    # file format: each line is "<owner>\t<solution>", where owner is "-" if the solution is not taken by any run, or "<hostname>:<pid>" of the run that is evaluating it
+    # a solution stays in the queue until its instance is successfully evaluated (see encode_negative_table), so that if a run is terminated, the same instance will be generated when the tuning is resumed
+    return minionFile.replace('.minion','') + '.queue'
+
+
+def read_solution_queue(queueFile):
+    lsQueue = []
+    if os.path.isfile(queueFile):
+        for line in read_file(queueFile):
+            if '\t' in line:
+                owner, sol = line.split('\t', 1)
+                lsQueue.append((owner, sol))
+    return lsQueue
+
+
+def write_solution_queue(queueFile, lsQueue):
+    if len(lsQueue) == 0:
+        deleteFile(queueFile)
+        return
+    with open(queueFile + '.tmp', 'wt') as f:
+        f.write(''.join([owner + '\t' + sol + '\n' for owner, sol in lsQueue]))
+    os.replace(queueFile + '.tmp', queueFile)
+
+
+def is_queue_owner_alive(owner):
+    # a solution taken by a run that no longer exists can be taken again
+    if owner == '-':
+        return False
+    host, pid = owner.rsplit(':', 1)
+    if host != socket.gethostname(): # we can't check runs on other machines
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def take_queued_solution(lsQueue):
+    # take the first solution in the queue that is not taken by another run, return (the solution, the updated queue), or (None, lsQueue) if there isn't any
+    owner = socket.gethostname() + ':' + str(os.getpid())
+    for i, (solOwner, sol) in enumerate(lsQueue):
+        if not is_queue_owner_alive(solOwner):
+            return sol, lsQueue[:i] + [(owner, sol)] + lsQueue[i+1:]
+    return None, lsQueue
+
+
+def make_solver_options(solver, tempFilePrefix, solverTimelimit=0, solverFlags='', seed=None):
     # temporary files that will be removed
     lsTempFiles = []
 
-    # SROptions string
-    SROptionsStr = ''
-    if SRTimelimit>0:
-        SROptionsStr += '-timelimit ' + str(int(SRTimelimit*1000))
-    SROptionsStr += ' ' + SRFlags
-
     # solverInfo string
     solverOptionStr = ""
 
@@ -281,7 +1318,7 @@ def make_conjure_solve_command(essenceModelFile, eprimeModelFile, instFile, solv
     # solver random seed (only when the solver supports passing a random seed, i.e., solverInfo['randomSeedPrefix'] != None
     if (seed != None) and (opts['randomSeedPrefix'] != None):
         if solver == 'cplex': # cplex case is special: we need to create a temporary text file to pass the random seed to cplex            
-            rndSeedCplexFile = instFile + '.cplexseed'
+            rndSeedCplexFile = tempFilePrefix + '.cplexseed'
             with open(rndSeedCplexFile,'wt') as f:
                 f.write('CPXPARAM_RandomSeed ' + str(seed))
             lsTempFiles.append(rndSeedCplexFile)
@@ -292,6 +1329,19 @@ def make_conjure_solve_command(essenceModelFile, eprimeModelFile, instFile, solv
     # solver flags
     solverOptionStr += ' ' + solverFlags
 
+    return solverOptionStr, lsTempFiles
+
+
+def make_conjure_solve_command(essenceModelFile, eprimeModelFile, instFile, solver, SRTimelimit=0, SRFlags='', solverTimelimit=0, solverFlags='', seed=None):
+    # SROptions string
+    SROptionsStr = ''
+    if SRTimelimit>0:
+        SROptionsStr += '-timelimit ' + str(int(SRTimelimit*1000))
+    SROptionsStr += ' ' + SRFlags
+
+    # solverInfo string, temporary files are put in the same folder as the eprime model
+    solverOptionStr, lsTempFiles = make_solver_options(solver, os.path.join(os.path.dirname(eprimeModelFile), os.path.basename(instFile)), solverTimelimit, solverFlags, seed)
+
     # conjure solve command
     outDir = os.path.dirname(eprimeModelFile)
     eprimeModelFile = os.path.basename(eprimeModelFile)
@@ -304,11 +1354,242 @@ def make_conjure_solve_command(essenceModelFile, eprimeModelFile, instFile, solv
     return conjureCmd, lsTempFiles
     
 
-def call_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, seed):
+@span('solve_instance')
+def solve_instance(essenceModelFile, eprimeModelFile, instFile, setting, seed, runGroup=None):
+    # solve a problem instance with the solver specified in setting, return status, SRTime and solverTime
+    # solverEngine: 'conjure' (via conjure solve) or 'direct' (Savile Row translation + direct solver call), translationCache=true also means 'direct' as translations are always cached by the direct engine
+    solverEngine = setting.get('solverEngine', 'conjure')
+    if setting.get('translationCache', False):
+        solverEngine = 'direct'
+    if solverEngine == 'direct':
+        return solve_translated_instance(eprimeModelFile, instFile, setting, seed, runGroup)
+    elif solverEngine == 'conjure':
+        return call_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, seed, runGroup)
+    raise Exception("ERROR: invalid solverEngine: " + solverEngine)
+
+
+@span('translate_instance')
+def translate_instance(eprimeModelFile, instFile, setting, solver, runGroup=None):
+    ### translate a problem instance into the input format of a solver ###
+    # translations are cached, so that an instance is only translated once for all random seeds and all solvers using the same Savile Row backend
+    # cache key: content of the eprime model and the instance, Savile Row time limit and flags, and Savile Row backend
+    # return: Savile Row status, SRTime (0 if the translation is taken from the cache) and the translated file
+    opts = solverInfo[solver]
+    h = hashlib.sha1()
+    for fn in [eprimeModelFile, instFile]:
+        with open(fn, 'rb') as f:
+            h.update(f.read())
+    h.update((str(setting['SRTimelimit']) + ' ' + setting['SRFlags'] + ' ' + opts['SRBackend']).encode('utf-8'))
+    cacheDir = os.path.dirname(eprimeModelFile) + '/' + translationCacheName + '/' + os.path.basename(instFile).replace('.param','') + '-' + h.hexdigest()
+    os.makedirs(cacheDir, exist_ok=True)
+    translatedFile = cacheDir + '/model' + opts['extension']
+    translationInfoFile = cacheDir + '/translation.json'
+
+    # only one run translates the instance, other runs wait for it
+    with open(cacheDir + '/lock', 'wt') as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+
+        if os.path.isfile(translationInfoFile):
+            with open(translationInfoFile, 'rt') as f:
+                translationInfo = json.load(f)
+            log("Using cached translation " + translatedFile + " (" + translationInfo['status'] + ")")
+            return translationInfo['status'], 0, translatedFile
+
+        eprimeParamFile = cacheDir + '/model.eprime-param'
+        conjure_translate_parameter(eprimeModelFile, instFile, eprimeParamFile, runGroup)
+        cmd = 'savilerow ' + eprimeModelFile + ' ' + eprimeParamFile + ' ' + opts['SRBackend'] + ' ' + opts['SROutputFlag'] + ' ' + translatedFile
+        if setting['SRTimelimit'] > 0:
+            cmd += ' -timelimit ' + str(int(setting['SRTimelimit']*1000))
+        cmd += ' ' + setting['SRFlags']
+        log(cmd)
+        start = time.time()
+        cmdOutput, returnCode = run_savilerow_cmd(cmd, runGroup, setting.get('SRMemLimit', 0), 'translate' + opts['SRBackend'], os.path.getsize(eprimeParamFile), setting['SRTimelimit'] + cmdTimeoutGrace if setting['SRTimelimit'] > 0 else 0)
+        SRTime = time.time() - start
+        status = get_SR_status(cmdOutput, returnCode)
+        os.remove(eprimeParamFile)
+
+        with open(translationInfoFile, 'wt') as f:
+            json.dump({'status': status, 'SRTime': SRTime}, f)
+
+    return status, SRTime, translatedFile
+
+
+@span('delete_translations')
+def delete_translations(instFile, workDir=detailedOutputDir):
+    # remove all cached translations of an instance
+    for cacheDir in glob.glob(workDir + '/' + translationCacheName + '/' + os.path.basename(instFile).replace('.param','') + '-*'):
+        rmtree(cacheDir, ignore_errors=True)
+
+
+def parse_solver_output(outputFormat, cmdOutput):
+    # status of a solver run from its output: sat/unsat/solverTimeOut/solverMemOut, or None if the output doesn't say
+    if ('Error: maximum memory exceeded' in cmdOutput) or ('Out of memory' in cmdOutput) or ('Memory exhausted!' in cmdOutput) or ('std::bad_alloc' in cmdOutput):
+        return 'solverMemOut'
+    if outputFormat == 'minion':
+        if 'Time out.' in cmdOutput:
+            return 'solverTimeOut'
+        elif 'Solutions Found: 0' in cmdOutput:
+            return 'unsat'
+        elif 'Solutions Found: ' in cmdOutput:
+            return 'sat'
+        return None
+    lsLines = [line.strip() for line in cmdOutput.split('\n')]
+    if outputFormat == 'flatzinc':
+        if '=====UNSATISFIABLE=====' in lsLines:
+            return 'unsat'
+        elif '----------' in lsLines:
+            return 'sat'
+        elif '=====UNKNOWN=====' in lsLines:
+            return 'solverTimeOut'
+    elif outputFormat == 'dimacs':
+        if 's UNSATISFIABLE' in lsLines:
+            return 'unsat'
+        elif ('s SATISFIABLE' in lsLines) or ('s OPTIMUM FOUND' in lsLines):
+            return 'sat'
+        elif ('s UNKNOWN' in lsLines) or ('s INDETERMINATE' in lsLines):
+            return 'solverTimeOut'
+    elif outputFormat == 'smt':
+        if 'unsat' in lsLines:
+            return 'unsat'
+        elif 'sat' in lsLines:
+            return 'sat'
+        elif 'unknown' in lsLines:
+            return 'solverTimeOut'
+    return None
+
+
+def get_ulimit_commands(rlimit, softLimit, hardLimit):
+    # shell commands setting a limit of the command run by limit_command, the limits can't be above the current hard limit (inherited from this process)
+    currentHardLimit = resource.getrlimit(rlimit)[1]
+    if currentHardLimit != resource.RLIM_INFINITY:
+        softLimit = min(softLimit, currentHardLimit)
+        hardLimit = min(hardLimit, currentHardLimit)
+    flag, unit = ulimitFlags[rlimit]
+    # the soft limit is set first, so that it's never above the hard limit
+    return ['ulimit -S ' + flag + ' ' + str(softLimit // unit), 'ulimit -H ' + flag + ' ' + str(hardLimit // unit)]
+
+
+def get_cpu_limit_commands(timelimit):
+    # CPU time limit of a solver (see run_process)
+    softLimit = int(math.ceil(timelimit + solverLimitGrace))
+    return get_ulimit_commands(resource.RLIMIT_CPU, softLimit, softLimit + solverLimitGrace)
+
+
+def limit_command(lsCmds, lsShellCommands):
+    # run a command via a shell that sets its limits before executing it (in the same process), so that no Python code runs between fork and exec in threaded callers, and the subprocess can still be started with vfork
+    if len(lsShellCommands) == 0:
+        return lsCmds
+    return ['sh', '-c', ' && '.join(lsShellCommands + ['exec "$@"']), 'sh'] + lsCmds
+
+
+@span('run_solver')
+def run_solver(cmd, timelimit=0, cpuLimit=False, memLimit=0, runGroup=None, memKey=None, memSize=0, outputFormat=None):
+    ### run a solver process with enforced limits, return a structured result ###
+    # - timelimit (in seconds): the solver's process group is killed solverLimitGrace seconds after timelimit (wall time, see run_process). If cpuLimit is set, its CPU time is also limited via RLIMIT_CPU
+    # - memLimit (in MB): memory limit via cgroup if memoryCgroupDir is set, otherwise address space limit via RLIMIT_AS (see MemoryLimit)
+    # - memKey, memSize: see run_cmd
+    # - outputFormat: format of the solver's output, its status lines are always kept in the output (see solverStatusLines)
+    # result: {'output', 'returnCode', 'wallTime', 'cpuTime', 'peakMemory', 'limitHit'}, limitHit is None, 'time' or 'memory'
+    with memory_reservation(memKey, memSize, memLimit, runGroup) as reservation:
+        rs = run_limited_solver(cmd, timelimit, cpuLimit, memLimit, runGroup, outputFormat)
+        if reservation is not None:
+            reservation['peak'] = rs['peakMemory']
+    return rs
+
+
+def run_limited_solver(cmd, timelimit=0, cpuLimit=False, memLimit=0, runGroup=None, outputFormat=None):
+    if runGroup is None:
+        runGroup = RunGroup()
+    rs = asyncio.run(run_process(shlex.split(cmd), runGroup, timelimit + solverLimitGrace if timelimit > 0 else 0, memLimit, resource.RLIMIT_AS, timelimit if cpuLimit else 0, solverStatusLines.get(outputFormat)))
+    if runGroup.cancelled:
+        raise RunCancelled()
+
+    # CPU time of the solver and the child processes it has waited for
+    returnCode = rs['returnCode']
+    cpuTime = None
+    if rs['rusage'] is not None:
+        cpuTime = rs['rusage'].ru_utime + rs['rusage'].ru_stime
+
+    limitHit = None
+    if rs['timedOut'] or (returnCode == -signal.SIGXCPU) or (cpuLimit and (returnCode == -signal.SIGKILL) and (cpuTime is not None) and (cpuTime >= timelimit)):
+        limitHit = 'time'
+    elif rs['memLimitHit']:
+        limitHit = 'memory'
+
+    if cpuTime is None:
+        cpuTime = rs['wallTime']
+    return {'output': rs['output'], 'returnCode': returnCode, 'wallTime': rs['wallTime'], 'cpuTime': cpuTime, 'peakMemory': rs['peakMemory'], 'limitHit': limitHit}
+
+
+@span('solve_translated_instance')
+def solve_translated_instance(eprimeModelFile, instFile, setting, seed, runGroup=None):
+    ### solve a problem instance by calling the solver directly on the (cached) Savile Row translation of the instance ###
     if 'name' in setting:
         solver = setting['name']
     elif 'solver' in setting:
         solver = setting['solver']
+    if not solver in solverInfo:
+        raise Exception("Sorry, solver " + solver + " is not yet supported.")
+    opts = solverInfo[solver]
+
+    # translate the instance (SRTime is only reported by the run doing the translation)
+    status, SRTime, translatedFile = translate_instance(eprimeModelFile, instFile, setting, solver, runGroup)
+    if status != 'SRok':
+        return status, SRTime, 0
+
+    # call the solver, temporary files are named after the random seed as the same translation can be solved by several runs at the same time
+    solverOptionStr, lsTempFiles = make_solver_options(solver, translatedFile + '-seed_' + str(seed), setting['solverTimelimit'], setting['solverFlags'], seed)
+    cmd = opts['solverCmd'] + ' ' + solverOptionStr + ' ' + translatedFile
+    print("\nCalling " + solver)
+    log(cmd)
+    try:
+        rs = run_solver(cmd, setting['solverTimelimit'], opts['cpuLimit'], setting.get('solverMemLimit', 0), runGroup, 'solver-' + solver, os.path.getsize(translatedFile), opts['outputFormat'])
+    finally:
+        deleteFile(lsTempFiles)
+    solverTime = rs['wallTime']
+    log(rs['output'])
+    log("Solver run: " + ', '.join([key + '=' + str(rs[key]) for key in ['returnCode','wallTime','cpuTime','limitHit']]))
+
+    status = parse_solver_output(opts['outputFormat'], rs['output'])
+    if rs['limitHit'] == 'time':
+        status = 'solverTimeOut'
+    elif rs['limitHit'] == 'memory':
+        status = 'solverMemOut'
+    elif status is None:
+        # no result given, the solver is either stopped by its own time limit or crashed (SAT solvers return 10/20 on sat/unsat)
+        if (rs['returnCode'] not in [0, 10, 20]) and ((setting['solverTimelimit'] <= 0) or (solverTime < setting['solverTimelimit'])):
+            raise Exception(rs['output'])
+        status = 'solverTimeOut'
+    # for the case when the solver timeout but doesn't report it
+    if (setting['solverTimelimit'] > 0) and (solverTime > setting['solverTimelimit']):
+        status = 'solverTimeOut'
+
+    return status, SRTime, solverTime
+
+
+@span('call_conjure_solve')
+def call_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, seed, runGroup=None):
+    if 'name' in setting:
+        solver = setting['name']
+    elif 'solver' in setting:
+        solver = setting['solver']
+
+    # when solver runs are done in parallel (i.e., runGroup is given), each run uses its own output folder, as names of conjure's output files only depend on the model and the instance
+    infoFileDir = os.path.dirname(eprimeModelFile)
+    runDir = None
+    if runGroup is not None:
+        runDir = tempfile.mkdtemp(prefix='run-' + os.path.basename(instFile).replace('.param','') + '-seed_' + str(seed) + '-' + solver + '-', dir=infoFileDir)
+        copyfile(eprimeModelFile, runDir + '/' + os.path.basename(eprimeModelFile))
+        eprimeModelFile = runDir + '/' + os.path.basename(eprimeModelFile)
+
+    try:
+        return run_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, seed, solver, infoFileDir, runGroup)
+    finally:
+        if runDir is not None:
+            rmtree(runDir, ignore_errors=True)
+
+
+def run_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, seed, solver, infoFileDir, runGroup=None):
     lsTempFiles = []
 
     # make conjure solve command line
@@ -318,11 +1599,37 @@ def call_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, see
     # call conjure
     print("\nCalling conjure")
     log(conjureCmd)
-    cmdOutput, returnCode = run_cmd(conjureCmd)
+    # conjure is only killed by the wrapper if both Savile Row and the solver have a time limit
+    timeout = 0
+    if (setting['SRTimelimit'] > 0) and (setting['solverTimelimit'] > 0):
+        timeout = setting['SRTimelimit'] + setting['solverTimelimit'] + cmdTimeoutGrace
+    cmdOutput, returnCode = run_cmd(conjureCmd, runGroup=runGroup, memLimit=setting.get('solverMemLimit', 0), memKey='conjure-solve-' + solver, memSize=os.path.getsize(instFile), timeout=timeout)
     log(cmdOutput)
 
+    baseFile = eprimeModelFile.replace('.eprime','') + '-' + os.path.basename(instFile).replace('.param','')
+    infoFile = baseFile + '.eprime-info'
+    inforFile = baseFile + '.eprime-infor'
+    minionFile = baseFile + '.eprime-minion'
+    dimacsFile = baseFile + '.eprime-dimacs'
+    fznFile = baseFile + '.eprime-param.fzn'
+    mznFile = baseFile + '.eprime.mzn'
+    eprimeParamFile = baseFile + '.eprime-param'
+
     status = None
-    if ('GC overhead limit exceeded' in cmdOutput) or ('OutOfMemoryError' in cmdOutput) or ('insufficient memory' in cmdOutput):
+    SRTime = solverTime = 0
+    memLimitHit = memLimitMessage in cmdOutput
+    timeLimitHit = timeLimitMessage in cmdOutput
+    solverStarted = any([os.path.isfile(fn) for fn in [minionFile, dimacsFile, fznFile, mznFile]])
+    if memLimitHit:
+        # the memory limit applies to conjure, Savile Row and the solver: it's hit by the solver if Savile Row has written the solver's input file
+        status = 'solverMemOut' if solverStarted else 'SRMemOut'
+    elif timeLimitHit:
+        # same for the time limit enforced by the wrapper
+        if solverStarted:
+            status, solverTime = 'solverTimeOut', setting['solverTimelimit']
+        else:
+            status, SRTime = 'SRTimeOut', setting['SRTimelimit']
+    elif ('GC overhead limit exceeded' in cmdOutput) or ('OutOfMemoryError' in cmdOutput) or ('insufficient memory' in cmdOutput):
         status = 'SRMemOut'
     elif 'Savile Row timed out' in cmdOutput:
         status = 'SRTimeOut'
@@ -333,14 +1640,6 @@ def call_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, see
     elif returnCode != 0:
         raise Exception(cmdOutput)
 
-    baseFile = eprimeModelFile.replace('.eprime','') + '-' + os.path.basename(instFile).replace('.param','')
-    infoFile = baseFile + '.eprime-info'
-    inforFile = baseFile + '.eprime-infor'
-    minionFile = baseFile + '.eprime-minion'
-    dimacsFile = baseFile + '.eprime-dimacs'
-    fznFile = baseFile + '.eprime-param.fzn'
-    mznFile = baseFile + '.eprime.mzn'
-    eprimeParamFile = baseFile + '.eprime-param'
     eprimeSolutionFile = glob.glob(baseFile + '*.eprime-solution')
     solutionFile = glob.glob(baseFile + '*.solution')
     solutionFile.extend(glob.glob(os.path.basename(baseFile) + '.solution')) # in case conjure doesn't generate essence solution file within the folder of eprime model
@@ -348,22 +1647,14 @@ def call_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, see
 
     print("Waiting for " + infoFile)
 
-    # Wait a maximum of 60s for SR-info file to appear 
-    if status != 'SRMemOut':
-        max_wait = 60
-        while True:
-            if os.path.isfile(infoFile):
-                break
-            elif max_wait <= 0:
-                os.stat(infoFile)
-                raise Exception("Waited max time for SR-info file to appear {0}".format(infoFile))
-            else:
-                time.sleep(1)
-                max_wait -= 1
+    # Wait a maximum of infoFileTimeout seconds (default: 60s) for SR-info file to appear 
+    if (status != 'SRMemOut') and not memLimitHit and not timeLimitHit: # conjure is killed when it hits the memory or time limit, the info file isn't written
+        if not wait_for_file(infoFile, setting.get('infoFileTimeout', 60)):
+            raise Exception("Waited max time for SR-info file to appear {0}".format(infoFile))
 
     if os.path.isfile(infoFile):
         # rename infoFile so that it includes random seed and solver name
-        newInfoFile = baseFile + '-seed_' + str(seed) + '-' + solver + '.eprime-info'
+        newInfoFile = os.path.join(infoFileDir, os.path.basename(baseFile)) + '-seed_' + str(seed) + '-' + solver + '.eprime-info'
         print("Renaming SR info file: " + infoFile + " -> " + newInfoFile)
         if os.path.isfile(infoFile):
             os.rename(infoFile, newInfoFile)
@@ -376,6 +1667,7 @@ def call_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, see
     return status, SRTime, solverTime
 
 
+@span('parse_SR_info_file')
 def parse_SR_info_file(fn, knownSolverMemOut=False, timelimit=0): 
     lsLines = read_file(fn)
    
@@ -425,9 +1717,59 @@ def parse_SR_info_file(fn, knownSolverMemOut=False, timelimit=0):
     return status, SRTime, solverTime
 
 
-def run_single_solver(instFile, seed, setting):
+def solve_runs(lsRuns, solve_run, is_stop, nWorkers=1):
+    ### solve a list of solver runs, return their results up to (and including) the first run where an early-stop condition is reached ###
+    # lsRuns must be given in the order of the serial evaluation, so that the returned results are exactly the same as those of the serial evaluation
+    # solve_run(run, runGroup): solve a run and return its result
+    # is_stop(run, result): whether the evaluation can be stopped after this run
+    # if nWorkers>1, runs are solved in parallel, and as soon as an early-stop condition is reached, all later runs are cancelled (their processes are killed)
+    lsResults = []
+
+    # runs done in worker threads are timed as children of the caller's current span
+    parentStack = list(get_span_stack())
+    def solve_run_in_span(run, runGroup):
+        spanState.stack = list(parentStack)
+        with span('solve_run'), core_slot(runGroup):
+            return solve_run(run, runGroup)
+
+    if nWorkers <= 1:
+        for run in lsRuns:
+            rs = solve_run_in_span(run, None)
+            lsResults.append(rs)
+            if is_stop(run, rs):
+                break
+        return lsResults
+
+    lsRunGroups = [RunGroup() for run in lsRuns]
+    results = {}
+    stopAt = len(lsRuns) - 1 # the earliest run (known so far) after which the evaluation is stopped
+    with ThreadPoolExecutor(max_workers=nWorkers) as executor:
+        futures = {executor.submit(solve_run_in_span, lsRuns[k], lsRunGroups[k]): k for k in range(len(lsRuns))}
+        for future in as_completed(futures):
+            k = futures[future]
+            try:
+                results[k] = future.result()
+            except RunCancelled:
+                continue
+            except Exception as e: # re-raised below if the serial evaluation would reach this run
+                results[k] = e
+            if (k < stopAt) and (isinstance(results[k], Exception) or is_stop(lsRuns[k], results[k])):
+                stopAt = k
+                for j in range(k+1, len(lsRuns)):
+                    lsRunGroups[j].cancel()
+
+    for k in range(stopAt+1):
+        if isinstance(results[k], Exception):
+            raise results[k]
+        lsResults.append(results[k])
+    return lsResults
+
+
+@span('run_single_solver')
+def run_single_solver(instFile, seed, setting, nWorkers=1, workDir=detailedOutputDir):
+    # transient files of solver runs are written in workDir (see make_work_dir)
     essenceModelFile = './problem.essence'
-    eprimeModelFile = detailedOutputDir + '/problem.eprime'
+    eprimeModelFile = workDir + '/problem.eprime'
     instance = os.path.basename(instFile).replace('.param','')
     solver = setting['solver']
 
@@ -435,18 +1777,58 @@ def run_single_solver(instFile, seed, setting):
     print('\n')
     log("Solving " + instFile + '...')
 
-    status = 'ok'
-    lsSolverTime = []
-    for i in range(setting['nEvaluations']):
+    racingTimelimit = None # solver time limit of the racing stage, only used with racingTimelimit>0
+
+    def solve_run(i, runGroup):
         rndSeed = seed + i
         print("\n\n----------- With random seed " + str(i) + 'th (' + str(rndSeed) + ')')
-        runStatus, SRTime, solverTime = call_conjure_solve(essenceModelFile, eprimeModelFile, instFile, setting, rndSeed)
+        runSetting = setting
+        if racingTimelimit is not None:
+            runSetting = dict(setting)
+            runSetting['solverTimelimit'] = racingTimelimit
+        runStatus, SRTime, solverTime = solve_instance(essenceModelFile, eprimeModelFile, instFile, runSetting, rndSeed, runGroup)
 
         # print out results
         localVars = locals()
         log("\nRun results: solverType=" + solver + ', solver=' + solver + ', instance=' + instance + ', runId=' + str(i) \
                     + ', '.join([s + '=' + str(localVars[s]) for s in ['runStatus','SRTime','solverTime']])) 
-         
+        return runStatus, SRTime, solverTime
+
+    def is_stop(i, rs):
+        runStatus = rs[0]
+        return ((setting['gradedTypes']!='both') and (runStatus in ['sat','unsat']) and (runStatus!=setting['gradedTypes'])) \
+                or (runStatus in ['SRTimeOut','SRMemOut','solverTimeOut','solverMemOut'])
+
+    lsResults = [] # results of the runs used for the score, in the order of the serial evaluation
+    lsDoneResults = [] # results of all runs done, including the racing run if it's done again
+    racingStatus = None
+    if is_racing_used(setting.get('racingTimelimit', 0), setting['solverTimelimit']):
+        # racing stage: a first run with a short time limit, the remaining runs are only done if the instance is promising
+        racingTimelimit = setting['racingTimelimit']
+        rs = solve_runs([0], solve_run, is_stop, 1)[0]
+        racingTimelimit = None
+        lsDoneResults = [rs]
+        if rs[0] == 'solverTimeOut': # the run is done again with the full time limit
+            racingStatus = 'promising'
+        elif is_stop(0, rs):
+            racingStatus = 'final'
+            lsResults = [rs]
+        elif rs[2] < setting.get('racingMinTime', setting['solverMinTime'] / 2):
+            # too easy, the remaining runs are assumed to take the same time as this one
+            racingStatus = 'rejected'
+            lsResults = [rs] * setting['nEvaluations']
+        else:
+            racingStatus = 'promising'
+            lsResults = [rs]
+        log("Racing stage: instance=" + instance + ', racingStatus=' + racingStatus + ', runStatus=' + rs[0] + ', solverTime=' + str(rs[2]))
+    if racingStatus in [None, 'promising']:
+        lsNewResults = solve_runs(list(range(len(lsResults), setting['nEvaluations'])), solve_run, is_stop, nWorkers)
+        lsResults = lsResults + lsNewResults
+        lsDoneResults = lsDoneResults + lsNewResults
+
+    status = 'ok'
+    lsSolverTime = []
+    for runStatus, SRTime, solverTime in lsResults:
         # make score
 	# inst unwanted type: score=1
         if (setting['gradedTypes']!='both') and (runStatus in ['sat','unsat']) and (runStatus!=setting['gradedTypes']):
@@ -479,10 +1861,14 @@ def run_single_solver(instFile, seed, setting):
             status = 'graded'
     s = "\nInstance summary: instance=" + instance + ', status=' + status + ', meanSolverTime=' + str(meanSolverTime)
     print(s)
+    summary = {'instance': instance, 'status': status, 'meanSolverTime': meanSolverTime, \
+                'nRuns': len(lsDoneResults), 'totalSRTime': sum([rs[1] for rs in lsDoneResults]), 'totalSolverTime': sum([rs[2] for rs in lsDoneResults])}
+    if racingStatus is not None:
+        summary['racingStatus'] = racingStatus
     
     # make final score
     if score != None:
-        return score        
+        return score, summary
     # - otherwise, for each evaluation: if the run is too easy: score=-solverTime, if the run is graded: score=nEvaluations*-solverMinTime
     score = 0
     for i in range(len(lsSolverTime)):
@@ -490,10 +1876,24 @@ def run_single_solver(instFile, seed, setting):
             score -= lsSolverTime[i]
         else:
             score -= setting['nEvaluations'] * setting['solverMinTime']
-    return score
+    return score, summary
 
 
-def read_args(args):
+def is_racing_used(racingTimelimit, solverTimelimit):
+    # the racing stage is only useful if its time limit is shorter than the full one
+    return (racingTimelimit > 0) and ((solverTimelimit <= 0) or (racingTimelimit < solverTimelimit))
+
+
+def read_meta_file(metaFile='./params.irace.meta'):
+    # read param value offsets of log-transformed params (see read_args)
+    lsMeta = []
+    if os.path.isfile(metaFile):
+        with open(metaFile,'rt') as f:
+            lsMeta = f.readlines()
+    return lsMeta
+
+
+def read_args(args, lsMeta=None):
     #### read arguments (following irace's wrapper input format) ###
     k = 1
     configurationId = int(args[k])
@@ -508,17 +1908,13 @@ def read_args(args):
     log(' '.join(args))
 
     # update param values of log-transformed params, since irace doesn't support non-positive values for those params
-    metaFile = None
-    if os.path.isfile('./params.irace.meta'):
-        metaFile = './params.irace.meta'
-    if metaFile is not None:
-        with open(metaFile,'rt') as f:
-            lsMeta = f.readlines()
-        for ln in lsMeta:
-            ln = ln[0:-1]
-            param = ln.split(' ')[0]
-            delta = int(ln.split(' ')[1])
-            paramDict[param] = str(int(paramDict[param]) - delta)
+    if lsMeta is None:
+        lsMeta = read_meta_file()
+    for ln in lsMeta:
+        ln = ln.rstrip('\n')
+        param = ln.split(' ')[0]
+        delta = int(ln.split(' ')[1])
+        paramDict[param] = str(int(paramDict[param]) - delta)
 
     return configurationId, seed, paramDict
 
@@ -532,69 +1928,218 @@ def read_setting(settingFile):
     return setting
 
 
-def solve_generator(configurationId, paramDict, setting, seed):
+def find_generator_solutions(minionFile, lsExcludedSolutions, minionSolFile, seed, setting, runFileDir=None):
+    ### solve a generator instance, return its status, the solving time and the list of solutions found (up to genSolutionsPerCall) ###
+    # lsExcludedSolutions: solutions that are not in the negative table yet but shouldn't be generated again (see make_minion_run_file)
+    # with genSolutionsPerCall>1, minion is called once per solution, each time with another random seed and with the solutions found so far added to the negative table,
+    # so that the solutions come from different searches (with -findallsols, they would be neighbours in the same search tree). All calls share the time limit genSolverTimelimit
+    nSolutions = setting.get('genSolutionsPerCall', 1)
+    timelimit = setting['genSolverTimelimit']
+    genStatus = None
+    genSolverTime = 0
+    lsSolutions = []
+    for i in range(nSolutions):
+        callTimelimit = timelimit
+        if timelimit > 0:
+            callTimelimit = int(timelimit - genSolverTime)
+            if callTimelimit < 1:
+                break
+        runMinionFile = make_minion_run_file(minionFile, lsExcludedSolutions + lsSolutions, runFileDir) # generator minion file with negative table of previously generated solutions
+        try:
+            with core_slot():
+                status, runTime = run_minion(runMinionFile, minionSolFile, seed + i, callTimelimit, setting['genSolverFlags'], setting.get('genSolverMemLimit', 0))
+        finally:
+            # the run file can be a large copy of the generator in tmpfs
+            if runMinionFile != minionFile:
+                deleteFile([runMinionFile])
+        genSolverTime += runTime
+        if status == 'sat':
+            lsSolutions += [line.strip() for line in read_file(minionSolFile) if line.strip() != '']
+        deleteFile([minionSolFile])
+        if genStatus is None:
+            genStatus = status
+        if status != 'sat':
+            break
+    # once a solution is found, a timeout or an unsat result of the next calls only ends the search
+    if len(lsSolutions) > 0:
+        genStatus = 'sat'
+    return genStatus, genSolverTime, lsSolutions
+
+
+@span('solve_generator')
+def solve_generator(configurationId, paramDict, setting, seed, workDir=detailedOutputDir):
     ### create a new instance by solving a generator instance ###
     # we need to make sure that we don't create an instance more than once from the same generator instance
-    # this is done by generating the minion instance file only once, and everytime a new solution is created, it'll be added to a negative table in the minion file
+    # this is done by generating the minion instance file only once, and everytime a new solution is created, it'll be added to a negative table of the minion file (saved in a separate file, see get_negative_table_file)
     # NOTE 1: we save the generated minion file because we want to save SR time next time the same configuration is run by irace. However, this increases the storage memory used during the tuning, as those minion files can be huge!
     # NOTE 2: the generated solution will only added to the minion file at the end of a wrapper run (when the corresponding problem instance is successfully taken by the considered target solvers) by calling function save_generator_solution. This is to make sure that if a run is unsuccessful and terminated, the same instance will be generated when the tuning is resumed.
+    # NOTE 3: if genSolutionsPerCall>1, minion is asked for several solutions (see find_generator_solutions). The first one is used, the others are saved in a solution queue and used by the next runs of the same generator instance (see get_solution_queue_file)
+    # NOTE 4: generator files are named by a hash of the parameter values rather than by the configuration ID, as irace can create several configurations with the same parameter values. Those configurations share the same minion file, negative table and solution queue.
+    #         Outcomes that won't change in later runs (SRTimeOut/SRMemOut, or unsat when there is no solution left in the queue) are saved in a status file, so that the next runs return immediately.
+    # NOTE 5: if genCompressFiles is set, the minion file is saved compressed (see compress_generator_minion_file) and its negative table is saved in a compact binary format (see get_binary_negative_table_file)
+    # NOTE 6: files only needed during this run are written in workDir (see make_work_dir). If it's a scratch directory, the minion and aux files are also written there by Savile Row, then copied to detailedOutputDir
+    # NOTE 7: if tuningSettings.diskBudget is set, the minion and aux files can be evicted between runs (see manage_disk_budget). They are then re-generated here as if the generator instance is solved for the first time, the negative table and solution queue are kept.
 
-    # write generator instance to an essence instance file
-    paramFile = detailedOutputDir + '/gen-inst-' + str(configurationId) + '.param'
-    print('\n')
-    log("Creating generator instance: " + paramFile) 
-    lsLines = ['letting ' + key + ' be ' + str(val) for key, val in paramDict.items()]
-    with open(paramFile, 'wt') as f:
-        f.write('\n'.join(lsLines))
-    
     # files used/generated during the solving process
     eprimeModelFile = detailedOutputDir + "/generator.eprime"
-    baseFileName = paramFile.replace('.param','')
-    minionFile = baseFileName + '.minion' # minion input file, including a negative table saving previously generated solutions of the same generator instance
-    minionSolFile = baseFileName + '.solution' # solution file generated by minion, will be removed afterwards
+    baseFileName = detailedOutputDir + '/gen-' + get_param_hash(paramDict)
+    paramFile = baseFileName + '.param' # generator instance in Essence
+    minionFile = baseFileName + '.minion' # minion input file, the negative table saving previously generated solutions of the same generator instance is in a separate file (see get_negative_table_file)
     auxFile = baseFileName + '.aux' # aux file generated by SR, will be kept so we don't have to re-generate it next time solving the same generator instance
-    eprimeSolFile =  baseFileName + '.solution.eprime-param' # eprime solution file created by SR, will be removed afterwards
-    essenceSolFile = baseFileName + '.solution.param' # essence solution file created by conjure, will be returned as a problem instance
+    statusFile = baseFileName + '.status' # known final status of the generator instance
+    runFilePrefix = workDir + '/' + os.path.basename(baseFileName) + '-' + str(configurationId) + '-' + str(seed) # files of this run only, so that concurrent runs of the same generator instance don't overwrite each other's files
+    minionSolFile = runFilePrefix + '.solution' # solution file generated by minion, will be removed afterwards
+    eprimeSolFile =  runFilePrefix + '.solution.eprime-param' # eprime solution file created by SR, will be removed afterwards
+    essenceSolFile = runFilePrefix + '.solution.param' # essence solution file created by conjure, will be returned as a problem instance
     minionSolString = '' # content of minion solution file, to be added to minion negative table in minionFile
     
     # status of the solving
     genStatus = None # SRTimeOut/SRMemOut/solverTimeOut/solverMemOut/sat/unsat
+    genSRTime = 0
+    genSolverTime = 0
 
-    # if the generator instance is solved for the first time
-    if (not os.path.exists(minionFile)) or (os.stat(minionFile).st_size == 0):
-        eprimeParamFile = baseFileName + '.eprime-param'
-        conjure_translate_parameter(eprimeModelFile, paramFile, eprimeParamFile) # translate generator instance from Essence to Essence Prime
-        genStatus, genSRTime = savilerow_translate(auxFile, eprimeModelFile, eprimeParamFile, minionFile, setting['genSRTimelimit']*1000, setting['genSRFlags']) # translate generator instance from Essence Prime to minion input format
-        os.remove(eprimeParamFile)
-    else:
-        genStatus = 'SRok'
-        genSRTime = 0
+    print('\n')
+    log("Creating generator instance: " + paramFile + " (configuration " + str(configurationId) + ")")
+
+    # the generator instance is marked as in use until its solution is parsed, so that its minion/aux files aren't evicted in the meantime (see evict_generator_files)
+    with open(get_generator_use_lock_file(minionFile), 'at') as useLockFile:
+        fcntl.flock(useLockFile, fcntl.LOCK_SH)
+        os.utime(get_generator_use_lock_file(minionFile)) # last use time of the generator instance, see manage_disk_budget
+
+        # only one run of this generator instance translates it, calls minion or takes a solution from the solution queue at a time, so that concurrent runs don't repeat the translation or generate the same instance
+        with open(get_generator_lock_file(minionFile), 'wt') as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+
+            rename_legacy_generator_files(configurationId, baseFileName)
+
+            # write generator instance to an essence instance file
+            if not os.path.isfile(paramFile):
+                lsLines = ['letting ' + key + ' be ' + str(val) for key, val in paramDict.items()]
+                with open(paramFile, 'wt') as f:
+                    f.write('\n'.join(lsLines))
+
+            # if the outcome of this generator instance is already known
+            if os.path.isfile(statusFile):
+                genStatus = read_file(statusFile)[0].strip()
+                log("Known status of generator instance " + paramFile + ": " + genStatus)
+
+            # if the generator instance is solved for the first time
+            elif not generator_minion_exists(minionFile):
+                eprimeParamFile = workDir + '/' + os.path.basename(baseFileName) + '.eprime-param'
+                translatedMinionFile = workDir + '/' + os.path.basename(minionFile)
+                translatedAuxFile = workDir + '/' + os.path.basename(auxFile)
+                with core_slot():
+                    conjure_translate_parameter(eprimeModelFile, paramFile, eprimeParamFile) # translate generator instance from Essence to Essence Prime
+                    genStatus, genSRTime = savilerow_translate(translatedAuxFile, eprimeModelFile, eprimeParamFile, translatedMinionFile, setting['genSRTimelimit']*1000, setting['genSRFlags'], setting.get('genSRMemLimit', 0)) # translate generator instance from Essence Prime to minion input format
+                os.remove(eprimeParamFile)
+                if genStatus != 'SRok':
+                    write_generator_status(statusFile, genStatus)
+                else:
+                    if translatedAuxFile != auxFile:
+                        copy_back(translatedAuxFile, auxFile)
+                    if setting.get('genCompressFiles', False):
+                        compress_generator_minion_file(minionFile, translatedMinionFile)
+                    elif translatedMinionFile != minionFile:
+                        copy_back(translatedMinionFile, minionFile)
+            else:
+                genStatus = 'SRok'
+
+            # start solving it
+            if genStatus == 'SRok':
+                split_legacy_negative_table(minionFile)
+                queueFile = get_solution_queue_file(minionFile)
+                lsQueue = read_solution_queue(queueFile)
+                queuedSolString, lsQueue = take_queued_solution(lsQueue)
+                if queuedSolString is not None:
+                    log("Taking a solution of " + minionFile + " from its solution queue")
+                    genStatus = 'sat'
+                    minionSolString = queuedSolString
+                else:
+                    genStatus, genSolverTime, lsSolutions = find_generator_solutions(minionFile, [sol for owner, sol in lsQueue], minionSolFile, seed, setting, None if workDir == detailedOutputDir else workDir)
+                    if genStatus == 'sat':
+                        # use the first solution, put the others in the solution queue
+                        lsQueue += [('-', sol) for sol in lsSolutions]
+                        minionSolString, lsQueue = take_queued_solution(lsQueue)
+                    # all solutions are generated. If some are still in the queue, they can be taken again if the runs evaluating them are terminated
+                    elif (genStatus == 'unsat') and (len(lsQueue) == 0):
+                        write_generator_status(statusFile, genStatus)
+                write_solution_queue(queueFile, lsQueue)
 
-    # start solving it
-    if genStatus == 'SRok':
-        genStatus, genSolverTime = run_minion(minionFile, minionSolFile, seed, setting['genSolverTimelimit'], setting['genSolverFlags'])
         if genStatus == 'sat':
-            minionSolString = parse_minion_solution(minionSolFile)
-            savilerow_parse_solution(eprimeModelFile, minionSolFile, auxFile, eprimeSolFile) # parse solution from minion to Essence Prime
-            conjure_translate_solution(eprimeModelFile, paramFile, eprimeSolFile, essenceSolFile) # parse solution from Essence Prime to Essence
+            with open(minionSolFile, 'wt') as f:
+                f.write(minionSolString + '\n')
+            with core_slot():
+                savilerow_parse_solution(eprimeModelFile, minionSolFile, auxFile, eprimeSolFile) # parse solution from minion to Essence Prime
+                conjure_translate_solution(eprimeModelFile, paramFile, eprimeSolFile, essenceSolFile) # parse solution from Essence Prime to Essence
         deleteFile([minionSolFile,eprimeSolFile]) # delete minionSolFile after used, otherwise the negativetable will have duplicated items. eprimeSolFile is removed to make sure that in the next runs, if no solution is found by minion, no Essence solution file is created
-    else:
-        genSolverTime = 0
 
     # print out results of the generator solving process
     localVars = locals()
     print('\n')
     log("\nGenerator results: genInstance=" + os.path.basename(paramFile).replace('.param','') + ', ' + ', '.join([name + '=' + str(localVars[name]) for name in ['genStatus','genSRTime','genSolverTime']]))
+    genSummary = {'genInstance': os.path.basename(paramFile).replace('.param',''), 'genStatus': genStatus, 'genSRTime': genSRTime, 'genSolverTime': genSolverTime}
     
-    return genStatus, essenceSolFile, minionFile, minionSolString
+    return genStatus, essenceSolFile, minionFile, minionSolString, genSummary
 
 
-def run_discriminating_solvers(instFile, seed, setting): 
+def get_param_hash(paramDict):
+    # canonical hash of a generator parameter assignment, independent of the order of the parameters
+    canonical = '\n'.join([key + '=' + str(paramDict[key]) for key in sorted(paramDict.keys())])
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def write_generator_status(statusFile, genStatus):
+    log("Saving status of generator instance: " + genStatus)
+    with open(statusFile, 'wt') as f:
+        f.write(genStatus + '\n')
+
+
+def rename_legacy_generator_files(configurationId, baseFileName):
+    # older versions of this script name generator files by configuration ID, rename them so that a resumed tuning can still use them
+    legacyBaseFileName = detailedOutputDir + '/gen-inst-' + str(configurationId)
+    if (not os.path.isfile(legacyBaseFileName + '.minion')) or os.path.isfile(baseFileName + '.minion'):
+        return
+    log("Renaming generator files " + legacyBaseFileName + ".* to " + baseFileName + ".*")
+    for ext in ['.minion', '.aux', '.negative-table', '.queue']:
+        if os.path.isfile(legacyBaseFileName + ext):
+            os.replace(legacyBaseFileName + ext, baseFileName + ext)
+    deleteFile([legacyBaseFileName + '.param', legacyBaseFileName + '.lock'])
+
+
+class BaseSolverCutoff:
+    # time limit of each base solver run when adaptiveBaseCutoff is used (see run_discriminating_solvers)
+    # the score is capped at -minRatio, so once the total base solving time reaches target=minRatio*(total favoured solving time), the base runs can't change the score anymore
+    # the cutoff of a run is the target minus a lower bound of the solving time of all other runs: their actual time if they're finished, solverMinTime otherwise (a faster run would make the score 0 anyway)
+    # with runs done one after another, the cutoff is exact. With parallel runs, it's conservative (unfinished runs only count for solverMinTime)
+
+    def __init__(self, target, nRuns, solverMinTime):
+        self.lock = threading.Lock()
+        self.target = target
+        self.solverMinTime = solverMinTime
+        self.lsLowerBounds = [solverMinTime] * nRuns
+
+    def start_run(self, i):
+        with self.lock:
+            otherTime = sum(self.lsLowerBounds) - self.lsLowerBounds[i]
+        # rounded up, as solvers with a time limit in seconds only take whole seconds (see make_solver_options)
+        return math.ceil(max(self.solverMinTime, self.target - otherTime))
+
+    def finish_run(self, i, solverTime):
+        with self.lock:
+            self.lsLowerBounds[i] = solverTime
+
+
+@span('run_discriminating_solvers')
+def run_discriminating_solvers(instFile, seed, setting, nWorkers=1, workDir=detailedOutputDir): 
     ### evaluate a generated instance based on discriminating power with two solvers ###
     # NOTE: 
-    # - this function can be improved using parallelisation, as there are various cases in the scoring where runs can be safely terminated before they finished. Things to consider
-    #       + gnu-parallel for implementation
-    #       + runsolver for safely terminating a solver run
+    # - if nWorkers>1, runs of all random seeds and both solvers are done in parallel (see solve_runs). There are various cases in the scoring where the evaluation can be stopped early, the remaining runs are then cancelled.
+    #   The score is the same as when the runs are done one after another.
+    # - if adaptiveBaseCutoff=true and minRatio>0, all favoured solver runs are done first, then each base solver run is stopped as soon as the total base solving time is enough for the ratio to reach minRatio (see BaseSolverCutoff).
+    #   The score is the same as without the cutoff (results are scored in the usual order of random seeds, and if the favoured solver runs are stopped early, the base solver runs of the previous random seeds are still done), but the reported base solving time (and ratio) of such instances is only a lower bound.
+    # - if racingTimelimit>0, the first random seed of both solvers is solved first, with racingTimelimit as the base solver time limit (racing stage). If the base solver is less than racingMinRatio times slower than the favoured solver, the instance is rejected and scored on this random seed only.
+    #   Otherwise, the remaining runs are done as usual (the base solver run is done again if it reached racingTimelimit).
+    # - transient files of solver runs are written in workDir (see make_work_dir)
     
     # scoring scheme for discriminating solvers:
     # - gen unsat/SR memout/SR timeout: Inf
@@ -602,68 +2147,148 @@ def run_discriminating_solvers(instFile, seed, setting):
     # - inst unwanted type or SR timeout (either solver): 1 (ISSUE: with this new implementation, we can't recognise SR timeout, so we treat it as both solver timeout, i.e., score=0)
     # - favoured solver timeout (any run) or base solver too easy (any run): 0
     # - otherwise: max{-minRatio, -baseSolver/favouredSolver}
-    # - note: if minRatio>0, ideally we should set timelimit_baseSolver = minRatio * timelimit_favouredSolver
+    # - note: if minRatio>0, the base solver doesn't need to run longer than minRatio * (favoured solver time), see adaptiveBaseCutoff
 
     essenceModelFile = './problem.essence'
-    eprimeModelFile = detailedOutputDir + '/problem.eprime'
+    eprimeModelFile = workDir + '/problem.eprime'
     instance = os.path.basename(instFile).replace('.param','')
     
     score = None
     print('\n')
     log("Solving " + instFile + '...')
 
+    cutoff = None # BaseSolverCutoff, only used with adaptiveBaseCutoff
+    racingTimelimit = None # base solver time limit of the racing stage, only used with racingTimelimit>0
+
+    def solve_run(run, runGroup):
+        i, solver = run
+        rndSeed = seed + i   
+        solverSetting = setting[solver]
+        print("\n\n---- With random seed " + str(i) + 'th (' + str(rndSeed) + ') and solver ' + solverSetting['name'] + ' (' + solver + ')')
+
+        runTimelimit = None
+        if (solver=='baseSolver') and (racingTimelimit is not None):
+            runTimelimit = racingTimelimit
+            solverSetting = dict(solverSetting)
+            solverSetting['solverTimelimit'] = runTimelimit
+        elif (solver=='baseSolver') and (cutoff is not None):
+            runTimelimit = cutoff.start_run(i)
+            if (solverSetting['solverTimelimit'] > 0) and (runTimelimit >= solverSetting['solverTimelimit']):
+                runTimelimit = None
+            else:
+                log("Base solver cutoff: " + str(runTimelimit) + 's (solverTimelimit=' + str(solverSetting['solverTimelimit']) + 's)')
+                solverSetting = dict(solverSetting)
+                solverSetting['solverTimelimit'] = runTimelimit
+        
+        runStatus, SRTime, solverTime = solve_instance(essenceModelFile, eprimeModelFile, instFile, solverSetting, rndSeed, runGroup)
+        if (runTimelimit is not None) and (runStatus == 'solverTimeOut'):
+            solverTime = max(solverTime, runTimelimit)
+        if (solver=='baseSolver') and (cutoff is not None):
+            cutoff.finish_run(i, solverTime)
+        localVars = locals()
+        log("\nRun results: solverType=" + solver + ', solver=' + solverSetting['name'] + ', instance=' + instance + ', runId=' + str(i) + ', '\
+                + ', '.join([s + '=' + str(localVars[s]) for s in ['runStatus','SRTime','solverTime']]))
+        return runStatus, SRTime, solverTime
+
+    def is_stop(run, rs):
+        solver = run[1]
+        runStatus, SRTime, solverTime = rs
+        return ((setting['gradedTypes']!='both') and (runStatus in ['sat','unsat']) and (runStatus!=setting['gradedTypes'])) \
+                or (runStatus in ['SRTimeOut','SRMemOut']) \
+                or ((solver=='favouredSolver') and (runStatus=='solverTimeOut')) \
+                or ((solver=='baseSolver') and (solverTime<setting[solver]['solverMinTime']))
+
     # solve the instance using each solver
+    lsRuns = [] # runs used for the score, in the order they are replayed below
+    lsResults = []
+    lsDoneResults = [] # results of all runs done, including the racing run of the base solver if it's done again
+    racingStatus = None
+
+    def solve_more_runs(lsNewRuns):
+        # solve runs that are not done yet, return whether the evaluation isn't stopped
+        lsNewRuns = [run for run in lsNewRuns if run not in lsRuns]
+        lsNewResults = solve_runs(lsNewRuns, solve_run, is_stop, nWorkers)
+        lsRuns.extend(lsNewRuns[:len(lsNewResults)])
+        lsResults.extend(lsNewResults)
+        lsDoneResults.extend(lsNewResults)
+        return (len(lsNewResults) == len(lsNewRuns)) and ((len(lsNewRuns) == 0) or (not is_stop(lsNewRuns[-1], lsNewResults[-1])))
+
+    if is_racing_used(setting.get('racingTimelimit', 0), setting['baseSolver']['solverTimelimit']):
+        # racing stage: the first random seed of both solvers, with a short time limit for the base solver. The remaining runs are only done if the instance is promising
+        racingTimelimit = setting['racingTimelimit']
+        lsRacingRuns = [(0, 'favouredSolver'), (0, 'baseSolver')]
+        lsRacingResults = solve_runs(lsRacingRuns, solve_run, is_stop, nWorkers)
+        racingTimelimit = None
+        lsDoneResults.extend(lsRacingResults)
+        if (len(lsRacingResults) == 2) and (lsRacingResults[1][0] == 'solverTimeOut'): # the base solver run is done again with the full time limit
+            racingStatus = 'promising'
+            lsRacingResults = lsRacingResults[:1]
+        elif (len(lsRacingResults) < 2) or is_stop(lsRacingRuns[1], lsRacingResults[1]):
+            racingStatus = 'final'
+        elif lsRacingResults[1][2] < setting.get('racingMinRatio', 1) * lsRacingResults[0][2]:
+            # not discriminating enough, the ratio of this random seed is used as the ratio of the instance
+            racingStatus = 'rejected'
+        else:
+            racingStatus = 'promising'
+        lsRuns.extend(lsRacingRuns[:len(lsRacingResults)])
+        lsResults.extend(lsRacingResults)
+        log("Racing stage: instance=" + instance + ', racingStatus=' + racingStatus + ', ' \
+                + ', '.join([solver + 'Time=' + str(rs[2]) for (i, solver), rs in zip(lsRacingRuns, lsDoneResults)]))
+
+    if racingStatus in [None, 'promising']:
+        if setting.get('adaptiveBaseCutoff', False) and (setting['minRatio'] > 0):
+            # favoured solver runs first, their solving times give the cutoff of the base solver runs
+            if solve_more_runs([(i, 'favouredSolver') for i in range(setting['nEvaluations'])]):
+                cutoff = BaseSolverCutoff(setting['minRatio'] * sum([rs[2] for (i, solver), rs in zip(lsRuns, lsResults) if solver == 'favouredSolver']), \
+                                            setting['nEvaluations'], setting['baseSolver']['solverMinTime'])
+                for (i, solver), rs in zip(lsRuns, lsResults):
+                    if solver == 'baseSolver':
+                        cutoff.finish_run(i, rs[2])
+                solve_more_runs([(i, 'baseSolver') for i in range(setting['nEvaluations'])])
+            else:
+                # stopped at the favoured solver run of random seed k: without the cutoff, the base solver runs of the random seeds before k would have been done before it
+                solve_more_runs([(i, 'baseSolver') for i in range(lsRuns[-1][0])])
+        else:
+            solve_more_runs([(i, solver) for i in range(setting['nEvaluations']) for solver in ['favouredSolver','baseSolver']])
+
     stop = False  # when to stop the evaluation early
     lsSolvingTime = {}  # solving time of each solver per random seed
     lsSolvingTime['favouredSolver'] = []
     lsSolvingTime['baseSolver'] = []
-    for i in range(setting['nEvaluations']):
-        rndSeed = seed + i   
-               
-        status = 'ok'
-        for solver in ['favouredSolver','baseSolver']:
-            solverSetting = setting[solver]
-            print("\n\n---- With random seed " + str(i) + 'th (' + str(rndSeed) + ') and solver ' + solverSetting['name'] + ' (' + solver + ')')
-            
-            runStatus, SRTime, solverTime = call_conjure_solve(essenceModelFile, eprimeModelFile, instFile, solverSetting, rndSeed)
-            localVars = locals()
-            log("\nRun results: solverType=" + solver + ', solver=' + solverSetting['name'] + ', instance=' + instance + ', runId=' + str(i) + ', '\
-                    + ', '.join([s + '=' + str(localVars[s]) for s in ['runStatus','SRTime','solverTime']]))
-            
-            lsSolvingTime[solver].append(solverTime)
+    status = 'ok'
+    # results are scored in the order of random seeds, favoured solver first (the order in which the runs are done without adaptiveBaseCutoff)
+    for (i, solver), (runStatus, SRTime, solverTime) in sorted(zip(lsRuns, lsResults), key=lambda r: (r[0][0], r[0][1] == 'baseSolver')):
+        solverSetting = setting[solver]
             
-            #------------ update score
-            # inst unwanted type: score=1
-            if (setting['gradedTypes']!='both') and (runStatus in ['sat','unsat']) and (runStatus!=setting['gradedTypes']):
-                print("\nunwanted instance type. Quitting!...")
-                score = 1
-                stop = True
-                status = 'unwantedType'
-                break
-            # SR timeout or SR memout: score=1
-            if runStatus in ['SRTimeOut','SRMemOut']:
-                print("\nSR timeout/memout while translating the instance. Quitting!...")
-                score = 1
-                stop = True
-                status = runStatus
-                break
-            # favoured solver timeout (any run) or base solver too easy (any run): score=0
-            if (solver=='favouredSolver') and (runStatus=='solverTimeOut'):
-                print("\nfavoured solver timeout. Quitting!...")
-                score = 0
-                stop = True
-                status = 'favouredTimeOut'
-                break
-            if (solver=='baseSolver') and (solverTime<solverSetting['solverMinTime']):
-                print("\ntoo easy run for base solver. Quitting!...")
-                score = 0
-                stop = True
-                status = 'baseTooEasy'
-                break
-
-
-        # evaluation is stopped as there's no need to test the rest
-        if stop:
+        lsSolvingTime[solver].append(solverTime)
+        
+        #------------ update score
+        # inst unwanted type: score=1
+        if (setting['gradedTypes']!='both') and (runStatus in ['sat','unsat']) and (runStatus!=setting['gradedTypes']):
+            print("\nunwanted instance type. Quitting!...")
+            score = 1
+            stop = True
+            status = 'unwantedType'
+            break
+        # SR timeout or SR memout: score=1
+        if runStatus in ['SRTimeOut','SRMemOut']:
+            print("\nSR timeout/memout while translating the instance. Quitting!...")
+            score = 1
+            stop = True
+            status = runStatus
+            break
+        # favoured solver timeout (any run) or base solver too easy (any run): score=0
+        if (solver=='favouredSolver') and (runStatus=='solverTimeOut'):
+            print("\nfavoured solver timeout. Quitting!...")
+            score = 0
+            stop = True
+            status = 'favouredTimeOut'
+            break
+        if (solver=='baseSolver') and (solverTime<solverSetting['solverMinTime']):
+            print("\ntoo easy run for base solver. Quitting!...")
+            score = 0
+            stop = True
+            status = 'baseTooEasy'
             break
                     
     # if nothing is stop prematurely, calculate mean solving time & ratio, and update score
@@ -674,7 +2299,7 @@ def run_discriminating_solvers(instFile, seed, setting):
         ratio = meanSolverTime_baseSolver / meanSolverTime_favouredSolver
         # if minRatio is provided, use it
         if setting['minRatio'] != 0:
-            score = max(-setting['minValue'], -ratio)
+            score = max(-setting['minRatio'], -ratio)
         else: # otherwise, simply use the current ratio
             score = -ratio
             
@@ -691,8 +2316,238 @@ def run_discriminating_solvers(instFile, seed, setting):
         baseSolverTotalTime = sum(lsSolvingTime['baseSolver'])
     s = "\nInstance summary: instance=" + instance + ', status=' + status + ', favouredSolverTotalTime=' + str(favouredSolverTotalTime) + ', baseSolverTotalTime=' + str(baseSolverTotalTime) + ', ratio=' + str(ratio)
     print(s)
+    summary = {'instance': instance, 'status': status, 'favouredSolverTotalTime': favouredSolverTotalTime, 'baseSolverTotalTime': baseSolverTotalTime, 'ratio': ratio, \
+                'nRuns': len(lsDoneResults), 'totalSRTime': sum([rs[1] for rs in lsDoneResults]), 'totalSolverTime': sum([rs[2] for rs in lsDoneResults])}
+    if racingStatus is not None:
+        summary['racingStatus'] = racingStatus
     
-    return score
+    return score, summary
+
+
+@span('write_result_record')
+def write_result_record(record):
+    # append the result of an evaluation as a json line to the results file
+    # the file is locked while writing, so that records of concurrent evaluations are never interleaved
+    with open(resultsFile, 'at') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+
+
+class SurrogateFilter:
+    # nearest-neighbour model of the scores of earlier evaluations, trained online from resultsFile (see write_result_record)
+    # a generator configuration is predicted as hopeless if most of its nearest evaluated configurations got a score>=0 (i.e., no instance, or an instance that is unwanted/too hard/not discriminating)
+    # parameter values are normalised by their range among the evaluated configurations
+    # evaluations whose score is predicted by this filter are not used for training
+
+    def __init__(self, resultsFile):
+        self.resultsFile = resultsFile
+        self.offset = 0
+        self.lsParams = []
+        self.lsScores = []
+
+    def update(self):
+        # read records appended since the last update
+        if not os.path.isfile(self.resultsFile):
+            return
+        with open(self.resultsFile, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1 # the last record may still be being written
+        for line in data[:end].decode('utf-8').split('\n'):
+            if line == '':
+                continue
+            record = json.loads(line)
+            if ('params' not in record) or record.get('surrogate', False):
+                continue
+            self.lsParams.append(record['params'])
+            self.lsScores.append(float('inf') if record['score'] == 'Inf' else float(record['score']))
+        self.offset += end
+
+    def predict(self, paramDict, confidence):
+        # return the predicted score if the configuration is confidently hopeless, None otherwise
+        # the predicted score is always finite: irace discards a configuration scored Inf for good, which is only done for real generator results (e.g., unsat generator). Inf scores of the neighbours count as their worst finite score (or 0 if none is finite)
+        keys = sorted(paramDict.keys())
+        lsIds = [k for k in range(len(self.lsParams)) if sorted(self.lsParams[k].keys()) == keys]
+        if len(lsIds) < surrogateNeighbours:
+            return None
+        X = np.array([[float(self.lsParams[k][key]) for key in keys] for k in lsIds])
+        x = np.array([float(paramDict[key]) for key in keys])
+        scale = X.max(axis=0) - X.min(axis=0)
+        scale[scale == 0] = 1
+        distances = np.sqrt((((X - x) / scale) ** 2).sum(axis=1))
+        scores = np.array([self.lsScores[k] for k in lsIds])[np.argsort(distances, kind='stable')[:surrogateNeighbours]]
+        if np.mean(scores >= 0) < confidence:
+            return None
+        finiteScores = scores[np.isfinite(scores)]
+        hopelessScore = max(finiteScores.max(), 0) if len(finiteScores) > 0 else 0
+        scores[~np.isfinite(scores)] = hopelessScore
+        return float(np.median(scores))
+
+
+surrogateFilter = None # created on first use, so that it's kept between evaluations when evaluate is called several times in the same process (e.g., by evaluation-server.py)
+
+
+@span('get_surrogate_score')
+def get_surrogate_score(configurationId, seed, paramDict, tuningSetting):
+    # predicted score of a generator configuration if the surrogate filter decides to skip its evaluation, None otherwise
+    global surrogateFilter
+    if surrogateFilter is None:
+        surrogateFilter = SurrogateFilter(resultsFile)
+    surrogateFilter.update()
+    if len(surrogateFilter.lsScores) < tuningSetting.get('surrogateMinRecords', 100):
+        return None
+    predictedScore = surrogateFilter.predict(paramDict, tuningSetting.get('surrogateConfidence', 0.9))
+    if predictedScore is None:
+        return None
+    # exploration: some hopeless configurations are still evaluated, so that the model can be corrected
+    if random.Random(str(configurationId) + '-' + str(seed)).random() < tuningSetting.get('surrogateExplorationRate', 0.1):
+        log("Surrogate filter: configuration " + str(configurationId) + " is predicted as hopeless (score=" + str(predictedScore) + "), evaluating it anyway for exploration")
+        return None
+    log("Surrogate filter: configuration " + str(configurationId) + " is predicted as hopeless, predicted score=" + str(predictedScore))
+    return predictedScore
+
+
+@span('manage_disk_budget')
+def manage_disk_budget(diskBudget):
+    # housekeeping done after the score of an evaluation is printed: a failure is only written to artefactsLogFile, so that the evaluation's output (and irace) isn't affected
+    try:
+        free_disk_space(diskBudget)
+    except Exception:
+        try:
+            write_artefacts_log("Disk budget check failed: " + traceback.format_exc())
+        except OSError:
+            pass
+
+
+def free_disk_space(diskBudget):
+    ### keep the size of detailedOutputDir under diskBudget (in GB) ###
+    # when the budget is exceeded, files are freed until the size is under 90% of the budget:
+    # 1) instance files of finished evaluations are compressed (oldest first). collect-results.py reads the compressed files.
+    # 2) minion and aux files of generator instances are evicted, they are re-generated by solve_generator if the generator instance is used again.
+    #    The eviction order is least recently used first, weighted by the Savile Row time needed to re-generate the files, and by whether the generator instance is among the best ones so far (an approximation of irace's elite configurations)
+    #    Generator instances with a known final status (see write_generator_status) are evicted first.
+    # only one evaluation does the check at a time, at most once every diskCheckInterval seconds
+    with open(artefactsLockFile, 'a+') as lockFile:
+        try:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        lockFile.seek(0)
+        lastCheck = lockFile.read().strip()
+        if (lastCheck != '') and (time.time() - float(lastCheck) < diskCheckInterval):
+            return
+        lockFile.seek(0)
+        lockFile.truncate()
+        lockFile.write(str(time.time()))
+        lockFile.flush()
+
+        budget = diskBudget * 1024**3
+        usage = get_disk_usage(detailedOutputDir)
+        if usage <= budget:
+            return
+        target = 0.9 * budget
+        write_artefacts_log("Disk usage " + str(round(usage/1024**2)) + "MB is over the budget of " + str(round(budget/1024**2)) + "MB")
+        lsRecords = read_result_records()
+
+        # compress instance files of finished evaluations
+        lsFinished = set([r['instance'] for r in lsRecords if 'instance' in r])
+        lsInstFiles = [fn for fn in glob.glob(detailedOutputDir + '/inst-*.param') if os.path.basename(fn).replace('.param','') in lsFinished]
+        lsInstFiles = [fn for fn in lsInstFiles if os.stat(fn).st_size > os.stat(fn).st_blksize] # compressing files that fit in one block doesn't save any space
+        for fn in sorted(lsInstFiles, key=os.path.getmtime):
+            if usage <= target:
+                break
+            usage -= compress_file(fn)
+        
+        # evict generator files
+        lsGenInfo = {} # genInstance -> [SRTime, best score]
+        for r in lsRecords:
+            if 'genInstance' not in r:
+                continue
+            info = lsGenInfo.setdefault(r['genInstance'], [0, float('inf')])
+            info[0] = max(info[0], r.get('genSRTime', 0))
+            if r['score'] != 'Inf':
+                info[1] = min(info[1], float(r['score']))
+        lsBestScores = sorted([info[1] for info in lsGenInfo.values() if info[1] != float('inf')])
+        eliteScore = lsBestScores[int(len(lsBestScores) * eliteFraction)] if len(lsBestScores) > 0 else -float('inf')
+        lsCandidates = []
+        for minionFile in set([fn.replace('.minion.gz', '.minion') for fn in glob.glob(detailedOutputDir + '/gen-*.minion') + glob.glob(detailedOutputDir + '/gen-*.minion.gz')]):
+            if is_minion_run_file(minionFile):
+                continue
+            baseFileName = minionFile.replace('.minion','')
+            if os.path.isfile(baseFileName + '.status'):
+                priority = float('inf')
+            else:
+                useFile = get_generator_use_lock_file(minionFile)
+                # without a .use file (e.g., generator files written by evaluation-broker.py), the minion file is the last use, it can be compressed (see compress_generator_minion_file)
+                lastUsed = max([os.path.getmtime(fn) for fn in [useFile, minionFile, minionFile + '.gz'] if os.path.isfile(fn)] + [0])
+                SRTime, bestScore = lsGenInfo.get(os.path.basename(baseFileName), [0, float('inf')])
+                priority = (time.time() - lastUsed) / (1 + SRTime) / (eliteWeight if bestScore <= eliteScore else 1)
+            lsCandidates.append((priority, minionFile))
+        for priority, minionFile in sorted(lsCandidates, reverse=True):
+            if usage <= target:
+                break
+            usage -= evict_generator_files(minionFile)
+
+        write_artefacts_log("Disk usage after clean-up: " + str(round(usage/1024**2)) + "MB")
+
+
+def get_disk_usage(directory):
+    # disk space (in bytes) used by all files in a directory and its sub-directories
+    usage = 0
+    for entry in os.scandir(directory):
+        if entry.is_dir(follow_symlinks=False):
+            usage += get_disk_usage(entry.path)
+        elif entry.is_file(follow_symlinks=False):
+            usage += entry.stat(follow_symlinks=False).st_blocks * 512
+    return usage
+
+
+def read_result_records():
+    # all complete records of resultsFile
+    if not os.path.isfile(resultsFile):
+        return []
+    with open(resultsFile, 'rt') as f:
+        return [json.loads(line) for line in f if line.endswith('\n')]
+
+
+def write_artefacts_log(message):
+    with open(artefactsLogFile, 'at') as f:
+        f.write("{0}: {1}\n".format(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), message))
+
+
+def compress_file(fn):
+    # replace a file by its gzip-compressed version, return the disk space saved (in bytes)
+    size = os.stat(fn).st_blocks * 512
+    with open(fn, 'rb') as fIn, gzip.open(fn + '.gz.tmp', 'wb') as fOut:
+        copyfileobj(fIn, fOut)
+    os.replace(fn + '.gz.tmp', fn + '.gz')
+    os.remove(fn)
+    write_artefacts_log("Compressed " + fn)
+    return size - os.stat(fn + '.gz').st_blocks * 512
+
+
+def evict_generator_files(minionFile):
+    # remove minion and aux files of a generator instance if no run is using it, return the disk space freed (in bytes)
+    # its negative table is kept (and created if it doesn't exist yet), so that the instances generated from the re-generated files are still new
+    with open(get_generator_lock_file(minionFile), 'wt') as lockFile, open(get_generator_use_lock_file(minionFile), 'at') as useLockFile:
+        try:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(useLockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        if not generator_minion_exists(minionFile):
+            return 0
+        if not negative_table_exists(minionFile):
+            split_legacy_negative_table(minionFile)
+        if not negative_table_exists(minionFile):
+            create_negative_table(minionFile, read_minion_variables(minionFile))
+        auxFile = minionFile.replace('.minion','') + '.aux'
+        lsFiles = [fn for fn in [minionFile, minionFile + '.gz', auxFile] if os.path.isfile(fn)]
+        freed = sum([os.stat(fn).st_blocks * 512 for fn in lsFiles])
+        deleteFile(lsFiles)
+    write_artefacts_log("Evicted " + minionFile)
+    return freed
 
 
 def print_score(startTime, score):
@@ -703,20 +2558,73 @@ def print_score(startTime, score):
     print(str(score) + ' ' + str(np.round(totalWrapperTime,2)))
 
 
-def main():
+def evaluate(args, setting, lsMeta=None):
+    # run a single irace evaluation, the score is printed as the last stdout line
+    # args: command line arguments in irace's wrapper input format (args[0] is ignored)
+    # setting: content of setting.json, lsMeta: content of params.irace.meta (both can be pre-loaded, e.g., by evaluation-server.py)
+    # timing spans of all stages of the evaluation are written to spansFile, even if the evaluation fails
+    global coreSlots, memoryAdmission, memoryCgroupDir
+    if setting['tuningSettings'].get('sharedCores', False):
+        coreSlots = CoreSlots(setting['tuningSettings']['nCores'])
+    if (setting['tuningSettings'].get('memoryBudget', 0) > 0) and (memoryAdmission is None): # kept between evaluations run in the same process, so that the memory history isn't read again
+        memoryAdmission = MemoryAdmission(setting['tuningSettings']['memoryBudget'])
+    memoryCgroupDir = os.path.expandvars(setting['tuningSettings'].get('memoryCgroup', ''))
+    workDir = make_work_dir(args, setting['tuningSettings'])
+    try:
+        with span('evaluate'):
+            run_evaluation(args, setting, lsMeta, workDir)
+            if setting['tuningSettings'].get('diskBudget', 0) > 0:
+                manage_disk_budget(setting['tuningSettings']['diskBudget'])
+    finally:
+        write_spans(args)
+        if workDir != detailedOutputDir:
+            rmtree(workDir, ignore_errors=True)
+
+
+def make_work_dir(args, tuningSetting):
+    ### directory where the transient files of an evaluation are written ###
+    # by default, it's detailedOutputDir. If scratchDir is set (e.g., a node-local disk or /dev/shm), each evaluation gets its own folder there, which is removed at the end of the evaluation
+    # durable files (instance, generator minion/aux files) are copied from it to detailedOutputDir (see copy_back), results are written to detailedOutputDir directly
+    scratchDir = os.path.expandvars(tuningSetting.get('scratchDir', ''))
+    if scratchDir == '':
+        return detailedOutputDir
+    os.makedirs(scratchDir, exist_ok=True)
+    workDir = tempfile.mkdtemp(prefix='eval-' + '-'.join(args[1:4:2]) + '-', dir=scratchDir)
+    copyfile(detailedOutputDir + '/problem.eprime', workDir + '/problem.eprime') # conjure writes its output files next to the eprime model
+    return workDir
+
+
+def copy_back(srcFile, destFile):
+    # move a file from the scratch directory to detailedOutputDir, the destination file is replaced atomically so that it's never seen partially written
+    copyfile(srcFile, destFile + '.tmp')
+    os.replace(destFile + '.tmp', destFile)
+    os.remove(srcFile)
+
+
+def run_evaluation(args, setting, lsMeta=None, workDir=detailedOutputDir):
     startTime = time.time()
 
     # parse arguments
-    configurationId, seed, paramDict = read_args(sys.argv)
+    configurationId, seed, paramDict = read_args(args, lsMeta)
 
     # set random seed
     random.seed(seed)
 
-    # read all setting
-    setting = read_setting('./setting.json')
+    # result record of this evaluation, see write_result_record
+    record = {'configurationId': configurationId, 'seed': seed, 'startTime': startTime, 'host': socket.gethostname(), 'pid': os.getpid(), 'params': paramDict}
+
+    # skip the evaluation if the surrogate filter predicts that the configuration is hopeless
+    if setting['tuningSettings'].get('surrogateFilter', False):
+        predictedScore = get_surrogate_score(configurationId, seed, paramDict, setting['tuningSettings'])
+        if predictedScore is not None:
+            record.update({'status': 'surrogateRejected', 'surrogate': True, 'score': predictedScore, 'wrapperTime': time.time() - startTime})
+            write_result_record(record)
+            print_score(startTime, predictedScore)
+            return
 
     # solve the generator problem
-    genStatus, genSolFile, genMinionFile, genMinionSolString = solve_generator(configurationId, paramDict, setting['generatorSettings'], seed)
+    genStatus, genSolFile, genMinionFile, genMinionSolString, genSummary = solve_generator(configurationId, paramDict, setting['generatorSettings'], seed, workDir)
+    record.update(genSummary)
 
     # if no instance is generated, return immediately
     if genStatus != 'sat':
@@ -727,34 +2635,54 @@ def main():
         else:
             score = 2 # if the generator configuration is unsolved because minion timeout, penalise it heavier than any other cases where the generator configuration is sat
         # print out score and exit
+        record.update({'status': genStatus, 'score': score, 'wrapperTime': time.time() - startTime})
+        write_result_record(record)
         print_score(startTime, score)
         return
     
     # if an instance is generated, move on and evaluate it
     instFile = detailedOutputDir + '/inst-' + str(configurationId) + '-' + str(seed) + '.param'
-    move(genSolFile, instFile)
+    if workDir == detailedOutputDir:
+        move(genSolFile, instFile)
+    else:
+        copy_back(genSolFile, instFile)
 
     experimentType = setting['generalSettings']['experimentType']
+    nWorkers = setting['tuningSettings'].get('nEvaluationWorkers', 1) # number of solver runs done in parallel when evaluating the instance
 
     # evaluate the generated instance based on gradedness (single solver)
     if experimentType == 'graded':
-        score = run_single_solver(instFile, seed, setting['evaluationSettings'])
+        score, summary = run_single_solver(instFile, seed, setting['evaluationSettings'], nWorkers, workDir)
 
     # evaluate the generated instance based on discriminating power (two solvers)
     elif experimentType == 'discriminating':
-        score = run_discriminating_solvers(instFile, seed, setting['evaluationSettings'])
+        score, summary = run_discriminating_solvers(instFile, seed, setting['evaluationSettings'], nWorkers, workDir)
 
     else:
         raise Exception("ERROR: invalid experimentType: " + experimentType)
 
+    # cached translations of the instance are no longer needed
+    delete_translations(instFile, workDir)
+
     # add the generated instance into generator's minion negative table, so that next time when we solve this generator instance again we don't re-generate the same instance
     encode_negative_table(genMinionFile, genMinionSolString)
 
     # print out score and exit
+    record.update(summary)
+    record.update({'score': score, 'wrapperTime': time.time() - startTime})
+    write_result_record(record)
     print_score(startTime, score)
 
 
-main()
+def main():
+    # read all setting
+    setting = read_setting('./setting.json')
+
+    evaluate(sys.argv, setting)
+
+
+if __name__ == '__main__':
+    main()
 
 # scoring for graded instances (single solver)
 # - gen unsat/SRTimeOut/SRMemOut/solverMemOut: Inf
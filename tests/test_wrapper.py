@@ -0,0 +1,117 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'scripts', 'tuning-files'))
+import wrapper
+
+
+def capture_output(lsChunks, outputFormat):
+    capture = wrapper.OutputCapture(wrapper.solverStatusLines.get(outputFormat))
+    for data in lsChunks:
+        capture.feed(data)
+    return capture.get_output()
+
+
+def test_status_line_before_large_dimacs_model_is_kept():
+    # a SAT solver prints its status before its model, which can be larger than the captured tail
+    lsChunks = [b'c comment line\n' * 5000, b's SATISFIABLE\n']
+    lsChunks += [('v ' + ' '.join([str(i) for i in range(j, j + 100)]) + ' 0\n').encode('utf-8') for j in range(0, 600000, 100)]
+    output = capture_output(lsChunks, 'dimacs')
+    assert len(output) < wrapper.maxOutputHead + wrapper.maxOutputTail + 1024
+    assert 'lines of output dropped' in output
+    assert wrapper.parse_solver_output('dimacs', output) == 'sat'
+
+
+def test_smt_status_line_is_matched_as_whole_line():
+    lsChunks = [b'(model unsat-core)\n' * 100000, b'unsat\n', b'(x 1)\n' * 200000]
+    output = capture_output(lsChunks, 'smt')
+    assert wrapper.parse_solver_output('smt', output) == 'unsat'
+    assert output.count('(model unsat-core)') < 100000
+
+
+def test_minion_markers_are_kept_without_output_format():
+    lsChunks = [b'Sol: 1 2 3\n' * 200000, b'Solutions Found: 0\n', b'Sol: 4 5 6\n' * 200000]
+    output = capture_output(lsChunks, None)
+    assert 'Solutions Found: 0' in output
+
+
+def test_binary_negative_table_append_after_torn_record(tmp_path):
+    minionFile = str(tmp_path / 'gen.minion')
+    wrapper.create_negative_table(minionFile, 'a,b,c', binary=True)
+    wrapper.append_negative_table(minionFile, '1 200 3')
+    record = wrapper.encode_varint_tuple([4, 948, 5])
+    with open(wrapper.get_binary_negative_table_file(minionFile), 'ab') as f:
+        f.write(record + wrapper.frameTrailer.pack(len(record), wrapper.zlib.crc32(record))[:-1])
+    assert wrapper.read_negative_table(minionFile) == ('a,b,c', ['1 200 3'])
+    wrapper.append_negative_table(minionFile, '7 8 9')
+    wrapper.append_negative_table(minionFile, '10 11 12')
+    assert wrapper.read_negative_table(minionFile) == ('a,b,c', ['1 200 3', '7 8 9', '10 11 12'])
+
+
+def test_legacy_binary_negative_table_append_after_torn_record(tmp_path):
+    # binary tables written before records were framed have no trailers
+    minionFile = str(tmp_path / 'gen.minion')
+    with open(wrapper.get_binary_negative_table_file(minionFile), 'wb') as f:
+        f.write(b'a,b,c\n' + wrapper.encode_varint_tuple([1, -200, 3]) + wrapper.encode_varint_tuple([4, 948])[:-1])
+    wrapper.append_negative_table(minionFile, '7 8 9')
+    assert wrapper.read_negative_table(minionFile) == ('a,b,c', ['1 -200 3', '7 8 9'])
+
+
+def run_scripted_discriminating(monkeypatch, lsResults, adaptiveBaseCutoff, solverMinTime=1, lsSettings=None):
+    # lsResults: (random seed index, solver) -> (status, SRTime, solverTime)
+    # lsSettings: if given, the solver setting of each run is added to it
+    def solve_instance(essenceModelFile, eprimeModelFile, instFile, setting, seed, runGroup=None):
+        if lsSettings is not None:
+            lsSettings.append(setting)
+        return lsResults[(seed - 100, setting['type'])]
+    monkeypatch.setattr(wrapper, 'solve_instance', solve_instance)
+    setting = {'gradedTypes': 'both', 'nEvaluations': 3, 'minRatio': 2, 'adaptiveBaseCutoff': adaptiveBaseCutoff,
+                'favouredSolver': {'type': 'favouredSolver', 'name': 'chuffed', 'solverTimelimit': 10},
+                'baseSolver': {'type': 'baseSolver', 'name': 'minion', 'solverTimelimit': 100, 'solverMinTime': solverMinTime}}
+    return wrapper.run_discriminating_solvers('inst-x.param', 100, setting)
+
+
+def test_adaptive_base_cutoff_keeps_the_score(monkeypatch):
+    lsCases = [{(0, 'favouredSolver'): ('sat', 0, 1), (0, 'baseSolver'): ('SRTimeOut', 30, 0),
+                (1, 'favouredSolver'): ('sat', 0, 1), (1, 'baseSolver'): ('sat', 0, 5),
+                (2, 'favouredSolver'): ('solverTimeOut', 0, 10), (2, 'baseSolver'): ('sat', 0, 5)},
+               {(0, 'favouredSolver'): ('sat', 0, 1), (0, 'baseSolver'): ('sat', 0, 0.5),
+                (1, 'favouredSolver'): ('SRTimeOut', 30, 0), (1, 'baseSolver'): ('sat', 0, 5),
+                (2, 'favouredSolver'): ('sat', 0, 1), (2, 'baseSolver'): ('sat', 0, 5)},
+               {(i, solver): ('sat', 0, 1 if solver == 'favouredSolver' else 5) for i in range(3) for solver in ['favouredSolver', 'baseSolver']}]
+    for lsResults in lsCases:
+        score, summary = run_scripted_discriminating(monkeypatch, lsResults, False)
+        adaptiveScore, adaptiveSummary = run_scripted_discriminating(monkeypatch, lsResults, True)
+        assert (adaptiveScore, adaptiveSummary['status']) == (score, summary['status'])
+
+
+def test_adaptive_base_cutoff_with_fractional_min_time(monkeypatch):
+    # minion's time limit is in seconds, so a cutoff of solverMinTime=1.5 must be rounded up, not truncated to 1
+    lsResults = {(i, solver): ('sat', 0, 0.2 if solver == 'favouredSolver' else 1.5) for i in range(3) for solver in ['favouredSolver', 'baseSolver']}
+    lsSettings = []
+    run_scripted_discriminating(monkeypatch, lsResults, True, 1.5, lsSettings)
+    lsBaseTimelimits = [solverSetting['solverTimelimit'] for solverSetting in lsSettings if solverSetting['type'] == 'baseSolver']
+    assert lsBaseTimelimits == [2, 2, 2]
+    for timelimit in lsBaseTimelimits:
+        assert wrapper.make_solver_options('minion', 'run', timelimit)[0].startswith(wrapper.solverInfo['minion']['timelimitPrefix'] + '2')
+
+
+def test_split_legacy_negative_table(tmp_path):
+    minionFile = str(tmp_path / 'gen.minion')
+    with open(minionFile, 'wt') as f:
+        f.write('MINION 3\n**VARIABLES**\nDISCRETE x {0..5}\nDISCRETE y {0..5}\n**TUPLELIST**\nnegativeSol 2 2\n1 2\n3 4\n**SEARCH**\nPRINT [[x,y]]\n'
+                '**CONSTRAINTS**\ndiseq(x,y)\nnegativetable([x,y],\nnegativeSol)\nnegativetable([x,y], otherTable)\n**EOF**\n')
+    wrapper.split_legacy_negative_table(minionFile)
+    assert wrapper.read_negative_table(minionFile) == ('x,y', ['1 2', '3 4'])
+    assert wrapper.read_minion_section(minionFile, 'CONSTRAINTS') == ['diseq(x,y)\n', 'negativetable([x,y], otherTable)\n']
+    assert wrapper.read_minion_section(minionFile, 'TUPLELIST') == []
+
+
+def test_text_negative_table_append_after_torn_line(tmp_path):
+    minionFile = str(tmp_path / 'gen.minion')
+    wrapper.create_negative_table(minionFile, 'a,b,c')
+    wrapper.append_negative_table(minionFile, '1 200 3')
+    with open(wrapper.get_negative_table_file(minionFile), 'at') as f:
+        f.write('4 94')
+    wrapper.append_negative_table(minionFile, '7 8 9')
+    assert wrapper.read_negative_table(minionFile) == ('a,b,c', ['1 200 3', '7 8 9'])